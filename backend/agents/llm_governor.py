@@ -0,0 +1,292 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Starting point and bounds for the number of concurrent LLM calls (whole process)
+INITIAL_CONCURRENCY = int(os.getenv("PAPEROID_LLM_CONCURRENCY", "4"))
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.getenv("PAPEROID_LLM_MAX_CONCURRENCY", "32"))
+
+DECREASE_FACTOR = 0.5          # on 429 / 5xx
+SLOWDOWN_FACTOR = 0.9          # when latency drifts well above the baseline
+LATENCY_TOLERANCE = 2.0        # "slow" = per-token latency above 2x the baseline
+MAX_RETRIES = 4
+BASE_BACKOFF_S = 1.0
+MAX_BACKOFF_S = 30.0
+
+THROTTLE_STATUS = {429, 500, 502, 503, 504}
+
+# Hedging: re-send a call that runs past this latency percentile, within a budget of extra calls
+HEDGE_ENABLED = os.getenv("PAPEROID_LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("PAPEROID_LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET = float(os.getenv("PAPEROID_LLM_HEDGE_BUDGET", "0.05"))
+HEDGE_MIN_SAMPLES = 20         # no hedging until the percentile means something
+LATENCY_WINDOW = 200
+
+
+def _status_code(e: Exception) -> Optional[int]:
+    """HTTP status behind an endpoint error (huggingface_hub, httpx and requests all attach a response)."""
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None:
+        # Some clients only put the reason in the message
+        text = str(e)
+        if "429" in text or "Too Many Requests" in text or "overloaded" in text.lower():
+            return 429
+        if "Service Unavailable" in text:
+            return 503
+    return status
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled(e: Exception) -> bool:
+    """Errors that mean the provider is overloaded (retry later, with less concurrency)."""
+    return isinstance(e, TimeoutError) or _status_code(e) in THROTTLE_STATUS
+
+
+def _output_tokens(response) -> int:
+    usage = getattr(response, "usage_metadata", None) or {}
+    content = getattr(response, "content", "") or ""
+    return usage.get("output_tokens") or max(len(content.split()), 1)
+
+
+def _latency_key(llm) -> Optional[int]:
+    # Calls with very different token caps have different latency profiles, but plans
+    # produce many distinct caps; grouping them by power of two lets each window fill
+    endpoint = getattr(llm, "llm", llm)
+    max_new_tokens = getattr(endpoint, "max_new_tokens", None)
+    return 1 << (max_new_tokens - 1).bit_length() if max_new_tokens else None
+
+
+async def _afirst_result(tasks):
+    """First successful result among asyncio tasks; the others are cancelled."""
+    pending, error = set(tasks), None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class _Waiter:
+    """One queued coroutine; `wake` resolves its future on the loop it is waiting in."""
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class LLMGovernor:
+    """
+    Process-wide limit on concurrent LLM calls, tuned by AIMD:
+    each healthy call raises the limit by 1/limit (about +1 per round of calls),
+    a 429/5xx halves it and a sustained latency rise trims it. Callers queue FIFO
+    (from any event loop, so the state is guarded by a thread lock), and throttled
+    calls are retried with full-jitter backoff.
+
+    With hedging on, a call still running past the tracked latency percentile
+    gets a duplicate; the first response wins. Hedges need a free slot and stay
+    within `hedge_budget` extra calls per call made.
+    """
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, min_limit: int = MIN_CONCURRENCY,
+                 max_limit: int = MAX_CONCURRENCY, hedge: bool = HEDGE_ENABLED,
+                 hedge_percentile: float = HEDGE_PERCENTILE, hedge_budget: float = HEDGE_BUDGET):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.baseline = None       # slowly-rising minimum of per-token latency
+        self.rtt = 1.0             # smoothed call latency, the AIMD "round"
+        self._recent = deque(maxlen=20)   # recent per-token latencies, compared with the baseline
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Dict[Optional[int], deque] = {}
+
+    # --- slots ---
+
+    def _grant(self) -> None:
+        # Called with the lock held: hand free slots to the oldest waiters
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._grant()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            waiter = _Waiter(lambda: loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None)))
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    # The slot was handed over just as we were cancelled
+                    self.in_flight -= 1
+                    self._grant()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    # --- feedback ---
+
+    def _on_success(self, latency_s: float, tokens: int, key=None) -> None:
+        per_token = latency_s / max(tokens, 1)
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(latency_s)
+            self.rtt += (latency_s - self.rtt) * 0.2
+            if self.baseline is None or per_token < self.baseline:
+                self.baseline = per_token
+            else:
+                self.baseline += (per_token - self.baseline) * 0.01
+            # The median, so a few stuck requests don't read as provider overload
+            self._recent.append(per_token)
+            if sorted(self._recent)[len(self._recent) // 2] > self.baseline * LATENCY_TOLERANCE:
+                self._decrease(SLOWDOWN_FACTOR)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self._grant()
+
+    def _on_throttle(self) -> None:
+        with self._lock:
+            self.throttled += 1
+            self._decrease(DECREASE_FACTOR)
+
+    def _decrease(self, factor: float) -> None:
+        # One cut per round trip: a burst of 429s from the same wave counts once
+        now = time.monotonic()
+        if now - self._last_decrease < self.rtt:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        print(f"🚦 LLM concurrency limit lowered to {int(self.limit)}")
+
+    def _backoff(self, attempt: int, e: Exception) -> float:
+        # A server's Retry-After is honoured, but never beyond our own backoff cap
+        retry_after = _retry_after(e)
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), MAX_BACKOFF_S)
+        return random.uniform(0, min(MAX_BACKOFF_S, BASE_BACKOFF_S * 2 ** attempt))
+
+    # --- hedging ---
+
+    def hedge_delay(self, llm) -> Optional[float]:
+        """Seconds after which a call to `llm` gets hedged (None: don't hedge)."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            window = sorted(self._latencies.get(_latency_key(llm), ()))
+        if len(window) < HEDGE_MIN_SAMPLES:
+            return None
+        return window[min(len(window) - 1, int(len(window) * self.hedge_percentile / 100))]
+
+    def _try_hedge(self) -> bool:
+        # Never queue for a hedge: it only helps when there is spare capacity
+        with self._lock:
+            if self.hedges + 1 > self.hedge_budget * self.calls or self.in_flight >= int(self.limit):
+                return False
+            self.hedges += 1
+            self.in_flight += 1
+            return True
+
+    async def _acall(self, llm, prompt):
+        delay = self.hedge_delay(llm)
+        if delay is None:
+            return await llm.ainvoke(prompt)
+        primary = asyncio.ensure_future(llm.ainvoke(prompt))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._try_hedge():
+                return await primary
+        except BaseException:
+            primary.cancel()
+            raise
+
+        async def hedged():
+            try:
+                return await llm.ainvoke(prompt)
+            finally:
+                self._release()
+
+        hedge = asyncio.ensure_future(hedged())
+        response = await _afirst_result([primary, hedge])
+        if hedge.done() and not hedge.cancelled() and not hedge.exception() and response is hedge.result():
+            with self._lock:
+                self.hedge_wins += 1
+        return response
+
+    # --- calls ---
+
+    async def ainvoke(self, llm, prompt):
+        """await llm.ainvoke(prompt) under the governor, retrying throttled calls; a losing hedge is cancelled."""
+        for attempt in range(MAX_RETRIES + 1):
+            await self.aacquire()
+            with self._lock:
+                self.calls += 1
+            start = time.monotonic()
+            try:
+                response = await self._acall(llm, prompt)
+            except Exception as e:
+                if not is_throttled(e) or attempt == MAX_RETRIES:
+                    raise
+                self._on_throttle()
+                delay = self._backoff(attempt, e)
+            else:
+                self._on_success(time.monotonic() - start, _output_tokens(response), _latency_key(llm))
+                return response
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "throttled": self.throttled,
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+
+llm_governor = LLMGovernor()
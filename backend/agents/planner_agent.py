@@ -0,0 +1,140 @@
+import math
+import re
+from typing import Dict, List, Tuple
+from schemas.paper_schemas import ResearchRequest, GenerationPlan, SectionBudget, SubsectionBudget
+
+WORDS_PER_PAGE = 500
+TOKENS_PER_WORD = 1.35   # Llama 3 tokenizer, English academic prose
+TOKEN_HEADROOM = 1.15    # Let the model finish its last sentence
+MIN_SECTION_TOKENS = 128
+MAX_SECTION_TOKENS = 2048
+# Papers this long are outlined first and written subsection by subsection
+HIERARCHICAL_MIN_PAGES = 8
+SUBSECTION_WORDS = 400
+
+# Relative share of the paper body for each section (matches the previous fixed word ranges)
+SECTION_WEIGHTS = [
+    ("Abstract", 200),
+    ("Introduction", 450),
+    ("Literature Review", 450),
+    ("Methodology", 350),
+    ("Results and Discussion", 550),
+    ("Conclusion", 275),
+]
+
+
+def words_to_tokens(words: int) -> int:
+    """Approximate number of tokens needed to generate `words` words."""
+    return math.ceil(words * TOKENS_PER_WORD)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of generated text (used when the endpoint reports no usage)."""
+    return words_to_tokens(len(text.split()))
+
+
+def _token_cap(words: int) -> int:
+    return min(max(math.ceil(words_to_tokens(words) * TOKEN_HEADROOM), MIN_SECTION_TOKENS), MAX_SECTION_TOKENS)
+
+
+def plan_generation(request: ResearchRequest, hierarchical: bool = False) -> GenerationPlan:
+    """
+    Turn a ResearchRequest into per-section word targets and max_new_tokens.
+    word_count drives the total length, bounded to what page_length can hold;
+    the Literature Review grows with the number of references it must cover.
+    A hierarchical plan lifts the one-call cap on section length: each section is
+    split into subsections of about SUBSECTION_WORDS, each with its own token cap.
+    """
+    page_words = max(request.page_length, 1) * WORDS_PER_PAGE
+    total_words = request.word_count or page_words
+    total_words = min(max(total_words, page_words // 2), int(page_words * 1.5))
+
+    weights = dict(SECTION_WEIGHTS)
+    weights["Literature Review"] += 25 * max(request.num_references - 10, 0)
+    total_weight = sum(weights.values())
+
+    budgets = []
+    for name, _ in SECTION_WEIGHTS:
+        if name == "Abstract":
+            # Abstracts stay abstract-sized regardless of paper length
+            target = min(max(total_words * weights[name] // total_weight, 150), 300)
+        else:
+            target = max(total_words * weights[name] // total_weight, 100)
+        if hierarchical:
+            parts = 1 if name == "Abstract" else max(1, round(target / SUBSECTION_WORDS))
+            budgets.append(SectionBudget(
+                section_title=name,
+                target_words=target,
+                max_new_tokens=parts * _token_cap(max(target // parts, 50)),
+                subsections=parts,
+            ))
+            continue
+        # Never ask for more words than the section's token cap can produce
+        target = min(target, int(MAX_SECTION_TOKENS / TOKEN_HEADROOM / TOKENS_PER_WORD))
+        budgets.append(SectionBudget(
+            section_title=name,
+            target_words=target,
+            max_new_tokens=_token_cap(target),
+        ))
+
+    return GenerationPlan(total_words=total_words, sections=budgets, hierarchical=hierarchical)
+
+
+def build_outline(plan: GenerationPlan, titles: Dict[str, List[Tuple[str, str]]]) -> List[SubsectionBudget]:
+    """
+    Budget every subsection of a hierarchical plan. `titles` maps a section to its
+    (title, focus) pairs from the outline; missing ones get generic titles.
+    Each section's words are split evenly across its subsections.
+    """
+    outline = []
+    for budget in plan.sections:
+        proposed = titles.get(budget.section_title, [])[:budget.subsections]
+        if budget.subsections == 1 and not proposed:
+            proposed = [(budget.section_title, "")]
+        proposed += [(f"{budget.section_title}: Part {i + 1}", "") for i in range(len(proposed), budget.subsections)]
+        words = max(budget.target_words // budget.subsections, 50)
+        outline.extend(
+            SubsectionBudget(
+                section=budget.section_title,
+                section_title=title,
+                focus=focus,
+                target_words=words,
+                max_new_tokens=_token_cap(words),
+            )
+            for title, focus in proposed
+        )
+    return outline
+
+
+def shrink_plan(plan: GenerationPlan, factor: float) -> GenerationPlan:
+    """
+    Scale every section's word target and token cap by `factor` (< 1), keeping
+    the minimum section size, e.g. to fit a draft into the time left.
+    """
+    budgets = [
+        SectionBudget(
+            section_title=b.section_title,
+            target_words=max(int(b.target_words * factor), 50),
+            max_new_tokens=max(math.ceil(b.max_new_tokens * factor), MIN_SECTION_TOKENS),
+            subsections=max(1, min(b.subsections, round(b.target_words * factor / SUBSECTION_WORDS))),
+        )
+        for b in plan.sections
+    ]
+    return GenerationPlan(total_words=sum(b.target_words for b in budgets), sections=budgets, hierarchical=plan.hierarchical)
+
+
+def trim_to_target(text: str, target_words: int, tolerance: float = 1.1) -> str:
+    """
+    Cut text that overshoots its target at the last sentence boundary within tolerance.
+    """
+    limit = int(target_words * tolerance)
+    words = list(re.finditer(r"\S+", text))
+    if len(words) <= limit:
+        return text
+
+    clipped = text[:words[limit - 1].end()]
+    # Keep whole sentences when one ends in the second half of the clipped text
+    last_stop = max((m.end() for m in re.finditer(r"[.!?](?=\s|$)", clipped)), default=0)
+    if last_stop > len(clipped) // 2:
+        clipped = clipped[:last_stop]
+    return clipped.strip()
@@ -1,19 +1,34 @@
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
 import os
 from dotenv import load_dotenv
+from agents.llm_governor import llm_governor
 
 load_dotenv()
 
-model = HuggingFaceEndpoint(
-    repo_id="meta-llama/Meta-Llama-3-8B-Instruct",
-    task="text-generation",
-    temperature=0.4,
-    max_new_tokens=512,
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-)
-llm = ChatHuggingFace(llm=model)
+# Same override as the writer: a self-hosted or stand-in endpoint instead of the hub model
+LLM_ENDPOINT_URL = os.getenv("PAPEROID_LLM_ENDPOINT_URL")
 
-def refiner_agent(draft: str):
+
+def get_refiner_llm():
+    """
+    The refiner's chat model, built per call like the writer's: its async client
+    is bound to the event loop that first uses it. langchain_huggingface is
+    imported on first use, as importing it is slow.
+    """
+    from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
+
+    target = {"endpoint_url": LLM_ENDPOINT_URL} if LLM_ENDPOINT_URL else {"repo_id": "meta-llama/Meta-Llama-3-8B-Instruct"}
+    model = HuggingFaceEndpoint(
+        **target,
+        task="text-generation",
+        temperature=0.4,
+        max_new_tokens=512,
+        huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
+    )
+    return ChatHuggingFace(llm=model)
+
+def _refine_prompt(draft: str) -> str:
+    return f"Refine and improve this draft to make it sound academic and coherent:\n\n{draft}"
+
+async def arefiner_agent(draft: str):
     """Refine the final version"""
-    prompt = f"Refine and improve this draft to make it sound academic and coherent:\n\n{draft}"
-    return llm.invoke(prompt).content
+    return (await llm_governor.ainvoke(get_refiner_llm(), _refine_prompt(draft))).content
@@ -1,52 +1,59 @@
-from tools.arxiv_tool import search_arxiv
+from tools.arxiv_tool import asearch_arxiv_ranked
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-def retriever_agent(topic: str, limit: int = 10):
+def _to_papers(topic: str, results: list) -> list:
+    """Convert arXiv results into Citation-compatible dicts (or a single "not found" entry)."""
+    print(f"✅ Found {len(results)} papers from arXiv API.")
+
+    papers = []
+    for i, p in enumerate(results):
+        # Clean up summary to be single line for better context injection
+        clean_summary = p["summary"].replace("\n", " ").strip()
+
+        papers.append({
+            "title": p["title"],
+            "summary": clean_summary,
+            "key": f"[Ref-{i+1}]",
+            "source_id": p["link"],
+            "link": p["link"],
+            "pdf": p["pdf"]
+        })
+
+    if not papers:
+         print(f"⚠️ No relevant papers found for '{topic}' after filtering.")
+         return [{
+            "title": "No relevant research papers found",
+            "summary": f"No papers matching '{topic}' were found on arXiv. The topic might be too specific or fictional.",
+            "key": "[Ref-None]",
+            "source_id": "N/A",
+            "link": "N/A",
+            "pdf": "N/A"
+        }]
+
+    return papers
+
+
+def _retrieval_failed(e: Exception) -> list:
+    print(f"❌ Retriever error: {e}")
+    return [{
+        "title": "Retrieval failed",
+        "summary": f"Error: {str(e)}",
+        "key": "[Ref-Error]",
+        "source_id": "src-error"
+    }]
+
+
+async def aretriever_agent(topic: str, limit: int = 10):
     """
     Retrieves relevant research papers from arXiv and converts them into Citation-compatible dicts.
     """
     print(f"🔍 Searching arXiv for: {topic} (Limit: {limit})")
     try:
-        # Fetch real papers from arXiv
-        results = search_arxiv(topic, max_results=limit)
-        print(f"✅ Found {len(results)} papers from arXiv API.")
-        
-        papers = []
-        for i, p in enumerate(results):
-            # Clean up summary to be single line for better context injection
-            clean_summary = p["summary"].replace("\n", " ").strip()
-            
-            papers.append({
-                "title": p["title"],
-                "summary": clean_summary,
-                "key": f"[Ref-{i+1}]",
-                "source_id": p["link"],
-                "link": p["link"],
-                "pdf": p["pdf"]
-            })
-            
-        if not papers:
-             print(f"⚠️ No relevant papers found for '{topic}' after filtering.")
-             return [{
-                "title": "No relevant research papers found",
-                "summary": f"No papers matching '{topic}' were found on arXiv. The topic might be too specific or fictional.",
-                "key": "[Ref-None]",
-                "source_id": "N/A",
-                "link": "N/A",
-                "pdf": "N/A"
-            }]
-            
-        return papers
-
+        # Fetch real papers from arXiv, over-fetched and re-ranked to meet the limit
+        return _to_papers(topic, await asearch_arxiv_ranked(topic, num_results=limit))
     except Exception as e:
-        print(f"❌ Retriever error: {e}")
-        return [{
-            "title": "Retrieval failed",
-            "summary": f"Error: {str(e)}",
-            "key": "[Ref-Error]",
-            "source_id": "src-error"
-        }]
\ No newline at end of file
+        return _retrieval_failed(e)
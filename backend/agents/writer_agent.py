@@ -1,18 +1,32 @@
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
-from schemas.paper_schemas import PaperSection
+from schemas.paper_schemas import PaperSection, GenerationPlan, SectionBudget, SubsectionBudget
+from agents.planner_agent import count_tokens, trim_to_target, build_outline, MAX_SECTION_TOKENS
+from agents.llm_governor import llm_governor
+import asyncio
 import os
+import re
 from dotenv import load_dotenv
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 load_dotenv()
 
-def get_writer_model(page_length: int):
-    """Return a Hugging Face model endpoint based on paper size."""
-    repo = "meta-llama/Meta-Llama-3-8B-Instruct"
-    max_tokens = 512 if page_length <= 5 else 1024
+# Llama 3 8B has an 8k context; leave room for the prompt in single-shot mode
+SINGLE_SHOT_MAX_TOKENS = 4096
+# The single-shot writer returns the whole paper as this one section
+SINGLE_SHOT_SECTION = "Survey Paper"
+# A self-hosted TGI/OpenAI-compatible server (or a load-test stand-in) instead of the HF hub model
+LLM_ENDPOINT_URL = os.getenv("PAPEROID_LLM_ENDPOINT_URL")
 
+def get_writer_model(page_length: int, max_new_tokens: Optional[int] = None, repo: Optional[str] = None):
+    """Return a Hugging Face model endpoint based on paper size (or an explicit token budget and model)."""
+    repo = repo or "meta-llama/Meta-Llama-3-8B-Instruct"
+    max_tokens = max_new_tokens or (512 if page_length <= 5 else 1024)
+
+    target = {"endpoint_url": LLM_ENDPOINT_URL} if LLM_ENDPOINT_URL else {"repo_id": repo}
+
+    # Imported on first use: langchain_huggingface adds about a second to startup
+    from langchain_huggingface import HuggingFaceEndpoint
     return HuggingFaceEndpoint(
-        repo_id=repo,
+        **target,
         task="text-generation",
         temperature=0.7,
         max_new_tokens=max_tokens,
@@ -22,19 +36,36 @@ def get_writer_model(page_length: int):
     )
 
 
-# Simple writer for short papers (3–4 pages)
-def writer_agent(topic: str, context: list, page_length: int = 5) -> Tuple[str, List[PaperSection]]:
-    """Generate a Survey Paper / Literature Review based on retrieved abstracts."""
+def get_writer_llm(page_length: int, max_new_tokens: Optional[int] = None, repo: Optional[str] = None):
+    """Chat wrapper around get_writer_model."""
+    from langchain_huggingface import ChatHuggingFace
+    return ChatHuggingFace(llm=get_writer_model(page_length, max_new_tokens=max_new_tokens, repo=repo))
+
+
+def generated_tokens(response, content: str) -> int:
+    """Tokens produced by the model, from usage metadata when the endpoint reports it."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("output_tokens") or count_tokens(content)
+
+
+# --- Single-shot writer helpers ---
+
+def single_shot_tokens(plan: GenerationPlan) -> int:
+    # One call writes every section, so it gets the whole plan's budget
+    return min(plan.planned_tokens, SINGLE_SHOT_MAX_TOKENS)
+
+
+def _single_shot_llm(page_length: int, plan: Optional[GenerationPlan], model: Optional[str] = None):
+    max_new_tokens = single_shot_tokens(plan) if plan else None
+    return get_writer_llm(page_length, max_new_tokens=max_new_tokens, repo=model)
 
-    llm = ChatHuggingFace(llm=get_writer_model(page_length))
-    # Join the context list into a single string
-    context_text = "\n\n".join(context)
 
-    prompt = f"""
+def _single_shot_prompt(topic: str, context_text: str, page_length: int, plan: Optional[GenerationPlan]) -> str:
+    return f"""
 You are an academic researcher.
 Write a detailed research paper on the topic "{topic}".
 
-Use the following retrieved research papers as the PRIMARY SOURCE of information. 
+Use the following retrieved research papers as the PRIMARY SOURCE of information.
 Do NOT hallucinate. Base your Abstract, Introduction, Methodology, and Results on these facts.
 Synthesize the methods and results found in these papers.
 
@@ -51,69 +82,353 @@ Include these sections:
 7. Conclusion
 8. References (List the titles from the context)
 
-Target: around {page_length} pages.
+Target: around {page_length} pages{f" ({plan.total_words} words)" if plan else ""}.
 """
 
-    response = llm.invoke(prompt)
+
+def _single_shot_result(topic: str, response, plan: Optional[GenerationPlan]) -> Tuple[str, List[PaperSection]]:
     content = response.content.strip()
+    if plan:
+        # The call was capped, so that is the budget the plan reports
+        plan.max_total_tokens = SINGLE_SHOT_MAX_TOKENS
+        tokens = generated_tokens(response, content)
+        # Attribute usage to sections in proportion to their planned share
+        planned = sum(budget.max_new_tokens for budget in plan.sections)
+        for budget in plan.sections:
+            budget.actual_tokens = round(tokens * budget.max_new_tokens / planned)
 
     title = f"A Survey of {topic}"
     if "Title:" in content:
         title_line = content.split("\n")[0]
         title = title_line.replace("Title:", "").strip()
 
-    sections = [PaperSection(section_title="Survey Paper", content=content)]
+    sections = [PaperSection(section_title=SINGLE_SHOT_SECTION, content=content)]
 
     return title, sections
 
 
+# Simple writer for short papers (3–4 pages)
+async def awriter_agent(topic: str, context: list, page_length: int = 5, plan: Optional[GenerationPlan] = None,
+                        model: Optional[str] = None) -> Tuple[str, List[PaperSection]]:
+    """Generate a Survey Paper / Literature Review based on retrieved abstracts (`model` overrides the default repo)."""
+    llm = _single_shot_llm(page_length, plan, model)
+    # Join the context list into a single string
+    prompt = _single_shot_prompt(topic, "\n\n".join(context), page_length, plan)
+    return _single_shot_result(topic, await llm_governor.ainvoke(llm, prompt), plan)
+
+
+# --- Iterative writer helpers ---
+
+def _section_prompts(topic: str, context_text: str, plan: Optional[GenerationPlan],
+                     excerpts: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+    # 🎯 Target length per section: from the plan, else the original fixed ranges
+    def length(name: str, default: str) -> str:
+        budget = plan.budget_for(name) if plan else None
+        return f"about {budget.target_words} words" if budget else default
+
+    # 📑 Full-text passages picked for this section, when the PDFs were ingested
+    def with_excerpts(name: str, prompt: str) -> str:
+        extra = (excerpts or {}).get(name)
+        return f"{prompt}\n\nRelevant passages from the full texts:\n{extra}" if extra else prompt
+
+    # 🎯 Section Templates
+    prompts = [
+        ("Abstract", f"Write an academic abstract ({length('Abstract', '200 words')}) for '{topic}'. It MUST strictly summarize the findings from the following retrieved papers:\n{context_text}"),
+        ("Introduction", f"Write an Introduction ({length('Introduction', '400–500 words')}) for '{topic}'. Use the following context to explain the background and problem statement. Do NOT invent facts:\n{context_text}"),
+        ("Literature Review", f"Write a Literature Review ({length('Literature Review', '400–500 words')}) synthesizing the following specific studies. Cite them by title:\n{context_text}"),
+        ("Methodology", f"Write a Methodology ({length('Methodology', '300–400 words')}) describing the research methods used in the retrieved papers. Synthesize their approaches (e.g., datasets, algorithms, experimental setups) based ONLY on the provided context:\n{context_text}"),
+        ("Results and Discussion", f"Write a Results & Discussion section ({length('Results and Discussion', '500–600 words')}) synthesizing the key findings and results reported in the retrieved papers. Discuss the implications of these results. Do NOT invent new results:\n{context_text}"),
+        ("Conclusion", f"Write a Conclusion ({length('Conclusion', '250–300 words')}) summarizing the collective findings from the provided context:\n{context_text}")
+    ]
+    return [(name, with_excerpts(name, prompt)) for name, prompt in prompts]
+
+
+def _section_llm(page_length: int, budget: Optional[SectionBudget], model: Optional[str] = None):
+    # The token cap stops generation once the section reaches its target
+    max_new_tokens = min(budget.max_new_tokens, MAX_SECTION_TOKENS) if budget else None
+    return get_writer_llm(page_length, max_new_tokens=max_new_tokens, repo=model)
+
+
+def _clean_section(name: str, response, budget: Optional[SectionBudget]) -> PaperSection:
+    content = response.content.strip()
+    if budget:
+        budget.actual_tokens = generated_tokens(response, content)
+
+    # 🧹 Clean text (avoid duplicate headers)
+    content = content.replace("**", "")
+    content = content.replace("Title:", "").replace("Abstract:", "").strip()
+
+    # Remove section name if it appears at the start (case-insensitive)
+    if content.lower().startswith(name.lower()):
+        content = content[len(name):].strip()
+    # Also check for "Conclusion:" style
+    if content.lower().startswith(f"{name.lower()}:"):
+         content = content[len(name)+1:].strip()
+    if budget:
+        content = trim_to_target(content, budget.target_words)
+
+    return PaperSection(section_title=name, content=content)
+
+
 # Iterative writer for longer, detailed papers
-def writer_agent_iterative(topic: str, context: list, page_length: int = 5) -> Tuple[str, List[PaperSection]]:
+async def awriter_agent_iterative(topic: str, context: list, page_length: int = 5, plan: Optional[GenerationPlan] = None,
+                                  excerpts: Optional[Dict[str, str]] = None, model: Optional[str] = None,
+                                  timeout_s: Optional[float] = None) -> Tuple[str, List[PaperSection]]:
     """
     Generate a structured Survey Paper section-by-section.
+    With a plan, each section gets its own word target and max_new_tokens,
+    and the plan's budgets are updated with the tokens actually generated.
+    `excerpts` maps section names to full-text passages added to that section's prompt.
+    Sections are independent, so they are generated concurrently and kept in order.
+    Sections still unfinished after `timeout_s` are cancelled and left out.
     """
-    llm = ChatHuggingFace(llm=get_writer_model(page_length))
-    # Join the context list into a single string
     context_text = "\n\n".join(context)
-
-    # 🧩 Generate Title
     title = f"A Comprehensive Survey of {topic}"
 
+    async def generate(name: str, prompt: str) -> PaperSection:
+        try:
+            print(f"🧠 Generating section: {name}")
+            budget = plan.budget_for(name) if plan else None
+            response = await llm_governor.ainvoke(_section_llm(page_length, budget, model), prompt)
+            return _clean_section(name, response, budget)
+        except Exception as e:
+            return PaperSection(section_title=name, content=f"⚠️ Error generating {name}: {e}", error=str(e))
+
+    tasks = [asyncio.ensure_future(generate(name, prompt)) for name, prompt in _section_prompts(topic, context_text, plan, excerpts)]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=timeout_s)
+    finally:
+        # Out of time (or the job itself was cancelled): stop the sections still generating
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return title, [task.result() for task in tasks if task in done]
+
+
+# --- Hierarchical writer: outline first, then every subsection in parallel ---
+
+# Subsections expanded at once for one paper (the LLM governor still bounds calls process-wide)
+WRITER_CONCURRENCY = int(os.getenv("PAPEROID_WRITER_CONCURRENCY", "8"))
+# Retrieved papers given to each subsection, picked by relevance to its title and focus
+SUBSECTION_CONTEXT_DOCS = 3
+OUTLINE_TOKENS_PER_SUBSECTION = 40
+
+_OUTLINE_ITEM_RE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*(.+?)\s*$")
+_WORD_RE = re.compile(r"[a-z]{4,}")
+
+
+def _outline_prompt(topic: str, context_text: str, plan: GenerationPlan) -> str:
+    wanted = "\n".join(
+        f"## {b.section_title}\n({b.subsections} subsections)" for b in plan.sections if b.subsections > 1
+    )
+    return f"""
+You are an academic researcher planning a long survey paper on "{topic}".
+Based ONLY on the following retrieved papers, propose the subsections of each section listed below.
+For each section, repeat its heading exactly, then write one numbered line per subsection
+in the form "1. Subsection title - what it covers".
+
+CONTEXT (Retrieved Papers):
+{context_text}
+
+SECTIONS:
+{wanted}
+"""
+
+
+def _parse_outline(text: str, plan: GenerationPlan) -> Dict[str, List[Tuple[str, str]]]:
+    """Section -> [(subsection title, focus)] from the model's outline; unknown lines are ignored."""
+    names = {b.section_title.lower(): b.section_title for b in plan.sections}
+    titles: Dict[str, List[Tuple[str, str]]] = {}
+    current = None
+    for line in text.splitlines():
+        heading = line.strip().lstrip("#").replace("*", "").strip().rstrip(":").lower()
+        if line.strip().startswith("#") or heading in names:
+            current = names.get(heading)
+            continue
+        match = _OUTLINE_ITEM_RE.match(line.replace("*", ""))
+        if current and match:
+            parts = re.split(r"\s+[-–—]\s+|:\s+", match.group(1), maxsplit=1)
+            title, focus = parts[0].strip().strip('"')[:80], parts[1] if len(parts) > 1 else ""
+            if title:
+                titles.setdefault(current, []).append((title, focus.strip()))
+    return titles
+
+
+def _relevant_context(context: list, query: str, k: int = SUBSECTION_CONTEXT_DOCS) -> list:
+    """The k context entries sharing the most words with `query`, in their original order."""
+    words = set(_WORD_RE.findall(query.lower()))
+    ranked = sorted(range(len(context)), key=lambda i: -len(words & set(_WORD_RE.findall(context[i].lower()))))
+    return [context[i] for i in sorted(ranked[:k])]
+
+
+def _subsection_prompt(topic: str, item: SubsectionBudget, context: list, outline_text: str, passages: str) -> str:
+    if item.section == "Abstract":
+        return _section_prompts(topic, "\n\n".join(context), None)[0][1].replace("200 words", f"{item.target_words} words")
+    focus = f" It should cover: {item.focus}." if item.focus else ""
+    prompt = (
+        f"Write the subsection '{item.section_title}' of the {item.section} section of a survey paper on '{topic}'.{focus}\n"
+        f"Write about {item.target_words} words of academic prose, without headings. "
+        f"Base it ONLY on the following retrieved papers and cite them by title. Do NOT invent facts:\n"
+        + "\n\n".join(_relevant_context(context, f"{item.section_title} {item.focus}"))
+        + f"\n\nOutline of the whole paper (do not repeat the other subsections):\n{outline_text}"
+    )
+    return f"{prompt}\n\nRelevant passages from the full texts:\n{passages}" if passages else prompt
+
+
+def _outline_llm(page_length: int, plan: GenerationPlan, model: Optional[str]):
+    tokens = 100 + OUTLINE_TOKENS_PER_SUBSECTION * sum(b.subsections for b in plan.sections)
+    return get_writer_llm(page_length, max_new_tokens=tokens, repo=model)
+
+
+def _needs_outline(plan: GenerationPlan) -> bool:
+    return any(b.subsections > 1 for b in plan.sections)
+
+
+def _expansions(topic: str, context: list, plan: GenerationPlan, titles: Dict[str, List[Tuple[str, str]]],
+                chunk_index=None) -> List[Tuple[SubsectionBudget, str]]:
+    """Budget the outline into plan.outline and build one prompt per subsection."""
+    plan.outline = build_outline(plan, titles)
+    outline_text = "\n".join(f"- {item.section} / {item.section_title}" for item in plan.outline)
+    prompts = []
+    for item in plan.outline:
+        passages = chunk_index.excerpts(topic, item.section, k=2, max_chars=1200, focus=f"{item.section_title} {item.focus}") if chunk_index else ""
+        prompts.append((item, _subsection_prompt(topic, item, context, outline_text, passages)))
+    return prompts
+
+
+def _expand_failed(item: SubsectionBudget, error: Exception) -> PaperSection:
+    item.actual_tokens = 0
+    return PaperSection(section_title=item.section_title, content=f"⚠️ Error generating {item.section_title}: {error}",
+                        error=str(error))
+
+
+def _merge_outline(plan: GenerationPlan, written: Dict[int, PaperSection]) -> List[PaperSection]:
+    """Join finished subsections into their sections, in outline order (unfinished ones are left out)."""
     sections = []
+    for budget in plan.sections:
+        parts = [(i, item) for i, item in enumerate(plan.outline) if item.section == budget.section_title and i in written]
+        if not parts:
+            continue
+        budget.actual_tokens = sum(item.actual_tokens or 0 for _, item in parts)
+        if budget.subsections == 1:
+            content = written[parts[0][0]].content
+        else:
+            content = "\n\n".join(f"{item.section_title}\n{written[i].content}" for i, item in parts)
+        # One failed subsection leaves a placeholder in the section, so the section counts as failed
+        error = next((written[i].error for i, _ in parts if written[i].error), None)
+        sections.append(PaperSection(section_title=budget.section_title, content=content, error=error))
+    return sections
 
-    # 🎯 Section Templates 
-    # 🎯 Section Templates 
-    section_prompts = [
-        ("Abstract", f"Write a 200-word academic abstract for '{topic}'. It MUST strictly summarize the findings from the following retrieved papers:\n{context_text}"),
-        ("Introduction", f"Write an Introduction (400–500 words) for '{topic}'. Use the following context to explain the background and problem statement. Do NOT invent facts:\n{context_text}"),
-        ("Literature Review", f"Write a Literature Review (400–500 words) synthesizing the following specific studies. Cite them by title:\n{context_text}"),
-        ("Methodology", f"Write a Methodology (300–400 words) describing the research methods used in the retrieved papers. Synthesize their approaches (e.g., datasets, algorithms, experimental setups) based ONLY on the provided context:\n{context_text}"),
-        ("Results and Discussion", f"Write a Results & Discussion section (500–600 words) synthesizing the key findings and results reported in the retrieved papers. Discuss the implications of these results. Do NOT invent new results:\n{context_text}"),
-        ("Conclusion", f"Write a Conclusion (250–300 words) summarizing the collective findings from the provided context:\n{context_text}")
-    ]
 
-    # ⚙️ Loop through all sections
-    for name, prompt in section_prompts:
+async def awriter_agent_hierarchical(topic: str, context: list, page_length: int, plan: GenerationPlan,
+                                     chunk_index=None, model: Optional[str] = None,
+                                     timeout_s: Optional[float] = None) -> Tuple[str, List[PaperSection]]:
+    """
+    Generate a long paper from a hierarchical plan: one call outlines the
+    subsections, then each subsection is written by its own call, in parallel
+    (up to WRITER_CONCURRENCY), with only the sources and passages relevant to it.
+    `chunk_index` (a ChunkIndex over the job's full texts) supplies those passages.
+    Subsections still unfinished after `timeout_s` (outline included) are cancelled and left out.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout_s is None else loop.time() + timeout_s
+    title = f"A Comprehensive Survey of {topic}"
+    titles = {}
+    if _needs_outline(plan):
         try:
-            print(f"🧠 Generating section: {name}")
-            response = llm.invoke(prompt)
-            content = response.content.strip()
-
-            # 🧹 Clean text (avoid duplicate headers)
-            content = content.replace("**", "")
-            content = content.replace("Title:", "").replace("Abstract:", "").strip()
-            
-            # Remove section name if it appears at the start (case-insensitive)
-            if content.lower().startswith(name.lower()):
-                content = content[len(name):].strip()
-            # Also check for "Conclusion:" style
-            if content.lower().startswith(f"{name.lower()}:"):
-                 content = content[len(name)+1:].strip()
-
-            sections.append(PaperSection(section_title=name, content=content))
+            print("🗂️ Outlining subsections...")
+            response = await asyncio.wait_for(
+                llm_governor.ainvoke(_outline_llm(page_length, plan, model), _outline_prompt(topic, "\n\n".join(context), plan)),
+                timeout=timeout_s
+            )
+            titles = _parse_outline(response.content, plan)
         except Exception as e:
-            sections.append(PaperSection(section_title=name, content=f"⚠️ Error generating {name}: {e}"))
+            print(f"⚠️ Outline failed, using generic subsection titles: {e!r}")
 
-    # ✅ Return final structured paper
-    return title, sections
+    semaphore = asyncio.Semaphore(WRITER_CONCURRENCY)
+
+    async def expand(item: SubsectionBudget, prompt: str) -> PaperSection:
+        async with semaphore:
+            try:
+                print(f"🧠 Generating subsection: {item.section} / {item.section_title}")
+                response = await llm_governor.ainvoke(_section_llm(page_length, item, model), prompt)
+                return _clean_section(item.section_title, response, item)
+            except Exception as e:
+                return _expand_failed(item, e)
+
+    tasks = [asyncio.ensure_future(expand(item, prompt)) for item, prompt in _expansions(topic, context, plan, titles, chunk_index)]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=None if deadline is None else max(deadline - loop.time(), 0))
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return title, _merge_outline(plan, {i: task.result() for i, task in enumerate(tasks) if task in done})
+
+
+# --- Single-section rewrite (for fix-ups of a finished paper) ---
+
+def _rewrite_request(instructions: Optional[str], previous: str) -> str:
+    text = f"\n\nThe current version is below; write an improved replacement.\n{previous}" if previous else ""
+    if instructions:
+        text += f"\n\nFollow these instructions: {instructions}"
+    return text
+
+
+def _rewrite_prompt(topic: str, context: list, section_title: str, plan: Optional[GenerationPlan],
+                    excerpts: Optional[str], instructions: Optional[str], previous: str) -> str:
+    context_text = "\n\n".join(context)
+    prompts = dict(_section_prompts(topic, context_text, plan, {section_title: excerpts} if excerpts else None))
+    prompt = prompts.get(section_title) or (
+        f"Write the '{section_title}' section of a paper on '{topic}' based ONLY on the following context:\n{context_text}"
+    )
+    return prompt + _rewrite_request(instructions, previous)
+
+
+def _previous_parts(previous: str, items: List[SubsectionBudget]) -> List[str]:
+    """Split a section merged from subsections back into each one's text ("" when its heading is gone)."""
+    starts = [previous.find(f"{item.section_title}\n") for item in items]
+    parts = []
+    for n, (item, start) in enumerate(zip(items, starts)):
+        if start < 0:
+            parts.append("")
+            continue
+        ends = [s for s in starts[n + 1:] if s > start]
+        parts.append(previous[start + len(item.section_title) + 1:min(ends) if ends else len(previous)].strip())
+    return parts
+
+
+async def _arewrite_subsections(topic: str, context: list, budget: SectionBudget, plan: GenerationPlan, page_length: int,
+                                excerpts: Optional[str], instructions: Optional[str], previous: str) -> PaperSection:
+    # A hierarchical section is longer than one call can write, so each subsection is rewritten by its own call
+    items = [item for item in plan.outline if item.section == budget.section_title]
+    items = items or [item for item in build_outline(plan, {}) if item.section == budget.section_title]
+    outline_text = "\n".join(f"- {item.section} / {item.section_title}" for item in plan.outline or items)
 
+    async def rewrite(item: SubsectionBudget, old: str) -> PaperSection:
+        prompt = _subsection_prompt(topic, item, context, outline_text, excerpts or "") + _rewrite_request(instructions, old)
+        return _clean_section(item.section_title, await llm_governor.ainvoke(_section_llm(page_length, item), prompt), item)
+
+    written = await asyncio.gather(*(rewrite(item, old) for item, old in zip(items, _previous_parts(previous, items))))
+    budget.actual_tokens = sum(item.actual_tokens or 0 for item in items)
+    content = "\n\n".join(f"{item.section_title}\n{section.content}" for item, section in zip(items, written))
+    return PaperSection(section_title=budget.section_title, content=content)
+
+
+async def awriter_agent_section(topic: str, context: list, section_title: str, page_length: int = 5,
+                                plan: Optional[GenerationPlan] = None, excerpts: Optional[str] = None,
+                                instructions: Optional[str] = None, previous: str = "") -> PaperSection:
+    """
+    Rewrite one section of an existing paper with the writer that produced it:
+    the single-shot paper with one full-budget call, a hierarchical section
+    subsection by subsection, and any other section with a single LLM call.
+    """
+    if section_title == SINGLE_SHOT_SECTION:
+        prompt = _single_shot_prompt(topic, "\n\n".join(context), page_length, plan) + _rewrite_request(instructions, previous)
+        _, sections = _single_shot_result(topic, await llm_governor.ainvoke(_single_shot_llm(page_length, plan), prompt), plan)
+        return sections[0]
+    budget = plan.budget_for(section_title) if plan else None
+    if budget and budget.subsections > 1:
+        return await _arewrite_subsections(topic, context, budget, plan, page_length, excerpts, instructions, previous)
+    prompt = _rewrite_prompt(topic, context, section_title, plan, excerpts, instructions, previous)
+    return _clean_section(section_title, await llm_governor.ainvoke(_section_llm(page_length, budget), prompt), budget)
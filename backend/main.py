@@ -1,18 +1,42 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
-from schemas.paper_schemas import PaperoidState, ResearchRequest
-from workflow.research_graph import stream_research_graph
-from tools.arxiv_tool import search_arxiv, calculate_similarity
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from schemas.paper_schemas import ResearchRequest, PaperSection, SectionRegenerationRequest
+from workflow.job_runner import start_job, tail_events, parse_last_event_id
+from workflow.section_editor import aregenerate_section
+from workflow.exports import aexport_job
+from tools.arxiv_tool import asearch_arxiv, score_similar_papers
+from tools.fingerprint import fingerprint_index, check_sections
+from storage.job_store import get_job_store
+from agents.llm_governor import llm_governor
+from workflow.scheduler import scheduler
+from workflow.result_cache import originality_group
+from workflow.research_graph import DRAFT_PDF_ARTIFACT, warm_up
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
 import os
 import json
 
 
+# Heavy libraries and LLM clients load on first use, so a worker starts fast.
+# Set PAPEROID_WARMUP=1 to load them at startup instead, before the worker takes traffic.
+WARMUP = os.getenv("PAPEROID_WARMUP", "").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        await asyncio.to_thread(warm_up)
+    yield
+
+
 app = FastAPI(
     title="Paperoid Research Paper Generator",
     description="AI-powered backend to generate structured research papers using LLaMA 3",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -31,32 +55,97 @@ def read_root():
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "paperoid-api"}
+    return {"status": "healthy", "service": "paperoid-api", "llm": llm_governor.stats(), "jobs": scheduler.stats()}
+
+
+def client_id_for(http_request: Request, x_client_id: Optional[str]) -> str:
+    """Who a job is scheduled for: the X-Client-Id header, else the caller's address."""
+    if x_client_id:
+        return x_client_id
+    return http_request.client.host if http_request.client else "anonymous"
+
 
 @app.post("/generate-paper/")
-async def generate_paper(request: ResearchRequest):
+async def generate_paper(request: ResearchRequest, http_request: Request, x_client_id: Optional[str] = Header(None)):
     """
     Generate a research paper based on the provided request.
     Returns a streaming response with progress updates.
+    The job runs in the background and logs every event, so if this connection
+    drops the client can resume from /jobs/{job_id}/events without recomputation
+    (the first event carries the job_id).
     """
-    state = PaperoidState(request=request)
-    
-    def event_generator():
-        for update in stream_research_graph(state):
+    job_id = await start_job(request, client_id_for(http_request, x_client_id))
+
+    async def event_generator():
+        async for _, update in tail_events(job_id):
             yield json.dumps(update) + "\n"
 
     return StreamingResponse(event_generator(), media_type="application/x-ndjson")
 
 
+@app.post("/jobs/")
+async def create_job(request: ResearchRequest, http_request: Request, x_client_id: Optional[str] = Header(None)):
+    """
+    Start a generation without holding a connection open; poll /jobs/{job_id}
+    or follow /jobs/{job_id}/events.
+    """
+    return {"job_id": await start_job(request, client_id_for(http_request, x_client_id))}
+
+
+@app.get("/jobs/{job_id}/log")
+async def job_log(job_id: str, after: int = 0):
+    """
+    Non-blocking poll of a job's progress: status plus the events after `after`.
+    """
+    store = get_job_store()
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    events = await asyncio.to_thread(store.read_events, job_id, after)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "events": [{"seq": seq, **event} for seq, event in events]
+    }
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: Optional[str] = Header(None), after: Optional[int] = None):
+    """
+    Server-Sent Events stream of a job's progress log.
+    Reconnecting with the Last-Event-ID header (or ?after=<seq>) replays only the
+    events the client has not seen yet.
+    """
+    if await asyncio.to_thread(get_job_store().get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    after_seq = after if after is not None else parse_last_event_id(last_event_id)
+
+    async def sse_generator():
+        async for seq, event in tail_events(job_id, after_seq):
+            yield f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        sse_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 class PlagiarismRequest(BaseModel):
     title: str
     abstract: str
+    # Optional full text for passage-level matching; defaults to the abstract only
+    sections: Optional[List[PaperSection]] = None
+    # Job that produced the text, so it is not matched against itself
+    job_id: Optional[str] = None
 
 
 @app.post("/check-plagiarism/")
 async def check_plagiarism(request: PlagiarismRequest):
     """
     Check for potential plagiarism (similarity) against arXiv papers.
+    Besides whole-abstract similarity, every section is fingerprinted and matched
+    passage-by-passage against arXiv abstracts and previously generated papers.
     """
     try:
         # Helper to extract keywords (simple stopword removal)
@@ -71,61 +160,116 @@ async def check_plagiarism(request: PlagiarismRequest):
         if not search_query:
             search_query = request.title # Fallback to raw title if keywords fail
 
-        search_results = search_arxiv(search_query, max_results=50)
+        search_results = await asearch_arxiv(search_query, max_results=50)
         
         # Fallback: If no results found, try keywords from Abstract
         if not search_results:
              fallback_query = extract_keywords(request.abstract)
              if fallback_query:
-                search_results = search_arxiv(fallback_query, max_results=50)
-        
-        similar_papers = []
+                search_results = await asearch_arxiv(fallback_query, max_results=50)
         
-        if search_results:
-            for paper in search_results:
-                # 2. Calculate similarity between abstracts
-                paper_summary = paper.get("summary", "")
-                # Use Jaccard similarity (Word Overlap)
-                similarity_score = calculate_similarity(request.abstract, paper_summary)
-                
-                # Convert to percentage
-                score_percent = round(similarity_score * 100, 2)
-                
-                similar_papers.append({
-                    "title": paper.get("title"),
-                    "link": paper.get("link"),
-                    "pdf": paper.get("pdf"),
-                    "similarity_score": score_percent,
-                    "summary": paper_summary[:200] + "..." # Truncate for display
-                })
-                
-            # Sort by similarity score descending
-            similar_papers.sort(key=lambda x: x["similarity_score"], reverse=True)
-
-        # Calculate overall plagiarism score (Max of individual scores)
-        overall_score = 0.0
-        if similar_papers:
-            overall_score = max(p["similarity_score"] for p in similar_papers)
-            
+        # Passage-level check: index the fetched abstracts, then match every section
+        for paper in search_results:
+            fingerprint_index.add_document(paper.get("link"), paper.get("summary", ""), title=paper.get("title", ""), group="arxiv")
+        sections = request.sections or [PaperSection(section_title="Abstract", content=request.abstract)]
+        # A paper served from the result cache is indexed under the job that generated it
+        own_group = await asyncio.to_thread(originality_group, request.job_id)
+        passage_matches = await asyncio.to_thread(check_sections, sections, fingerprint_index, exclude_group=own_group)
+
+        # Whole-abstract similarity (word overlap) with each search result
+        similar_papers, overall_score = score_similar_papers(request.abstract, search_results or [])
+
         return {
             "similar_papers": similar_papers,
-            "overall_score": overall_score
+            "overall_score": overall_score,
+            "passage_matches": [s.model_dump() for s in passage_matches]
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking plagiarism: {str(e)}")
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status (and result, once completed) of a generation job.
+    """
+    job = await asyncio.to_thread(get_job_store().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/{job_id}/sections/regenerate")
+async def regenerate_section(job_id: str, request: SectionRegenerationRequest):
+    """
+    Rewrite one section of a completed paper and re-render its PDF,
+    without re-running retrieval or the other sections.
+    """
+    job = await asyncio.to_thread(get_job_store().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "COMPLETED":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not COMPLETED")
+    try:
+        return await aregenerate_section(job_id, request)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error regenerating section: {str(e)}")
+
+
+@app.get("/jobs/{job_id}/export/{format_name}")
+async def export_paper(job_id: str, format_name: str):
+    """
+    Download a completed paper as pdf, md, html or tex.
+    Each format is rendered on first request and cached with the job.
+    """
+    try:
+        data, fmt = await aexport_job(job_id, format_name)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(
+        data,
+        media_type=fmt.media_type,
+        headers={"Content-Disposition": f'attachment; filename="research_paper_{job_id}.{fmt.extension}"'}
+    )
+
+
+@app.get("/jobs/{job_id}/preview")
+async def preview_pdf(job_id: str):
+    """
+    The provisional PDF of a job's draft, published before refinement finishes.
+    """
+    pdf_bytes = await asyncio.to_thread(get_job_store().get_artifact, job_id, DRAFT_PDF_ARTIFACT)
+    if pdf_bytes is None:
+        raise HTTPException(status_code=404, detail="No draft preview for this job")
+    return Response(
+        pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="draft_{job_id}.pdf"'}
+    )
+
+
 @app.get("/download-pdf/{job_id}")
 async def download_pdf(job_id: str):
     """
     Download the generated PDF by job_id.
     """
+    pdf_bytes = await asyncio.to_thread(get_job_store().get_artifact, job_id, "paper.pdf")
+    if pdf_bytes is not None:
+        return Response(
+            pdf_bytes,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="research_paper_{job_id}.pdf"'}
+        )
+
+    # Fall back to this worker's local output/ (papers generated before the shared store)
     output_dir = "output"
     pdf_path = None
     
     # Search for the PDF file with matching job_id
-    for filename in os.listdir(output_dir):
+    for filename in (os.listdir(output_dir) if os.path.isdir(output_dir) else []):
         if filename.startswith(f"paper_{job_id}") and filename.endswith(".pdf"):
             pdf_path = os.path.join(output_dir, filename)
             break
@@ -1,5 +1,9 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+import operator
+import sys
+import threading
+import weakref
+from typing import Annotated, Iterable, Iterator, List, Literal, NamedTuple, Optional
+from pydantic import BaseModel, Field, field_validator
 
 # --- User Input ---
 
@@ -12,6 +16,13 @@ class ResearchRequest(BaseModel):
     word_count: int = Field(5000, description="Approximate total word count for the paper.")
     num_references: int = Field(10, description="Minimum number of references to include.")
     page_length: int = Field(5, description="Approximate number of pages to generate.")
+    mode: Literal["fast", "balanced", "thorough"] = Field(
+        "balanced", description="fast: fewer references, one-shot draft, no refinement; thorough: every stage at full length."
+    )
+    deadline_s: Optional[float] = Field(
+        None, gt=0, description="Seconds (from submission) the caller can wait; stages are shortened to finish in time."
+    )
+    force_refresh: bool = Field(False, description="Generate again even if an identical request was answered recently.")
 
 
 # --- Documents and References ---
@@ -23,6 +34,41 @@ class SourceDocument(BaseModel):
     source_url: str = Field(..., description="URL or ID of the source.")
     title: str = Field(..., description="Title of the source document.")
     content_snippet: str = Field(..., description="Important part of the document used in generation.")
+    pdf_url: Optional[str] = Field(None, description="Link to the full-text PDF, when available.")
+
+    class Config:
+        frozen = True
+
+
+_document_pool: "weakref.WeakValueDictionary[tuple, SourceDocument]" = weakref.WeakValueDictionary()
+_document_pool_lock = threading.Lock()
+
+
+def intern_document(source_url: str, title: str, content_snippet: str, pdf_url: Optional[str] = None) -> SourceDocument:
+    """
+    Return a shared SourceDocument for the given fields.
+    Concurrent jobs retrieving the same paper reuse one record instead of
+    holding their own copy; records are dropped once no job references them.
+    """
+    key = (source_url, title, content_snippet, pdf_url)
+    with _document_pool_lock:
+        doc = _document_pool.get(key)
+        if doc is None:
+            doc = SourceDocument(source_url=source_url, title=title, content_snippet=content_snippet, pdf_url=pdf_url)
+            _document_pool[key] = doc
+        return doc
+
+class TextChunk(BaseModel):
+    """
+    A passage of a source document's full text, extracted from its PDF.
+    """
+    source_url: str = Field(..., description="Document the chunk belongs to.")
+    title: str = Field("", description="Title of that document.")
+    page: int = Field(..., description="1-based page the chunk starts on.")
+    text: str = Field(..., description="Chunk text.")
+
+    class Config:
+        frozen = True
 
 # --- Citation for paper ---
 
@@ -43,23 +89,155 @@ class PaperSection(BaseModel):
     """
     section_title: str = Field(..., description="Section title.")
     content: str = Field(..., description="Generated content for this section.")
+    error: Optional[str] = Field(None, exclude=True, description="Why generation failed; the content is then a placeholder (not serialized).")
+
+
+class SectionRecord(NamedTuple):
+    """Lightweight, immutable (section_title, content) pair used inside SectionStore."""
+    section_title: str
+    content: str
+
+
+class SectionStore:
+    """
+    Compact, ordered storage for generated sections.
+    Each section's text is held exactly once; joined views are computed on demand.
+    """
+    __slots__ = ("_records",)
+
+    def __init__(self, sections: Iterable = ()):
+        self._records: List[SectionRecord] = []
+        for section in sections:
+            self.append(section.section_title, section.content)
+
+    def append(self, section_title: str, content: str) -> None:
+        # Titles repeat across every job ("Introduction", ...), so share them
+        self._records.append(SectionRecord(sys.intern(section_title), content))
+
+    def find(self, section_title: str) -> Optional[SectionRecord]:
+        """Return the first section whose title matches (case-insensitive)."""
+        wanted = section_title.lower()
+        return next((r for r in self._records if r.section_title.lower() == wanted), None)
+
+    def joined(self, separator: str = "\n\n") -> str:
+        """Join all section contents into a single string (built on each call, never stored)."""
+        return separator.join(r.content for r in self._records)
+
+    def to_sections(self) -> List[PaperSection]:
+        """Materialize the records as PaperSection models (e.g. for API responses)."""
+        return [PaperSection(section_title=r.section_title, content=r.content) for r in self._records]
+
+    def __iter__(self) -> Iterator[SectionRecord]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index: int) -> SectionRecord:
+        return self._records[index]
+
+    def __repr__(self) -> str:
+        return f"SectionStore({[r.section_title for r in self._records]!r})"
+
+
+# --- Originality (passage-level fingerprint matches) ---
+
+class PassageMatch(BaseModel):
+    """
+    A passage of a generated section that also appears in an indexed document.
+    """
+    section_title: str = Field(..., description="Section containing the passage.")
+    start: int = Field(..., description="Character offset where the passage starts in the section.")
+    end: int = Field(..., description="Character offset where the passage ends in the section.")
+    text: str = Field(..., description="The matching passage.")
+    source_id: str = Field(..., description="ID of the document it matches.")
+    source_title: str = Field("", description="Title of the matching document.")
+    source_start: int = Field(..., description="Character offset of the match in the source.")
+    source_end: int = Field(..., description="Character end offset of the match in the source.")
+
+
+class SectionOriginality(BaseModel):
+    """
+    Fingerprint-matching result for one section.
+    """
+    section_title: str = Field(..., description="Section title.")
+    overlap_percent: float = Field(..., description="Share of the section's characters covered by matches.")
+    matches: List[PassageMatch] = Field(default_factory=list, description="Matching passages, by source and offset.")
+
+
+# --- Generation Plan ---
+
+class SectionBudget(BaseModel):
+    """
+    Planned length and token budget for one section.
+    """
+    section_title: str = Field(..., description="Section title.")
+    target_words: int = Field(..., description="Target length of the section in words.")
+    max_new_tokens: int = Field(..., description="Generation cap passed to the model for this section.")
+    actual_tokens: Optional[int] = Field(None, description="Tokens actually generated (filled in after writing).")
+    subsections: int = Field(1, description="Subsections the hierarchical writer splits this section into.")
+
+
+class SubsectionBudget(SectionBudget):
+    """
+    One outline entry of the hierarchical writer, expanded by its own LLM call.
+    `section_title` is the subsection's own title; `section` names its parent.
+    """
+    section: str = Field(..., description="Title of the section this subsection belongs to.")
+    focus: str = Field("", description="What the subsection should cover, from the outline.")
+
+
+class GenerationPlan(BaseModel):
+    """
+    Per-section length targets derived from the request's word_count, page_length and num_references.
+    """
+    total_words: int = Field(..., description="Target length of the whole paper in words.")
+    sections: List[SectionBudget] = Field(default_factory=list, description="Budgets in generation order.")
+    hierarchical: bool = Field(False, description="Sections are outlined into subsections and expanded in parallel.")
+    outline: List[SubsectionBudget] = Field(default_factory=list, description="Subsections, in order (hierarchical plans).")
+    max_total_tokens: Optional[int] = Field(None, description="Cap on the whole paper when one call writes it (single-shot).")
+
+    def budget_for(self, section_title: str) -> Optional[SectionBudget]:
+        return next((b for b in self.sections if b.section_title == section_title), None)
+
+    @property
+    def planned_tokens(self) -> int:
+        planned = sum(b.max_new_tokens for b in self.sections)
+        return min(planned, self.max_total_tokens) if self.max_total_tokens else planned
+
+    @property
+    def actual_tokens(self) -> int:
+        return sum(b.actual_tokens or 0 for b in self.sections)
 
 
 # --- LangGraph State (during generation) ---
 
 class PaperoidState(BaseModel):
-    """Tracks data while the paper is being generated."""
+    """
+    Tracks data while the paper is being generated.
+    Section text lives only in `sections`; `draft_text` is derived from it lazily,
+    and `abstract` references the Abstract section's string rather than copying it.
+    """
     request: ResearchRequest
     documents: List[SourceDocument] = Field(default_factory=list)
-    sections: List[PaperSection] = Field(default_factory=list)
+    # Full texts stay in the ingest cache; the state only names the PDFs that were ingested
+    ingested: List[str] = Field(default_factory=list)
+    sections: SectionStore = Field(default_factory=SectionStore)
     references: List[Citation] = Field(default_factory=list)
+    plan: Optional[GenerationPlan] = None
     draft_title: Optional[str] = None
-    draft_text: Optional[str] = None  
     abstract: Optional[str] = None
-    errors: List[str] = Field(default_factory=list)
+    # Appended to by parallel branches, so updates are merged (nodes return only new entries)
+    errors: Annotated[List[str], operator.add] = Field(default_factory=list)
+    failed_sections: List[str] = Field(default_factory=list, description="Sections whose LLM call failed (placeholder text).")
     output_pdf: Optional[str] = None
+    preview_pdf: Optional[str] = None
+    preview_version: Optional[str] = None
+    originality: Optional[dict] = None
     generation_time_s: Optional[float] = None
     start_time: Optional[float] = None
+    deadline_at: Optional[float] = None
+    shortened: Annotated[List[str], operator.add] = Field(default_factory=list, description="Stages cut down by the mode or the deadline.")
     status: str = Field(default="RUNNING", description="Current generation status")
     
 
@@ -71,6 +249,18 @@ class PaperoidState(BaseModel):
         arbitrary_types_allowed = True
         extra = 'allow'
 
+    @field_validator("sections", mode="before")
+    @classmethod
+    def _coerce_sections(cls, value):
+        if isinstance(value, SectionStore):
+            return value
+        return SectionStore(value or ())
+
+    @property
+    def draft_text(self) -> str:
+        """The full draft, joined from the stored sections."""
+        return self.sections.joined()
+
 
 
 class ResearchPaper(BaseModel):
@@ -84,3 +274,27 @@ class ResearchPaper(BaseModel):
     references: List[Citation] = Field(..., description="List of references used.")
     generation_time_s: float = Field(..., description="Time taken to generate the paper (in seconds).")
     status: str = Field("COMPLETED", description="Final status of the paper generation.")
+    request: Optional[ResearchRequest] = Field(None, description="The request the paper was generated for.")
+    documents: List[SourceDocument] = Field(default_factory=list, description="Retrieved sources the sections were written from.")
+    plan: Optional[GenerationPlan] = Field(None, description="Per-section length and token budgets.")
+
+
+class PaperDocument(BaseModel):
+    """
+    Format-neutral view of a finished paper that the PDF, Markdown, HTML and LaTeX renderers share.
+    """
+    title: str = Field(..., description="Paper title.")
+    abstract: str = Field(..., description="Abstract text.")
+    sections: List[PaperSection] = Field(default_factory=list, description="Body sections in order (no abstract or references).")
+    references: List[str] = Field(default_factory=list, description="Formatted reference entries.")
+
+    class Config:
+        frozen = True
+
+
+class SectionRegenerationRequest(BaseModel):
+    """
+    Request to rewrite one section of a completed paper.
+    """
+    section_title: str = Field(..., description="Title of the section to regenerate (case-insensitive).")
+    instructions: Optional[str] = Field(None, description="Optional guidance for the rewrite (e.g. 'more concise').")
@@ -0,0 +1,240 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+from typing import Callable, List, Optional
+
+# Unreferenced blobs younger than this are kept: a worker may be about to alias them
+ORPHAN_GRACE_S = 300
+
+
+class BlobStore:
+    """
+    Content-addressed blob storage (sha256 -> file) with reference-counted aliases.
+
+    Identical artifacts (cached or retried jobs) are stored once. Every (job_id, name)
+    alias holds one reference; a size/age quota is enforced by evicting the least
+    recently used blobs together with their aliases, and cold blobs can optionally
+    be gzip-compressed. Metadata lives in SQLite so every worker sees the same state.
+    """
+
+    def __init__(self, root: str, db_path: str, max_bytes: Optional[int] = None,
+                 max_age_s: Optional[float] = None, compress_after_s: Optional[float] = None):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.compress_after_s = compress_after_s
+        self._evictor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        os.makedirs(self.root, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " digest TEXT PRIMARY KEY, size INTEGER NOT NULL, stored_size INTEGER NOT NULL,"
+                " compressed INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blob_aliases ("
+                " job_id TEXT NOT NULL, name TEXT NOT NULL, digest TEXT NOT NULL, media_type TEXT,"
+                " created_at REAL NOT NULL, PRIMARY KEY (job_id, name))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blob_aliases_digest ON blob_aliases (digest)")
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _path(self, digest: str, compressed: bool = False) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.root, digest[:2], digest + (".gz" if compressed else ""))
+
+    # --- Blobs ---
+
+    def put(self, data: bytes) -> str:
+        """Store `data` (once) and return its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            known = conn.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if known:
+                conn.execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (now, digest))
+                return digest
+
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, stored_size, compressed, created_at, last_access) VALUES (?, ?, ?, 0, ?, ?)",
+                (digest, len(data), len(data), now, now),
+            )
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Return a blob's bytes (transparently decompressed), or None if evicted."""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT compressed FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (time.time(), digest))
+        # Try the recorded form first; the other covers a concurrent cold compression
+        for compressed in (bool(row[0]), not row[0]):
+            try:
+                with (gzip.open if compressed else open)(self._path(digest, compressed), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        return None
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Path of an uncompressed blob on this host, if there is one."""
+        path = self._path(digest)
+        return path if os.path.exists(path) else None
+
+    # --- Aliases ---
+
+    def link(self, job_id: str, name: str, digest: str, media_type: Optional[str] = None) -> None:
+        """
+        Point (job_id, name) at a blob. A blob it pointed at before loses that
+        reference and is garbage-collected by enforce_quota once unreferenced.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blob_aliases (job_id, name, digest, media_type, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, name, digest, media_type, time.time()),
+            )
+
+    def resolve(self, job_id: str, name: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT digest FROM blob_aliases WHERE job_id = ? AND name = ?", (job_id, name)).fetchone()
+        return row[0] if row else None
+
+    def unlink(self, job_id: str, name: Optional[str] = None) -> None:
+        """Drop one alias (or all of a job's); blobs left without references are deleted."""
+        with closing(self._connect()) as conn, conn:
+            if name is None:
+                digests = [r[0] for r in conn.execute("SELECT digest FROM blob_aliases WHERE job_id = ?", (job_id,))]
+                conn.execute("DELETE FROM blob_aliases WHERE job_id = ?", (job_id,))
+            else:
+                digests = [r[0] for r in conn.execute("SELECT digest FROM blob_aliases WHERE job_id = ? AND name = ?", (job_id, name))]
+                conn.execute("DELETE FROM blob_aliases WHERE job_id = ? AND name = ?", (job_id, name))
+            orphans = [d for d in set(digests) if self._refcount(conn, d) == 0]
+            self._delete(conn, orphans)
+
+    @staticmethod
+    def _refcount(conn: sqlite3.Connection, digest: str) -> int:
+        return conn.execute("SELECT COUNT(*) FROM blob_aliases WHERE digest = ?", (digest,)).fetchone()[0]
+
+    def refcount(self, digest: str) -> int:
+        with closing(self._connect()) as conn:
+            return self._refcount(conn, digest)
+
+    # --- Quota ---
+
+    def usage(self) -> int:
+        """Bytes currently on disk."""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()[0]
+
+    def _delete(self, conn: sqlite3.Connection, digests: List[str]) -> None:
+        for digest in digests:
+            row = conn.execute("SELECT compressed FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            conn.execute("DELETE FROM blob_aliases WHERE digest = ?", (digest,))
+            conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            if row is not None:
+                try:
+                    os.remove(self._path(digest, bool(row[0])))
+                except FileNotFoundError:
+                    pass
+
+    def enforce_quota(self) -> List[str]:
+        """
+        Delete orphaned and expired blobs, then least-recently-used ones until the
+        store fits in max_bytes. Returns the evicted digests.
+        """
+        now = time.time()
+        evicted = []
+        with closing(self._connect()) as conn, conn:
+            # BEGIN IMMEDIATE serializes eviction across workers
+            conn.execute("BEGIN IMMEDIATE")
+            evicted += [r[0] for r in conn.execute(
+                "SELECT digest FROM blobs WHERE created_at < ? AND digest NOT IN (SELECT digest FROM blob_aliases)",
+                (now - ORPHAN_GRACE_S,),
+            )]
+            if self.max_age_s:
+                evicted += [r[0] for r in conn.execute("SELECT digest FROM blobs WHERE last_access < ?", (now - self.max_age_s,))]
+            self._delete(conn, list(dict.fromkeys(evicted)))
+
+            if self.max_bytes is not None:
+                total = conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()[0]
+                lru = conn.execute("SELECT digest, stored_size FROM blobs ORDER BY last_access").fetchall()
+                victims = []
+                for digest, stored_size in lru:
+                    if total <= self.max_bytes:
+                        break
+                    victims.append(digest)
+                    total -= stored_size
+                self._delete(conn, victims)
+                evicted += victims
+        return evicted
+
+    def compress_cold(self) -> int:
+        """Gzip blobs not read for compress_after_s seconds. Returns how many were compressed."""
+        if not self.compress_after_s:
+            return 0
+        with closing(self._connect()) as conn:
+            cold = [r[0] for r in conn.execute(
+                "SELECT digest FROM blobs WHERE compressed = 0 AND last_access < ?", (time.time() - self.compress_after_s,)
+            )]
+        done = 0
+        for digest in cold:
+            src = self._path(digest)
+            if not os.path.exists(src):
+                continue
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(src), prefix=".tmp-")
+            with open(src, "rb") as f_in, gzip.open(os.fdopen(fd, "wb"), "wb") as f_out:
+                f_out.write(f_in.read())
+            os.replace(tmp_path, self._path(digest, compressed=True))
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "UPDATE blobs SET compressed = 1, stored_size = ? WHERE digest = ?",
+                    (os.path.getsize(self._path(digest, compressed=True)), digest),
+                )
+            os.remove(src)
+            done += 1
+        return done
+
+    def start_evictor(self, interval_s: float = 60, on_pass: Optional[Callable[[], int]] = None) -> None:
+        """
+        Run quota enforcement and cold compression periodically in a daemon thread.
+        `on_pass` runs after each pass (e.g. pruning the jobs that owned evicted blobs)
+        and returns how many records it removed.
+        """
+        if self._evictor and self._evictor.is_alive():
+            return
+
+        def loop():
+            while not self._stop.wait(interval_s):
+                try:
+                    evicted = self.enforce_quota()
+                    compressed = self.compress_cold()
+                    pruned = on_pass() if on_pass else 0
+                    if evicted or compressed or pruned:
+                        print(f"🧹 Output store: evicted {len(evicted)} blobs, compressed {compressed}, pruned {pruned} jobs.")
+                except Exception as e:
+                    print(f"❌ Output store maintenance failed: {e}")
+
+        self._stop.clear()
+        self._evictor = threading.Thread(target=loop, name="blob-evictor", daemon=True)
+        self._evictor.start()
+
+    def stop_evictor(self) -> None:
+        self._stop.set()
@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import List, Optional, Tuple
+from storage.blob_store import BlobStore
+
+DEFAULT_STORE_URL = "sqlite:///output/paperoid.db"
+DEFAULT_OUTPUT_MAX_BYTES = 2 * 1024 ** 3      # 2 GiB
+DEFAULT_OUTPUT_MAX_AGE_S = 7 * 24 * 3600      # one week
+DEFAULT_JOB_MAX_AGE_S = 30 * 24 * 3600        # finished jobs' status and event log
+PRUNE_GRACE_S = 3600                          # lets a client still read a just-evicted job's status
+
+
+class JobStore(ABC):
+    """
+    Job status, results and artifacts (e.g. the PDF), shared by every worker.
+    Implementations must be safe to use from several threads and processes;
+    a networked store only has to implement these methods.
+    """
+
+    @abstractmethod
+    def put_job(self, job_id: str, status: str, result: Optional[dict] = None) -> None:
+        """Create or update a job's status (and result payload, once known)."""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Return {"job_id", "status", "result", "updated_at"} or None if unknown."""
+
+    @abstractmethod
+    def touch_job(self, job_id: str) -> None:
+        """Refresh a RUNNING job's updated_at (its worker's heartbeat); finished jobs are left as they are."""
+
+    @abstractmethod
+    def put_artifact(self, job_id: str, name: str, data: bytes, media_type: str = "application/octet-stream") -> None:
+        """Store an artifact produced by a job (overwrites an existing one with the same name)."""
+
+    @abstractmethod
+    def get_artifact(self, job_id: str, name: str) -> Optional[bytes]:
+        """Return the artifact's bytes, or None if it does not exist."""
+
+    @abstractmethod
+    def delete_job(self, job_id: str) -> None:
+        """Forget a job and release its artifacts."""
+
+    @abstractmethod
+    def append_event(self, job_id: str, event: dict) -> int:
+        """Append a progress event to the job's log and return its sequence number (1, 2, ...)."""
+
+    @abstractmethod
+    def read_events(self, job_id: str, after_seq: int = 0) -> List[Tuple[int, dict]]:
+        """Return the job's (seq, event) pairs with seq > after_seq, in order."""
+
+    def has_artifact(self, job_id: str, name: str) -> bool:
+        """Whether the artifact exists; stores override this to answer without reading it."""
+        return self.get_artifact(job_id, name) is not None
+
+    def artifact_path(self, job_id: str, name: str) -> Optional[str]:
+        """Local filesystem path of an artifact, when the store keeps one on this host."""
+        return None
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local stand-in for tests and single-worker development."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._artifacts = {}
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def put_job(self, job_id, status, result=None):
+        with self._lock:
+            job = self._jobs.setdefault(job_id, {"job_id": job_id, "result": None})
+            job["status"] = status
+            if result is not None:
+                job["result"] = result
+            job["updated_at"] = time.time()
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def touch_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] == "RUNNING":
+                job["updated_at"] = time.time()
+
+    def put_artifact(self, job_id, name, data, media_type="application/octet-stream"):
+        with self._lock:
+            self._artifacts[(job_id, name)] = bytes(data)
+
+    def get_artifact(self, job_id, name):
+        with self._lock:
+            return self._artifacts.get((job_id, name))
+
+    def has_artifact(self, job_id, name):
+        with self._lock:
+            return (job_id, name) in self._artifacts
+
+    def append_event(self, job_id, event):
+        with self._lock:
+            log = self._events.setdefault(job_id, [])
+            log.append(event)
+            return len(log)
+
+    def read_events(self, job_id, after_seq=0):
+        with self._lock:
+            log = self._events.get(job_id, [])
+            return [(seq, event) for seq, event in enumerate(log[after_seq:], start=after_seq + 1)]
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._events.pop(job_id, None)
+            for key in [k for k in self._artifacts if k[0] == job_id]:
+                del self._artifacts[key]
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job metadata in SQLite (WAL mode, safe across multiple processes on one host,
+    e.g. `uvicorn --workers N`; WAL needs shared memory, so not on NFS-style
+    volumes) and artifact bytes in a content-addressed, quota-managed BlobStore
+    next to the database. Finished jobs are pruned along with the output quota.
+    """
+
+    def __init__(self, db_path: str, max_bytes: Optional[int] = None, max_age_s: Optional[float] = None,
+                 compress_after_s: Optional[float] = None, job_max_age_s: Optional[float] = None):
+        self.db_path = os.path.abspath(db_path)
+        self.job_max_age_s = job_max_age_s
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                " job_id TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+            )
+        self.blobs = BlobStore(
+            os.path.join(os.path.dirname(self.db_path), "blobs"), self.db_path,
+            max_bytes=max_bytes, max_age_s=max_age_s, compress_after_s=compress_after_s,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps the store usable from any thread
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def put_job(self, job_id, status, result=None):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, result, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, "
+                "result = COALESCE(excluded.result, jobs.result), updated_at = excluded.updated_at",
+                (job_id, status, json.dumps(result) if result is not None else None, time.time()),
+            )
+
+    def get_job(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT status, result, updated_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, result, updated_at = row
+        return {"job_id": job_id, "status": status, "result": json.loads(result) if result else None, "updated_at": updated_at}
+
+    def touch_job(self, job_id):
+        with closing(self._connect()) as conn, conn:
+            # Conditional, so a late heartbeat can't flip a finished job back to RUNNING
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = 'RUNNING'", (time.time(), job_id))
+
+    def put_artifact(self, job_id, name, data, media_type="application/octet-stream"):
+        self.blobs.link(job_id, name, self.blobs.put(data), media_type)
+
+    def get_artifact(self, job_id, name):
+        digest = self.blobs.resolve(job_id, name)
+        return self.blobs.get(digest) if digest else None
+
+    def has_artifact(self, job_id, name):
+        # Eviction drops a blob's aliases with it, so the alias alone answers
+        return self.blobs.resolve(job_id, name) is not None
+
+    def artifact_path(self, job_id, name):
+        digest = self.blobs.resolve(job_id, name)
+        return self.blobs.local_path(digest) if digest else None
+
+    def append_event(self, job_id, event):
+        with closing(self._connect()) as conn, conn:
+            # BEGIN IMMEDIATE makes read-max-then-insert atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)).fetchone()[0]
+            conn.execute("INSERT INTO job_events (job_id, seq, payload) VALUES (?, ?, ?)", (job_id, seq, json.dumps(event)))
+        return seq
+
+    def read_events(self, job_id, after_seq=0):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT seq, payload FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq)
+            ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def delete_job(self, job_id):
+        self.blobs.unlink(job_id)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def prune_jobs(self) -> int:
+        """
+        Forget finished jobs (row, event log and artifacts) older than job_max_age_s,
+        and completed jobs whose artifacts the output quota has all evicted, once
+        they are PRUNE_GRACE_S old. Running jobs are never pruned. Returns the count.
+        """
+        now = time.time()
+        cutoff = now - self.job_max_age_s if self.job_max_age_s else 0
+        with closing(self._connect()) as conn:
+            stale = [r[0] for r in conn.execute(
+                "SELECT job_id FROM jobs WHERE status != 'RUNNING' AND (updated_at < ? OR "
+                "(status = 'COMPLETED' AND updated_at < ? AND job_id NOT IN (SELECT job_id FROM blob_aliases)))",
+                (cutoff, now - PRUNE_GRACE_S),
+            )]
+        for job_id in stale:
+            self.delete_job(job_id)
+        return len(stale)
+
+    def start_maintenance(self) -> None:
+        """Output quota, cold compression and job pruning, periodically in the background."""
+        self.blobs.start_evictor(on_pass=self.prune_jobs)
+
+
+def _env_number(name: str, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def create_job_store(url: str) -> JobStore:
+    """
+    Build a store from a URL: "sqlite:///path/to/jobs.db" or "memory://".
+    """
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(
+            url[len("sqlite:///"):],
+            max_bytes=_env_number("PAPEROID_OUTPUT_MAX_BYTES", DEFAULT_OUTPUT_MAX_BYTES),
+            max_age_s=_env_number("PAPEROID_OUTPUT_MAX_AGE_S", DEFAULT_OUTPUT_MAX_AGE_S),
+            compress_after_s=_env_number("PAPEROID_OUTPUT_COMPRESS_AFTER_S", None),
+            job_max_age_s=_env_number("PAPEROID_JOB_MAX_AGE_S", DEFAULT_JOB_MAX_AGE_S),
+        )
+    if url.startswith("memory://"):
+        return InMemoryJobStore()
+    raise ValueError(f"Unsupported job store URL: {url}")
+
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """
+    Process-wide job store, configured with PAPEROID_JOB_STORE (defaults to SQLite under output/).
+    Output quota: PAPEROID_OUTPUT_MAX_BYTES, PAPEROID_OUTPUT_MAX_AGE_S and, optionally,
+    PAPEROID_OUTPUT_COMPRESS_AFTER_S to gzip artifacts that have not been read for that long.
+    Finished jobs are forgotten after PAPEROID_JOB_MAX_AGE_S, or once their artifacts were evicted.
+    """
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = create_job_store(os.getenv("PAPEROID_JOB_STORE", DEFAULT_STORE_URL))
+            if isinstance(_job_store, SQLiteJobStore):
+                # Keep disk use bounded: LRU eviction, cold compression and job pruning in the background
+                _job_store.start_maintenance()
+        return _job_store
+
+
+def set_job_store(store: JobStore) -> None:
+    """Replace the process-wide store (e.g. with an InMemoryJobStore in tests)."""
+    global _job_store
+    with _job_store_lock:
+        _job_store = store
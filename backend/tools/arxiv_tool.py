@@ -1,6 +1,10 @@
+import asyncio
+import math
+import os
 import requests
+import httpx
 import xml.etree.ElementTree as ET
-from langchain_core.tools import tool
+from tools.bm25 import BM25
 
 def parse_arxiv_xml(xml_content: str, topic: str = "") -> list[dict]:
     ns = {"atom": "http://www.w3.org/2005/Atom"}
@@ -37,19 +41,115 @@ def parse_arxiv_xml(xml_content: str, topic: str = "") -> list[dict]:
         })
     return papers
 
-@tool
-def arxiv_search(topic: str, max_results: int = 5) -> list[dict]:
-    """Search arXiv for recent papers on a topic"""
-    return search_arxiv(topic, max_results)
+# Overridable so load tests can point retrieval at a local stand-in
+ARXIV_API_URL = os.getenv("PAPEROID_ARXIV_API_URL", "http://export.arxiv.org/api/query")
 
 def search_arxiv(topic: str, max_results: int = 5) -> list[dict]:
     """Direct function to search arXiv (not a tool)."""
-    url = f"http://export.arxiv.org/api/query?search_query=all:{topic}&max_results={max_results}"
+    url = f"{ARXIV_API_URL}?search_query=all:{topic}&max_results={max_results}"
     resp = requests.get(url)
     if not resp.ok:
         raise ValueError("Failed to fetch from arXiv.")
     return parse_arxiv_xml(resp.text, topic=topic)
 
+_async_client = None
+_async_client_loop = None
+
+def _get_async_client() -> httpx.AsyncClient:
+    # One pooled client per process; created lazily inside the running event loop
+    # (and again if a different loop, e.g. a script's, starts using it)
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(timeout=60, follow_redirects=True)
+        _async_client_loop = loop
+    return _async_client
+
+async def asearch_arxiv(topic: str, max_results: int = 5) -> list[dict]:
+    """Async variant of search_arxiv (does not block the event loop)."""
+    url = f"{ARXIV_API_URL}?search_query=all:{topic}&max_results={max_results}"
+    resp = await _get_async_client().get(url)
+    if not resp.is_success:
+        raise ValueError("Failed to fetch from arXiv.")
+    return parse_arxiv_xml(resp.text, topic=topic)
+
+# --- Ranked retrieval ---
+
+MAX_PAGE_SIZE = 100
+MAX_PAGES = 4
+MIN_COVERAGE = 0.5   # share of topic terms a candidate must contain to count as relevant
+
+
+class RankedSearch:
+    """
+    Plans arXiv `start`/`max_results` pages for a ranked search and ranks the
+    candidates with BM25. The first page over-fetches; later pages are sized from
+    the relevance yield observed so far, so the target count is usually reached
+    in one or two requests.
+    """
+
+    def __init__(self, topic: str, num_results: int, overfetch: float = 2.0, max_pages: int = MAX_PAGES):
+        self.topic = topic
+        self.num_results = num_results
+        self.max_pages = max_pages
+        self.candidates: list[dict] = []
+        self.pages = 0
+        self.fetched = 0
+        self.exhausted = False
+        self._next_size = min(max(math.ceil(num_results * overfetch), num_results), MAX_PAGE_SIZE)
+        self._relevant: list[int] = []
+        self._bm25 = None
+
+    def next_page(self):
+        """(start, size) of the next request, or None once enough relevant papers are known."""
+        if self.exhausted or self.pages >= self.max_pages or len(self._relevant) >= self.num_results:
+            return None
+        return self.fetched, self._next_size
+
+    def add_page(self, entries: list[dict], requested: int) -> None:
+        self.pages += 1
+        self.fetched += len(entries)
+        seen = {c["link"] for c in self.candidates}
+        self.candidates += [e for e in entries if e["link"] not in seen]
+        self.exhausted = len(entries) < requested
+
+        # Re-score the whole pool: IDF depends on every candidate seen so far
+        self._bm25 = BM25([f"{c['title']} {c['title']} {c['summary']}" for c in self.candidates])
+        self._relevant = [i for i in range(len(self.candidates)) if self._bm25.coverage(self.topic, i) >= MIN_COVERAGE]
+
+        missing = self.num_results - len(self._relevant)
+        if missing > 0:
+            hit_rate = max(len(self._relevant) / max(len(self.candidates), 1), 0.1)
+            self._next_size = min(max(math.ceil(missing / hit_rate * 1.2), self.num_results), MAX_PAGE_SIZE)
+
+    def results(self) -> list[dict]:
+        """Top `num_results` relevant candidates, best first."""
+        if not self._bm25:
+            return []
+        ranked = sorted(self._relevant, key=lambda i: -self._bm25.score(self.topic, i))
+        return [self.candidates[i] for i in ranked[:self.num_results]]
+
+
+def _page_url(topic: str, start: int, size: int) -> str:
+    return f"{ARXIV_API_URL}?search_query=all:{topic}&start={start}&max_results={size}&sortBy=relevance"
+
+
+async def asearch_arxiv_ranked(topic: str, num_results: int = 10) -> list[dict]:
+    """
+    Return up to `num_results` papers ranked by BM25 relevance, paging through
+    arXiv with as few requests as needed.
+    """
+    search = RankedSearch(topic, num_results)
+    while (page := search.next_page()) is not None:
+        start, size = page
+        resp = await _get_async_client().get(_page_url(topic, start, size))
+        if not resp.is_success:
+            raise ValueError("Failed to fetch from arXiv.")
+        search.add_page(parse_arxiv_xml(resp.text), size)
+    print(f"🔎 Ranked {len(search.candidates)} arXiv candidates in {search.pages} request(s).")
+    return search.results()
+
+
 def calculate_similarity(text1: str, text2: str) -> float:
     """
     Calculate similarity using Jaccard Similarity (Word Overlap).
@@ -71,3 +171,23 @@ def calculate_similarity(text1: str, text2: str) -> float:
         return 0.0
         
     return intersection / union
+
+
+def score_similar_papers(abstract: str, papers: list) -> tuple:
+    """
+    Score each paper's summary against `abstract` (word-overlap %, most similar first).
+    Returns (similar_papers, overall_score), where overall_score is the highest score.
+    """
+    similar_papers = [
+        {
+            "title": paper.get("title"),
+            "link": paper.get("link"),
+            "pdf": paper.get("pdf"),
+            "similarity_score": round(calculate_similarity(abstract, paper.get("summary", "")) * 100, 2),
+            "summary": paper.get("summary", "")[:200] + "..."  # Truncate for display
+        }
+        for paper in papers
+    ]
+    similar_papers.sort(key=lambda x: x["similarity_score"], reverse=True)
+    overall_score = max((p["similarity_score"] for p in similar_papers), default=0.0)
+    return similar_papers, overall_score
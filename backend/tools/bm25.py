@@ -0,0 +1,60 @@
+import math
+import re
+from collections import Counter
+from typing import List, Sequence
+
+STOPWORDS = {
+    "a", "an", "the", "in", "on", "of", "for", "and", "or", "with", "to", "at", "by", "is", "are",
+    "was", "were", "this", "that", "it", "from", "as", "be", "its", "into", "via", "we", "our", "their",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords (whole words, not substrings)."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25:
+    """
+    Okapi BM25 over a small in-memory corpus (e.g. one query's arXiv candidates
+    or one job's text chunks). IDF is computed over that corpus.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_tokens = [tokenize(d) for d in documents]
+        self.term_freqs = [Counter(tokens) for tokens in self.doc_tokens]
+        self.avg_len = (sum(len(t) for t in self.doc_tokens) / len(self.doc_tokens)) if self.doc_tokens else 0.0
+        doc_freq = Counter(term for tf in self.term_freqs for term in tf)
+        n = len(self.doc_tokens)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def score(self, query: str, index: int) -> float:
+        tf = self.term_freqs[index]
+        length = len(self.doc_tokens[index])
+        total = 0.0
+        for term in set(tokenize(query)):
+            freq = tf.get(term)
+            if not freq:
+                continue
+            norm = freq + self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1))
+            total += self.idf[term] * freq * (self.k1 + 1) / norm
+        return total
+
+    def scores(self, query: str) -> List[float]:
+        return [self.score(query, i) for i in range(len(self.doc_tokens))]
+
+    def coverage(self, query: str, index: int) -> float:
+        """Fraction of distinct query terms that occur in the document."""
+        terms = set(tokenize(query))
+        if not terms:
+            return 1.0
+        return sum(1 for t in terms if t in self.term_freqs[index]) / len(terms)
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Indices of the k best-scoring documents (ties keep corpus order)."""
+        ranked = sorted(range(len(self.doc_tokens)), key=lambda i: -self.score(query, i))
+        return ranked[:k]
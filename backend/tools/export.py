@@ -0,0 +1,117 @@
+import html
+import re
+from typing import Callable, Dict, List, NamedTuple
+from schemas.paper_schemas import Citation, PaperDocument, PaperSection
+from tools.write_pdf import render_pdf_bytes
+
+
+def _is_body_section(title: str) -> bool:
+    # The abstract and the reference list are rendered from their own fields
+    clean_title = title.strip().lower().replace("*", "")
+    if "abstract" in clean_title and len(clean_title) < 15:
+        return False
+    return "reference" not in clean_title and "bibliography" not in clean_title
+
+
+def _paragraphs(text: str) -> List[str]:
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def build_document(title: str, abstract: str, sections: List[PaperSection], references: List[Citation] = None) -> PaperDocument:
+    """Build the format-neutral document every renderer works from (done once per paper version)."""
+    return PaperDocument(
+        title=title,
+        abstract=abstract,
+        sections=[s for s in sections if _is_body_section(s.section_title)],
+        references=[ref.entry for ref in references or []],
+    )
+
+
+# --- Renderers ---
+
+def to_markdown(doc: PaperDocument) -> bytes:
+    parts = [f"# {doc.title}", "## Abstract", doc.abstract.strip()]
+    for section in doc.sections:
+        parts.append(f"## {section.section_title}")
+        parts.extend(_paragraphs(section.content))
+    if doc.references:
+        parts.append("## References")
+        parts.extend(f"{i}. {entry}" for i, entry in enumerate(doc.references, 1))
+    return ("\n\n".join(parts) + "\n").encode("utf-8")
+
+
+def to_html(doc: PaperDocument) -> bytes:
+    esc = html.escape
+    body = [f"<h1>{esc(doc.title)}</h1>", "<section>", "<h2>Abstract</h2>"]
+    body.extend(f"<p><em>{esc(p)}</em></p>" for p in _paragraphs(doc.abstract))
+    body.append("</section>")
+    for section in doc.sections:
+        body.append(f"<section>\n<h2>{esc(section.section_title)}</h2>")
+        body.extend(f"<p>{esc(p)}</p>" for p in _paragraphs(section.content))
+        body.append("</section>")
+    if doc.references:
+        body.append("<section>\n<h2>References</h2>\n<ol>")
+        body.extend(f"<li>{esc(entry)}</li>" for entry in doc.references)
+        body.append("</ol>\n</section>")
+    page = (
+        "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+        f"<title>{esc(doc.title)}</title>\n</head>\n<body>\n" + "\n".join(body) + "\n</body>\n</html>\n"
+    )
+    return page.encode("utf-8")
+
+
+_LATEX_SPECIALS = {
+    "\\": r"\textbackslash{}", "&": r"\&", "%": r"\%", "$": r"\$", "#": r"\#",
+    "_": r"\_", "{": r"\{", "}": r"\}", "~": r"\textasciitilde{}", "^": r"\textasciicircum{}",
+}
+_LATEX_RE = re.compile("|".join(re.escape(c) for c in _LATEX_SPECIALS))
+
+
+def _latex_escape(text: str) -> str:
+    return _LATEX_RE.sub(lambda m: _LATEX_SPECIALS[m.group()], text)
+
+
+def to_latex(doc: PaperDocument) -> bytes:
+    esc = _latex_escape
+    lines = [
+        r"\documentclass[11pt]{article}",
+        r"\usepackage[utf8]{inputenc}",
+        r"\usepackage[T1]{fontenc}",
+        r"\usepackage{hyperref}",
+        f"\\title{{{esc(doc.title)}}}",
+        r"\date{}",
+        r"\begin{document}",
+        r"\maketitle",
+        r"\begin{abstract}",
+        "\n\n".join(esc(p) for p in _paragraphs(doc.abstract)),
+        r"\end{abstract}",
+    ]
+    for section in doc.sections:
+        lines.append(f"\\section{{{esc(section.section_title)}}}")
+        lines.append("\n\n".join(esc(p) for p in _paragraphs(section.content)))
+    if doc.references:
+        lines.append(r"\begin{thebibliography}{99}")
+        lines.extend(f"\\bibitem{{ref{i}}} {esc(entry)}" for i, entry in enumerate(doc.references, 1))
+        lines.append(r"\end{thebibliography}")
+    lines.append(r"\end{document}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def to_pdf(doc: PaperDocument) -> bytes:
+    return render_pdf_bytes(doc.title, doc.abstract, doc.sections, [
+        Citation(key=f"[Ref-{i}]", entry=entry, source_id=f"ref_{i}") for i, entry in enumerate(doc.references, 1)
+    ])
+
+
+class ExportFormat(NamedTuple):
+    extension: str
+    media_type: str
+    render: Callable[[PaperDocument], bytes]
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "pdf": ExportFormat("pdf", "application/pdf", to_pdf),
+    "md": ExportFormat("md", "text/markdown; charset=utf-8", to_markdown),
+    "html": ExportFormat("html", "text/html; charset=utf-8", to_html),
+    "tex": ExportFormat("tex", "application/x-tex; charset=utf-8", to_latex),
+}
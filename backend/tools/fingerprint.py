@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from schemas.paper_schemas import PassageMatch, SectionOriginality
+
+# k words per shingle, w shingles per winnowing window. Any copied passage of
+# at least K_GRAM + WINDOW - 1 words is guaranteed to share a fingerprint.
+K_GRAM = 5
+WINDOW = 4
+# Abstracts and generated sections kept in the process-wide index; least recently used go first
+MAX_DOCS = int(os.getenv("PAPEROID_FINGERPRINT_MAX_DOCS", "20000"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Lowercased words with their character offsets in the original text."""
+    return [(m.group().lower(), m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+
+
+def _hash_kgram(words: Iterable[str]) -> int:
+    # Stable across processes (unlike hash()), so indexes can be shared between workers
+    digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def fingerprint(text: str, k: int = K_GRAM, window: int = WINDOW) -> List[Tuple[int, int, int]]:
+    """
+    Winnow the k-gram hashes of `text`.
+    Returns (hash, char_start, char_end) for every selected k-gram.
+    """
+    tokens = _tokenize(text)
+    if len(tokens) < k:
+        return []
+
+    hashes = [_hash_kgram(t[0] for t in tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    selected = []
+    last = -1
+    for start in range(max(len(hashes) - window + 1, 1)):
+        span = hashes[start:start + window]
+        # Rightmost minimum, so a run of equal hashes yields one fingerprint
+        low = min(span)
+        pos = start + len(span) - 1 - span[::-1].index(low)
+        if pos != last:
+            selected.append((hashes[pos], tokens[pos][1], tokens[pos + k - 1][2]))
+            last = pos
+    return selected
+
+
+class FingerprintIndex:
+    """
+    Inverted index of winnowed fingerprints: hash -> [(doc_id, char_start, char_end)].
+    Documents are added incrementally; lookups only touch the query's own fingerprints,
+    so a check costs O(size of the query), not O(size of the corpus). At most `max_docs`
+    documents are kept: adding one past the bound evicts the least recently matched.
+    """
+
+    def __init__(self, k: int = K_GRAM, window: int = WINDOW, max_docs: Optional[int] = MAX_DOCS):
+        self.k = k
+        self.window = window
+        self.max_docs = max_docs
+        self._postings: Dict[int, List[Tuple[str, int, int]]] = {}
+        self._docs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def add_document(self, doc_id: str, text: str, title: str = "", group: Optional[str] = None) -> int:
+        """
+        Index `text` under `doc_id`. `group` ties documents together (e.g. all sections
+        of one generated paper) so a paper can be checked without matching itself.
+        Returns the number of fingerprints added; re-adding a known doc_id is a no-op.
+        """
+        prints = fingerprint(text, self.k, self.window)
+        with self._lock:
+            if doc_id in self._docs:
+                self._docs.move_to_end(doc_id)
+                return 0
+            self._docs[doc_id] = {"title": title, "group": group, "hashes": {h for h, _, _ in prints}}
+            for h, start, end in prints:
+                self._postings.setdefault(h, []).append((doc_id, start, end))
+            while self.max_docs and len(self._docs) > self.max_docs:
+                self._remove(next(iter(self._docs)))
+        return len(prints)
+
+    def _remove(self, doc_id: str) -> None:
+        # Caller holds the lock; only the evicted doc's own posting lists are touched
+        for h in self._docs.pop(doc_id)["hashes"]:
+            postings = [p for p in self._postings[h] if p[0] != doc_id]
+            if postings:
+                self._postings[h] = postings
+            else:
+                del self._postings[h]
+
+    def query(self, text: str, section_title: str = "", exclude_group: Optional[str] = None) -> List[PassageMatch]:
+        """Find passages of `text` that also occur in indexed documents, merged into spans."""
+        prints = fingerprint(text, self.k, self.window)
+        hits = []
+        with self._lock:
+            for h, q_start, q_end in prints:
+                for doc_id, s_start, s_end in self._postings.get(h, ()):
+                    if exclude_group is not None and self._docs[doc_id]["group"] == exclude_group:
+                        continue
+                    hits.append((doc_id, q_start, q_end, s_start, s_end))
+            docs = {doc_id: self._docs[doc_id] for doc_id, *_ in hits}
+            for doc_id in docs:
+                self._docs.move_to_end(doc_id)
+
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        matches: List[PassageMatch] = []
+        current = None
+        for doc_id, q_start, q_end, s_start, s_end in hits:
+            # Overlapping or adjacent fingerprints from the same source extend one span
+            if current and current[0] == doc_id and q_start <= current[2] + 1:
+                current[2] = max(current[2], q_end)
+                current[3] = min(current[3], s_start)
+                current[4] = max(current[4], s_end)
+                continue
+            if current:
+                matches.append(self._to_match(current, text, section_title, docs))
+            current = [doc_id, q_start, q_end, s_start, s_end]
+        if current:
+            matches.append(self._to_match(current, text, section_title, docs))
+        return matches
+
+    @staticmethod
+    def _to_match(span, text: str, section_title: str, docs: Dict[str, dict]) -> PassageMatch:
+        doc_id, q_start, q_end, s_start, s_end = span
+        return PassageMatch(
+            section_title=section_title,
+            start=q_start,
+            end=q_end,
+            text=text[q_start:q_end],
+            source_id=doc_id,
+            source_title=docs[doc_id]["title"],
+            source_start=s_start,
+            source_end=s_end,
+        )
+
+
+def check_sections(sections, index: "FingerprintIndex", exclude_group: Optional[str] = None) -> List[SectionOriginality]:
+    """
+    Run passage-level matching for every section. Serially: matching is pure Python
+    and holds the GIL, so a thread pool only added overhead.
+    """
+
+    def check(section) -> SectionOriginality:
+        matches = index.query(section.content, section.section_title, exclude_group=exclude_group)
+        # Count each character once even when several sources match it
+        covered, reach = 0, 0
+        for start, end in sorted((m.start, m.end) for m in matches):
+            start = max(start, reach)
+            if end > start:
+                covered += end - start
+                reach = end
+        length = len(section.content) or 1
+        return SectionOriginality(
+            section_title=section.section_title,
+            overlap_percent=round(100 * covered / length, 2),
+            matches=matches,
+        )
+
+    return [check(section) for section in sections]
+
+
+# Process-wide index: retrieved abstracts and generated papers are added as jobs run, up to MAX_DOCS
+fingerprint_index = FingerprintIndex()
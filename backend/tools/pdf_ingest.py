@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Iterator, List, Optional
+import httpx
+from schemas.paper_schemas import SourceDocument, TextChunk
+from tools.bm25 import BM25
+from storage.job_store import get_job_store
+
+# Full-text ingestion is optional; pypdf itself is imported on first use
+PYPDF_AVAILABLE = importlib.util.find_spec("pypdf") is not None
+
+# Chunks live in the job store under this pseudo-job, so they count against the
+# output quota, are evicted with it, and are shared by every worker. Raw PDFs
+# are only kept until they are chunked.
+INGEST_CACHE_JOB = "ingest-cache"
+MAX_CONCURRENT_DOWNLOADS = 4
+REQUESTS_PER_SECOND = float(os.getenv("PAPEROID_PDF_RATE", "1"))
+MAX_PDF_BYTES = 25 * 1024 * 1024
+MAX_PAGES = 30                 # enough for the body of a typical paper
+CHUNK_WORDS = 180
+MAX_CHUNKS_PER_DOC = 60
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Extra query terms that steer each section toward the passages it needs
+SECTION_HINTS = {
+    "Introduction": "problem motivation challenge background",
+    "Literature Review": "related work prior approaches existing methods",
+    "Methodology": "method approach dataset experiment architecture training setup",
+    "Results and Discussion": "results accuracy performance evaluation improvement comparison",
+    "Conclusion": "conclusion limitations future work",
+}
+
+
+class RateLimiter:
+    """Process-wide request pacing, shared by every coroutine downloading PDFs."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # Claim the next free slot and return how long to wait for it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            return slot - now
+
+    async def await_turn(self) -> None:
+        await asyncio.sleep(self._reserve())
+
+
+rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+
+
+def _chunks_artifact(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest() + ".chunks.json"
+
+
+def iter_page_text(pdf_path: str, max_pages: int = MAX_PAGES) -> Iterator[str]:
+    """Extract text one page at a time, so only the current page is held in memory."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    for i, page in enumerate(reader.pages):
+        if i >= max_pages:
+            break
+        yield page.extract_text() or ""
+
+
+def chunk_pages(pages: Iterator[str], doc: SourceDocument, chunk_words: int = CHUNK_WORDS) -> List[TextChunk]:
+    """Group page text into ~chunk_words passages, consuming pages lazily."""
+    chunks: List[TextChunk] = []
+    buffer: List[str] = []
+    start_page = 1
+    for page_no, text in enumerate(pages, start=1):
+        if not buffer:
+            start_page = page_no
+        buffer.extend(text.split())
+        while len(buffer) >= chunk_words and len(chunks) < MAX_CHUNKS_PER_DOC:
+            chunks.append(TextChunk(source_url=doc.source_url, title=doc.title, page=start_page, text=" ".join(buffer[:chunk_words])))
+            buffer = buffer[chunk_words:]
+            start_page = page_no
+        if len(chunks) >= MAX_CHUNKS_PER_DOC:
+            return chunks
+    if buffer:
+        chunks.append(TextChunk(source_url=doc.source_url, title=doc.title, page=start_page, text=" ".join(buffer)))
+    return chunks
+
+
+def _load_cached_chunks(url: str) -> Optional[List[TextChunk]]:
+    raw = get_job_store().get_artifact(INGEST_CACHE_JOB, _chunks_artifact(url))
+    if raw is None:
+        return None
+    return [TextChunk(**c) for c in json.loads(raw)]
+
+
+def _is_cached(url: str) -> bool:
+    # An alias lookup: the chunks themselves are only read (and decompressed) by load_chunks
+    return get_job_store().has_artifact(INGEST_CACHE_JOB, _chunks_artifact(url))
+
+
+def load_chunks(pdf_urls: List[str]) -> List[TextChunk]:
+    """Chunks of papers ingested earlier, read back from the ingest cache (missing ones are skipped)."""
+    return [chunk for url in pdf_urls for chunk in (_load_cached_chunks(url) or ())]
+
+
+def _extract_and_cache(doc: SourceDocument, pdf_path: str) -> None:
+    chunks = chunk_pages(iter_page_text(pdf_path), doc)
+    data = json.dumps([c.model_dump() for c in chunks]).encode("utf-8")
+    get_job_store().put_artifact(INGEST_CACHE_JOB, _chunks_artifact(doc.pdf_url), data, media_type="application/json")
+
+
+async def aingest_document(doc: SourceDocument, client: httpx.AsyncClient) -> None:
+    """
+    Download (streamed to a temporary file), extract and chunk one paper into the
+    ingest cache, unless it is there already. Extraction runs in a worker thread,
+    and the PDF is deleted once it is chunked.
+    """
+    if await asyncio.to_thread(_is_cached, doc.pdf_url):
+        return
+
+    fd, pdf_path = tempfile.mkstemp(prefix="paperoid-", suffix=".pdf")
+    os.close(fd)
+    try:
+        await rate_limiter.await_turn()
+        async with client.stream("GET", doc.pdf_url) as resp:
+            resp.raise_for_status()
+            size = 0
+            with open(pdf_path, "wb") as f:
+                async for block in resp.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                    size += len(block)
+                    if size > MAX_PDF_BYTES:
+                        raise ValueError(f"PDF larger than {MAX_PDF_BYTES} bytes: {doc.pdf_url}")
+                    f.write(block)
+        await asyncio.to_thread(_extract_and_cache, doc, pdf_path)
+    finally:
+        os.remove(pdf_path)
+
+
+def _ingestible(documents: List[SourceDocument]) -> List[SourceDocument]:
+    return [d for d in documents if d.pdf_url and d.pdf_url.startswith("http")]
+
+
+async def aingest_documents(documents: List[SourceDocument]) -> List[str]:
+    """
+    Ingest every document with a PDF link concurrently (bounded, shared rate limit);
+    failures are skipped. Returns the PDF URLs whose chunks are now in the ingest
+    cache: jobs keep these handles and load the chunks (load_chunks) only to write.
+    """
+    docs = _ingestible(documents)
+    if not PYPDF_AVAILABLE or not docs:
+        return []
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    async with httpx.AsyncClient(timeout=60, follow_redirects=True) as client:
+        async def safe_ingest(doc):
+            async with semaphore:
+                try:
+                    await aingest_document(doc, client)
+                    return doc.pdf_url
+                except Exception as e:
+                    print(f"⚠️ Skipping full text of {doc.pdf_url}: {e}")
+                    return None
+
+        results = await asyncio.gather(*(safe_ingest(d) for d in docs))
+    return [url for url in results if url]
+
+
+class ChunkIndex:
+    """BM25 index over one job's full-text chunks, used to pick passages per section."""
+
+    def __init__(self, chunks: List[TextChunk]):
+        self.chunks = chunks
+        self._bm25 = BM25([c.text for c in chunks]) if chunks else None
+
+    def excerpts(self, topic: str, section: str, k: int = 3, max_chars: int = 2400, focus: str = "") -> str:
+        """Best-matching passages for one section (narrowed by `focus`, e.g. a subsection), formatted for a prompt."""
+        if self._bm25 is None:
+            return ""
+        query = f"{topic} {SECTION_HINTS.get(section, '')} {focus}"
+        excerpts, used = [], 0
+        for i in self._bm25.top_k(query, k):
+            chunk = self.chunks[i]
+            entry = f"[{chunk.title}, p.{chunk.page}] {chunk.text}"
+            if used + len(entry) > max_chars:
+                break
+            excerpts.append(entry)
+            used += len(entry)
+        return "\n\n".join(excerpts)
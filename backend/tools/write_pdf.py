@@ -1,24 +1,103 @@
+import hashlib
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from fpdf import FPDF
 from schemas.paper_schemas import PaperSection, Citation
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from fpdf import FPDF
 
-def render_latex_pdf(
-    title: str,
-    abstract: str,
-    sections: list[PaperSection],
-    references: list[Citation] = None,
-    output_dir: str = "output"
-):
+# Line-breaking is most of the layout cost, and a re-render (e.g. after one
+# section was regenerated) would otherwise redo it for every unchanged section
+LAYOUT_CACHE_SIZE = 512
+_layout_cache: "OrderedDict[tuple, list]" = OrderedDict()
+_layout_lock = threading.Lock()
+
+
+def _wrap_lines(pdf: "FPDF", w: float, text: str) -> list:
     """
-    Generates a structured PDF file with the given title, abstract, and sections.
-    Returns metadata for frontend display.
+    Break `text` into (line, word_spacing) pairs exactly as multi_cell(align="J")
+    would, memoized per text, font and width. Word spacing is None for lines
+    that end at a hard or forced break (not justified).
     """
-    output_dir = os.path.abspath(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = os.path.join(output_dir, f"paper_{timestamp}.pdf")
+    if w == 0:
+        w = pdf.w - pdf.r_margin - pdf.x
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(),
+           pdf.font_family, pdf.font_style, pdf.font_size_pt, round(w, 3))
+    with _layout_lock:
+        lines = _layout_cache.get(key)
+        if lines is not None:
+            _layout_cache.move_to_end(key)
+            return lines
+
+    cw = pdf.current_font["cw"]
+    wmax = (w - 2 * pdf.c_margin) * 1000.0 / pdf.font_size
+    s = text.replace("\r", "")
+    if s.endswith("\n"):
+        s = s[:-1]
+    lines = []
+    i = j = 0
+    sep, l, ls, ns = -1, 0, 0, 0
+    while i < len(s):
+        c = s[i]
+        if c == "\n":
+            lines.append((s[j:i], None))
+            i += 1
+            j, sep, l, ns = i, -1, 0, 0
+            continue
+        if c == " ":
+            sep, ls = i, l
+            ns += 1
+        l += cw.get(c, 0)
+        if l > wmax:
+            if sep == -1:
+                if i == j:
+                    i += 1
+                lines.append((s[j:i], None))
+            else:
+                ws = (wmax - ls) / 1000.0 * pdf.font_size / (ns - 1) if ns > 1 else 0.0
+                lines.append((s[j:sep], ws))
+                i = sep + 1
+            j, sep, l, ns = i, -1, 0, 0
+        else:
+            i += 1
+    lines.append((s[j:i], None))
+
+    with _layout_lock:
+        _layout_cache[key] = lines
+        if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    return lines
+
+
+def _has_layout_internals(pdf: "FPDF") -> bool:
+    # The cached layout drives fpdf 1.7 internals; other fpdf versions take the plain multi_cell path
+    font = getattr(pdf, "current_font", None)
+    return isinstance(font, dict) and "cw" in font and hasattr(pdf, "ws") and callable(getattr(pdf, "_out", None))
+
+
+def _text_block(pdf: "FPDF", h: float, text: str) -> None:
+    """Justified paragraph text, like pdf.multi_cell(0, h, text), using cached line breaks."""
+    if not _has_layout_internals(pdf):
+        pdf.multi_cell(0, h, text, align="J")
+        return
+    w = pdf.w - pdf.r_margin - pdf.x
+    for line, ws in _wrap_lines(pdf, w, text):
+        if ws is not None:
+            pdf.ws = ws
+            pdf._out("%.3f Tw" % (ws * pdf.k))
+        elif pdf.ws > 0:
+            pdf.ws = 0
+            pdf._out("0 Tw")
+        pdf.cell(w, h, line, 0, 2, "J")
+    pdf.x = pdf.l_margin
+
+
+def _build_pdf(title: str, abstract: str, sections, references: list[Citation] = None) -> "FPDF":
+    """Lay out the title, abstract, sections and references into an FPDF document."""
+    from fpdf import FPDF  # deferred until the first render, to keep startup fast
 
     pdf = FPDF()
     pdf.add_page()
@@ -34,7 +113,7 @@ def render_latex_pdf(
 
     # --- Abstract ---
     pdf.set_font("Arial", "I", 12)
-    pdf.multi_cell(0, 10, f"Abstract:\n{clean_text(abstract)}")
+    _text_block(pdf, 10, f"Abstract:\n{clean_text(abstract)}")
     pdf.ln(10)
 
     # --- Sections ---
@@ -50,7 +129,7 @@ def render_latex_pdf(
         pdf.set_font("Arial", "B", 14)
         pdf.multi_cell(0, 10, clean_text(section.section_title))
         pdf.set_font("Arial", "", 12)
-        pdf.multi_cell(0, 8, clean_text(section.content))
+        _text_block(pdf, 8, clean_text(section.content))
         pdf.ln(8)
 
     # --- References Section ---
@@ -63,10 +142,51 @@ def render_latex_pdf(
             pdf.multi_cell(0, 8, clean_text(ref_entry))
         pdf.ln(10)
 
+    return pdf
+
+
+def _pdf_bytes(pdf: "FPDF") -> bytes:
+    # fpdf returns a latin-1 str, fpdf2 a bytearray
+    data = pdf.output(dest="S")
+    return data.encode("latin-1") if isinstance(data, str) else bytes(data)
+
+
+def render_pdf_bytes(
+    title: str,
+    abstract: str,
+    sections: list[PaperSection],
+    references: list[Citation] = None
+) -> bytes:
+    """
+    Generates the PDF in memory, for callers that store it themselves
+    (e.g. the content-addressed job store) instead of writing into output/.
+    """
+    return _pdf_bytes(_build_pdf(title, abstract, sections, references))
+
+
+def render_latex_pdf(
+    title: str,
+    abstract: str,
+    sections: list[PaperSection],
+    references: list[Citation] = None,
+    output_dir: str = "output",
+    job_id: str = None
+):
+    """
+    Generates a structured PDF file with the given title, abstract, and sections.
+    Returns metadata for frontend display.
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    # Timestamps collide across workers, so callers pass a unique job_id when they have one
+    job_id = job_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = os.path.join(output_dir, f"paper_{job_id}.pdf")
+
+    pdf = _build_pdf(title, abstract, sections, references)
     pdf.output(output_path)
 
     return {
-        "job_id": timestamp,
+        "job_id": job_id,
         "title": title,
         "abstract": abstract[:300] + "..." if len(abstract) > 300 else abstract,
         "status": "Completed",
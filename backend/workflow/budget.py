@@ -0,0 +1,82 @@
+import os
+import time
+from typing import Dict, Optional
+from schemas.paper_schemas import ResearchRequest
+
+# References kept in fast mode, or when the deadline can't afford the full list
+FAST_MAX_REFERENCES = 5
+# Optional smaller model (HF repo id) for fast mode and shrunk drafts; unset keeps the default model
+FAST_MODEL_REPO = os.getenv("PAPEROID_FAST_MODEL")
+# Starting guesses in seconds per unit, until real runs have been observed.
+# Writer stages are measured per 1000 planned tokens, the others per run.
+STAGE_PRIORS = {
+    "retrieve": 3.0,
+    "ingest": 10.0,
+    "write_single": 20.0,
+    "write_iterative": 10.0,
+    "write_hierarchical": 6.0,
+    "refine": 20.0,
+    "pdf": 1.0,
+}
+
+
+class StageTimer:
+    """How long each graph stage takes in this worker (EWMA of observed runs)."""
+
+    def __init__(self, priors: Dict[str, float] = None, alpha: float = 0.3):
+        self.per_unit = dict(priors or STAGE_PRIORS)
+        self.alpha = alpha
+        self.observed = set()  # stages whose estimate comes from real runs, not the prior
+
+    def estimate(self, stage: str, units: float = 1.0) -> float:
+        return self.per_unit.get(stage, 0.0) * units
+
+    def observe(self, stage: str, elapsed_s: float, units: float = 1.0) -> None:
+        if units <= 0:
+            return
+        sample = elapsed_s / units
+        if stage not in self.observed:
+            # The first real run replaces the guess outright
+            self.observed.add(stage)
+            self.per_unit[stage] = sample
+            return
+        previous = self.per_unit[stage]
+        self.per_unit[stage] = previous + (sample - previous) * self.alpha
+
+
+stage_timer = StageTimer()
+
+
+def writer_units(planned_tokens: int) -> float:
+    return planned_tokens / 1000
+
+
+class ExecutionBudget:
+    """
+    What one job may spend: its mode, and the time left before its deadline.
+    Without a deadline every stage fits, so only the mode shapes the run.
+    """
+
+    def __init__(self, request: ResearchRequest, deadline_at: Optional[float] = None):
+        self.mode = request.mode
+        self.deadline_at = deadline_at
+
+    @property
+    def fast(self) -> bool:
+        return self.mode == "fast"
+
+    @property
+    def thorough(self) -> bool:
+        return self.mode == "thorough"
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline_at is None else self.deadline_at - time.time()
+
+    def fits(self, seconds: float) -> bool:
+        remaining = self.remaining()
+        return remaining is None or seconds <= remaining
+
+    def timeout(self, reserve_s: float = 0.0) -> Optional[float]:
+        """Seconds a stage may run while leaving `reserve_s` for the stages after it."""
+        remaining = self.remaining()
+        return None if remaining is None else max(remaining - reserve_s, 0.0)
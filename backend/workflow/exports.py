@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+from schemas.paper_schemas import PaperDocument, ResearchPaper
+from tools.export import EXPORT_FORMATS, ExportFormat, build_document
+from storage.job_store import get_job_store
+from workflow.research_graph import PAPER_ARTIFACT
+
+DOCUMENT_CACHE_SIZE = 64
+
+# Document models by paper version, so each version is parsed and built once per worker
+_documents: "OrderedDict[str, PaperDocument]" = OrderedDict()
+_documents_lock = threading.Lock()
+# Renders in progress, so concurrent first requests for a format share one render
+_inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+def _document_for(version: str, raw: bytes) -> PaperDocument:
+    with _documents_lock:
+        doc = _documents.get(version)
+        if doc is not None:
+            _documents.move_to_end(version)
+            return doc
+    paper = ResearchPaper.model_validate_json(raw)
+    doc = build_document(paper.title, paper.abstract, paper.sections, paper.references)
+    with _documents_lock:
+        _documents[version] = doc
+        if len(_documents) > DOCUMENT_CACHE_SIZE:
+            _documents.popitem(last=False)
+    return doc
+
+
+def _render_and_store(job_id: str, name: str, version: str, raw: bytes, fmt: ExportFormat) -> bytes:
+    data = fmt.render(_document_for(version, raw))
+    get_job_store().put_artifact(job_id, name, data, media_type=fmt.media_type)
+    return data
+
+
+async def aexport_job(job_id: str, format_name: str) -> Tuple[bytes, ExportFormat]:
+    """
+    The job's paper in the requested format, rendered on first request and then
+    served from the job's artifacts. Cached renders are keyed by the paper's
+    content, so a regenerated section never serves a stale export.
+    Raises LookupError for an unknown format or a job without a finished paper.
+    """
+    fmt = EXPORT_FORMATS.get(format_name)
+    if fmt is None:
+        raise LookupError(f"Unknown format '{format_name}' (expected one of: {', '.join(EXPORT_FORMATS)})")
+
+    store = get_job_store()
+    raw = await asyncio.to_thread(store.get_artifact, job_id, PAPER_ARTIFACT)
+    if raw is None:
+        raise LookupError(f"No completed paper for job {job_id}")
+    version = hashlib.blake2b(raw, digest_size=8).hexdigest()
+    name = f"export-{version}.{fmt.extension}"
+
+    # The pipeline (and every section rewrite) already publishes the PDF with paper.json
+    cached = await asyncio.to_thread(store.get_artifact, job_id, "paper.pdf" if fmt.extension == "pdf" else name)
+    if cached is not None:
+        return cached, fmt
+
+    key = (job_id, name)
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending), fmt
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        data = await asyncio.to_thread(_render_and_store, job_id, name, version, raw, fmt)
+        future.set_result(data)
+        return data, fmt
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _inflight.pop(key, None)
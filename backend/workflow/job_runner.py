@@ -0,0 +1,213 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+from schemas.paper_schemas import PaperoidState, ResearchRequest
+from storage.job_store import get_job_store
+from workflow.research_graph import astream_research_graph
+from workflow.scheduler import scheduler, DEFAULT_CLIENT
+from workflow.result_cache import RESULT_CACHE_TTL_S, cache_key, serve_cached, store_result
+
+# How often tailers re-check the store for events appended by other workers
+POLL_INTERVAL_S = 0.5
+TERMINAL_EVENTS = {"result", "error"}
+# Running jobs refresh their updated_at this often. A RUNNING job not refreshed
+# for STALE_AFTER_S lost its worker (crash, OOM kill) and is failed by its tailers.
+HEARTBEAT_INTERVAL_S = 10
+STALE_AFTER_S = float(os.getenv("PAPEROID_JOB_STALE_AFTER_S", "60"))
+
+# Running generations in this process (strong refs keep the tasks alive)
+_tasks: Dict[str, asyncio.Task] = {}
+# Wakes local tailers as soon as a new event is appended
+_new_event: Dict[str, asyncio.Event] = {}
+# Resolves when the job running for a result-cache key finishes, so identical requests wait for it
+_leaders: Dict[str, asyncio.Future] = {}
+
+
+async def _append(job_id: str, event: dict) -> int:
+    seq = await asyncio.to_thread(get_job_store().append_event, job_id, event)
+    signal = _new_event.pop(job_id, None)
+    if signal:
+        signal.set()
+    return seq
+
+
+async def _heartbeat(job_id: str) -> None:
+    store = get_job_store()
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL_S)
+        await asyncio.to_thread(store.touch_job, job_id)
+
+
+async def _fail_stale(job_id: str) -> None:
+    """Fail a job whose worker stopped heartbeating, so every tailer gets a terminal event."""
+    store = get_job_store()
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None or job["status"] != "RUNNING":
+        return  # another tailer got there first
+    message = f"💥 The worker running this job stopped responding (no heartbeat for {STALE_AFTER_S:.0f}s)."
+    await _append(job_id, {"type": "error", "message": message})
+    await asyncio.to_thread(store.put_job, job_id, "FAILED", {"error": message})
+
+
+async def _serve_cached(job_id: str, request: ResearchRequest, announce: bool = False) -> bool:
+    """Finish the job from the result cache (logging its job event first if `announce`); False on a miss."""
+    result = await asyncio.to_thread(serve_cached, job_id, request)
+    if result is None:
+        return False
+    if announce:
+        await _append(job_id, {"type": "job", "job_id": job_id})
+    age_min = result["cache_age_s"] / 60
+    await _append(job_id, {"type": "log", "message": f"♻️ Served from the result cache (generated {age_min:.0f} min ago)."})
+    await _append(job_id, {"type": "result", "data": result})
+    await asyncio.to_thread(get_job_store().put_job, job_id, "COMPLETED", result)
+    return True
+
+
+async def _run_job(job_id: str, state: PaperoidState, client_id: str, leader: Optional[asyncio.Future] = None) -> None:
+    """
+    Drive the graph and log every event; independent of any client connection.
+    With a `leader` (an identical job already running here), wait for it and reuse its result.
+    """
+    store = get_job_store()
+    ticket = None
+    succeeded = False
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _append(job_id, {"type": "job", "job_id": job_id})
+        if leader is not None:
+            await _append(job_id, {"type": "log", "message": "⏳ Waiting for an identical request that is already running."})
+            await asyncio.wait([leader])
+            if await _serve_cached(job_id, state.request):
+                return
+
+        ticket = scheduler.submit(job_id, state.request, client_id)
+        if not ticket.granted.done():
+            await _append(job_id, {
+                "type": "log",
+                "message": f"⏳ Queued at position {scheduler.position(ticket)} (estimated {ticket.cost:.0f}s of work)."
+            })
+            await ticket.granted
+        async for update in astream_research_graph(state):
+            if update["type"] == "result":
+                # Cached before the result is logged, so a repeat sent on seeing it is a hit
+                await asyncio.to_thread(store_result, job_id, state.request, update["data"])
+            # Log first, then flip the status, so "finished" always implies a terminal event
+            await _append(job_id, update)
+            if update["type"] == "result":
+                succeeded = True
+                await asyncio.to_thread(store.put_job, job_id, "COMPLETED", update["data"])
+            elif update["type"] == "error":
+                await asyncio.to_thread(store.put_job, job_id, "FAILED", {"error": update["message"]})
+    except Exception as e:
+        await _append(job_id, {"type": "error", "message": f"💥 Workflow crashed: {str(e)}"})
+        await asyncio.to_thread(store.put_job, job_id, "FAILED", {"error": str(e)})
+    finally:
+        heartbeat.cancel()
+        if ticket is not None:
+            scheduler.finish(ticket, succeeded)
+        _tasks.pop(job_id, None)
+        # Tailers still waiting re-read the log and find the terminal event
+        signal = _new_event.pop(job_id, None)
+        if signal:
+            signal.set()
+
+
+async def start_job(request: ResearchRequest, client_id: str = DEFAULT_CLIENT) -> str:
+    """
+    Start a generation in the background and return its job_id.
+    Progress goes to the job's event log, so clients can disconnect and resume
+    without the paper being generated again. The job waits for a slot in the
+    scheduler, which runs short jobs first and keeps `client_id` to its fair share.
+    A repeat of a recent request is answered from the result cache instead
+    (unless `request.force_refresh`), and a repeat of one still running waits for it.
+    """
+    job_id = uuid.uuid4().hex
+    key = cache_key(request)
+    leader = _leaders.get(key) if _waits_for_identical(request) else None
+    claim = None
+    # A deadline job may store a shortened paper that isn't cached, so others don't wait on it
+    if RESULT_CACHE_TTL_S > 0 and not request.deadline_s and key not in _leaders:
+        # Claimed before any await, so identical requests arriving meanwhile wait for this one
+        claim = _leaders[key] = asyncio.get_running_loop().create_future()
+
+    try:
+        await asyncio.to_thread(get_job_store().put_job, job_id, "RUNNING")
+        if leader is None and not request.force_refresh and await _serve_cached(job_id, request, announce=True):
+            _release_leader(key, claim)
+            return job_id
+
+        # The deadline runs from submission, so time spent queued counts against it
+        deadline_at = time.time() + request.deadline_s if request.deadline_s else None
+        state = PaperoidState(request=request, job_id=job_id, deadline_at=deadline_at)
+        task = asyncio.create_task(_run_job(job_id, state, client_id, leader=leader))
+    except BaseException:
+        _release_leader(key, claim)
+        raise
+    _tasks[job_id] = task
+    if claim is not None:
+        task.add_done_callback(lambda _: _release_leader(key, claim))
+    return job_id
+
+
+def _waits_for_identical(request: ResearchRequest) -> bool:
+    """Whether a request may wait for an identical one already running, to reuse its result."""
+    # Nothing is reused with the cache off, a refresh wants its own run, and the
+    # deadline isn't part of the cache key, so waiting on a slower job could miss it
+    return RESULT_CACHE_TTL_S > 0 and not request.force_refresh and not request.deadline_s
+
+
+def _release_leader(key: str, claim: Optional[asyncio.Future]) -> None:
+    if claim is None:
+        return
+    if _leaders.get(key) is claim:
+        del _leaders[key]
+    if not claim.done():
+        claim.set_result(None)
+
+
+async def tail_events(job_id: str, after_seq: int = 0) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    Yield (seq, event) for every logged event after `after_seq`, waiting for new
+    ones until the job emits its result or error.
+    """
+    store = get_job_store()
+    try:
+        while True:
+            signal = _new_event.setdefault(job_id, asyncio.Event())
+            events = await asyncio.to_thread(store.read_events, job_id, after_seq)
+            for seq, event in events:
+                after_seq = seq
+                yield seq, event
+                if event.get("type") in TERMINAL_EVENTS:
+                    return
+
+            if not events:
+                job = await asyncio.to_thread(store.get_job, job_id)
+                # Unknown, or finished without a terminal event
+                if job is None or (job["status"] != "RUNNING" and job_id not in _tasks):
+                    # It may have logged its terminal event since the read above
+                    if not await asyncio.to_thread(store.read_events, job_id, after_seq):
+                        return
+                    continue
+                # Running on a worker that died: fail it, then read back the error event
+                if job_id not in _tasks and time.time() - job["updated_at"] > STALE_AFTER_S:
+                    await _fail_stale(job_id)
+                    continue
+                try:
+                    await asyncio.wait_for(signal.wait(), timeout=POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        # Once the job is over nothing pops its signal any more (_run_job pops it if still running)
+        if job_id not in _tasks:
+            _new_event.pop(job_id, None)
+
+
+def parse_last_event_id(value: Optional[str]) -> int:
+    """Sequence number from a Last-Event-ID header (0 when absent or malformed)."""
+    try:
+        return max(int(value), 0) if value else 0
+    except ValueError:
+        return 0
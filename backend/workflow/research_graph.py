@@ -1,18 +1,153 @@
-from langgraph.graph import StateGraph, START, END
-from schemas.paper_schemas import PaperoidState, SourceDocument, Citation
-from agents.retriever_agent import retriever_agent
-from agents.writer_agent import writer_agent, writer_agent_iterative
-from agents.refiner_agent import refiner_agent
-from tools.write_pdf import render_latex_pdf
-import time, uuid
+from schemas.paper_schemas import PaperoidState, SectionStore, Citation, ResearchPaper, intern_document
+from agents.retriever_agent import aretriever_agent
+from agents.writer_agent import awriter_agent, awriter_agent_iterative, awriter_agent_hierarchical, single_shot_tokens
+from agents.refiner_agent import arefiner_agent, get_refiner_llm
+from tools.arxiv_tool import score_similar_papers
+from tools.fingerprint import check_sections
+from agents.planner_agent import plan_generation, shrink_plan, HIERARCHICAL_MIN_PAGES
+from tools.write_pdf import render_pdf_bytes
+from tools.fingerprint import fingerprint_index
+from tools.pdf_ingest import aingest_documents, load_chunks, ChunkIndex, PYPDF_AVAILABLE
+from storage.job_store import get_job_store
+from workflow.budget import ExecutionBudget, stage_timer, writer_units, FAST_MAX_REFERENCES, FAST_MODEL_REPO
+from functools import lru_cache
+from typing import Optional, Tuple
+import asyncio, hashlib, threading, time, uuid
+
+
+# --- Execution budget (mode and deadline) ---
+
+def _budget(state: PaperoidState) -> ExecutionBudget:
+    return ExecutionBudget(state.request, state.deadline_at)
+
+
+def _shorten(state: PaperoidState, stage: str, reason: str) -> None:
+    """Record that a stage was cut down, so the result can say so."""
+    note = f"{stage}: {reason}"
+    state.shortened.append(note)
+    print(f"⏱️ Shortened {note}")
+
+
+def _notes(state: PaperoidState, stage: str) -> list:
+    # `shortened` is merged across (parallel) nodes, so each node returns only its own notes
+    return [note for note in state.shortened if note.startswith(f"{stage}:")]
+
+
+def _left(budget: ExecutionBudget) -> str:
+    return f"{max(budget.remaining(), 0):.0f}s left"
+
+
+def _writer_estimate(writer: str, plan) -> float:
+    tokens = single_shot_tokens(plan) if writer == "single" else plan.planned_tokens
+    return stage_timer.estimate(f"write_{writer}", writer_units(tokens))
+
+
+def _writer_candidates(state: PaperoidState, budget: ExecutionBudget) -> list:
+    # Outline-then-expand for very long papers, section by section for long ones
+    # (always in thorough mode), else one shot; later entries are the cheaper fallbacks
+    if not budget.fast and state.request.page_length >= HIERARCHICAL_MIN_PAGES:
+        return ["hierarchical", "iterative", "single"]
+    if budget.thorough or (not budget.fast and state.request.page_length >= 5):
+        return ["iterative", "single"]
+    return ["single"]
+
+
+def _plan_for(state: PaperoidState, writer: str, plan=None):
+    """The plan `writer` works from: hierarchical plans lift the per-section length cap."""
+    hierarchical = writer == "hierarchical"
+    if plan is not None and plan.hierarchical == hierarchical:
+        return plan
+    return plan_generation(state.request, hierarchical=hierarchical)
+
+
+def _reference_limit(state: PaperoidState) -> int:
+    limit = state.request.num_references
+    if limit <= FAST_MAX_REFERENCES:
+        return limit
+    budget = _budget(state)
+    if budget.fast:
+        _shorten(state, "retrieve", f"fast mode, {FAST_MAX_REFERENCES} of {limit} references")
+        return FAST_MAX_REFERENCES
+
+    writer = _writer_candidates(state, budget)[0]
+    full_run = sum(stage_timer.estimate(stage) for stage in ("retrieve", "ingest", "refine", "pdf"))
+    full_run += _writer_estimate(writer, _plan_for(state, writer))
+    if not budget.fits(full_run):
+        _shorten(state, "retrieve", f"{FAST_MAX_REFERENCES} of {limit} references, {_left(budget)}")
+        return FAST_MAX_REFERENCES
+    return limit
+
+
+def _plan_ingest(state: PaperoidState) -> Tuple[bool, Optional[float]]:
+    """Whether to ingest full texts, and for how long (None: no limit)."""
+    budget = _budget(state)
+    if budget.fast:
+        _shorten(state, "ingest", "skipped in fast mode")
+        return False, None
+
+    # Leave time for the quickest draft and the PDF
+    after = min(_writer_estimate(w, _plan_for(state, w)) for w in _writer_candidates(state, budget))
+    after += stage_timer.estimate("pdf")
+    if not budget.fits(stage_timer.estimate("ingest") + after):
+        _shorten(state, "ingest", f"skipped, {_left(budget)}")
+        return False, None
+    return True, budget.timeout(after)
+
+
+WRITER_STYLES = {"hierarchical": "outlined", "iterative": "section-by-section", "single": "one-shot"}
+
+
+def _plan_writer(state: PaperoidState) -> Tuple[str, Optional[str], Optional[float]]:
+    """
+    Pick the writer ("hierarchical", "iterative" or "single"), its model and its time limit.
+    When no writer fits the time left at full length, the plan is shrunk to fit.
+    """
+    budget = _budget(state)
+    candidates = _writer_candidates(state, budget)
+    model = FAST_MODEL_REPO if budget.fast else None
+    reserve = stage_timer.estimate("pdf")
+
+    plans = {writer: _plan_for(state, writer, state.plan) for writer in candidates}
+    for writer in candidates:
+        if budget.fits(_writer_estimate(writer, plans[writer]) + reserve):
+            if writer != candidates[0]:
+                _shorten(state, "write", f"{WRITER_STYLES[writer]} draft instead of {WRITER_STYLES[candidates[0]]}, {_left(budget)}")
+            state.plan = plans[writer]
+            return writer, model, budget.timeout(reserve)
 
-
-def retrieve_node(state: PaperoidState) -> dict:
+    writer = min(candidates, key=lambda w: _writer_estimate(w, plans[w]))
+    available = budget.timeout(reserve)
+    state.plan = shrink_plan(plans[writer], max(available / _writer_estimate(writer, plans[writer]), 0.1))
+    style = f"{WRITER_STYLES[writer]} " if writer != candidates[0] else ""
+    _shorten(state, "write", f"{style}draft shortened to {state.plan.total_words} words, {_left(budget)}")
+    return writer, FAST_MODEL_REPO, available
+
+
+def _plan_refine(state: PaperoidState) -> Tuple[bool, Optional[float]]:
+    """Whether to refine the draft, and for how long (None: no limit)."""
+    budget = _budget(state)
+    if budget.fast:
+        _shorten(state, "refine", "skipped in fast mode")
+        return False, None
+
+    reserve = stage_timer.estimate("pdf")
+    if not budget.fits(stage_timer.estimate("refine") + reserve):
+        _shorten(state, "refine", f"skipped, {_left(budget)}")
+        return False, None
+    return True, budget.timeout(reserve)
+
+
+async def aretrieve_node(state: PaperoidState) -> dict:
     """Step 1: Retrieve related research papers and generate reference list."""
     print("\n📚 Retrieving related research papers...")
 
-    papers = retriever_agent(state.request.topic_or_prompt, limit=state.request.num_references)
+    start = time.time()
+    papers = await aretriever_agent(state.request.topic_or_prompt, limit=_reference_limit(state))
+    stage_timer.observe("retrieve", time.time() - start)
+    return _apply_retrieval(state, papers)
+
 
+def _apply_retrieval(state: PaperoidState, papers: list) -> dict:
     # Check if retrieval failed or found no relevant papers
     if len(papers) == 1 and papers[0].get("key") == "[Ref-None]":
         error_msg = papers[0].get("summary", "No relevant papers found.")
@@ -20,15 +155,21 @@ def retrieve_node(state: PaperoidState) -> dict:
         # We raise an exception to stop the graph execution and notify the frontend
         raise ValueError(f"Retrieval Error: {error_msg}")
 
+    # Interned: jobs that retrieve the same paper share a single record
     state.documents = [
-        SourceDocument(
+        intern_document(
             source_url=p.get("link", "N/A"),
             title=p.get("title", "Untitled Paper"),
-            content_snippet=p.get("summary", "")
+            content_snippet=p.get("summary", ""),
+            pdf_url=p.get("pdf")
         )
         for p in papers
     ]
 
+    # Grow the originality index with the sources we are about to write from
+    for doc in state.documents:
+        fingerprint_index.add_document(doc.source_url, doc.content_snippet, title=doc.title, group="arxiv")
+
     state.references = [
         Citation(
             key=p.get("key", f"[Ref-{i+1}]"),
@@ -39,94 +180,315 @@ def retrieve_node(state: PaperoidState) -> dict:
     ]
 
     print(f"✅ Retrieved {len(state.references)} references.\n")
-    return {"documents": state.documents, "references": state.references}
+    return {"documents": state.documents, "references": state.references, "shortened": _notes(state, "retrieve")}
 
 
+async def aingest_node(state: PaperoidState) -> dict:
+    """Step 1b: Pull the full text of the retrieved papers (best effort, cut short at the deadline)."""
+    print("📑 Ingesting full texts of retrieved papers...")
 
-def write_node(state: PaperoidState) -> dict:
-    """Step 2: Generate research paper sections using references."""
-    print("✍️ Writing paper draft...")
+    wanted, timeout = _plan_ingest(state)
+    if not wanted:
+        return {"shortened": _notes(state, "ingest")}
 
+    start = time.time()
     try:
-        # Prepare rich context for the writer (Title + Summary)
-        context_list = [
-            f"Title: {doc.title}\nSummary: {doc.content_snippet}\nSource: {doc.source_url}"
-            for doc in state.documents
-        ]
+        state.ingested = await asyncio.wait_for(aingest_documents(state.documents), timeout=timeout)
+    except asyncio.TimeoutError:
+        _shorten(state, "ingest", "stopped at the deadline, abstracts only")
+        return {"shortened": _notes(state, "ingest")}
+    stage_timer.observe("ingest", time.time() - start)
+    print(f"✅ Ingested the full text of {len(state.ingested)} papers.\n")
+    return {"ingested": state.ingested}
+
+
+PAPER_ARTIFACT = "paper.json"
+
+
+def context_list_for(documents: list) -> list:
+    """Rich context for the writer (Title + Summary), one entry per source."""
+    return [
+        f"Title: {doc.title}\nSummary: {doc.content_snippet}\nSource: {doc.source_url}"
+        for doc in documents
+    ]
 
-        if state.request.page_length >= 5:
-            title, draft_sections = writer_agent_iterative(
+
+def _writer_inputs(state: PaperoidState, chunks: list) -> tuple:
+    context_list = context_list_for(state.documents)
+
+    # Size each section (and its token budget) to the request and the preferred writer
+    state.plan = _plan_for(state, _writer_candidates(state, _budget(state))[0])
+
+    # Full-text passages for each section, picked from this job's chunks
+    if not chunks:
+        return context_list, None, None
+    index = ChunkIndex(chunks)
+    excerpts = {
+        budget.section_title: index.excerpts(state.request.topic_or_prompt, budget.section_title)
+        for budget in state.plan.sections
+    }
+    return context_list, excerpts, index
+
+
+async def awrite_node(state: PaperoidState) -> dict:
+    """Step 2: Generate research paper sections using references (cut off when the deadline arrives)."""
+    print("✍️ Writing paper draft...")
+
+    try:
+        # The chunks are loaded only for the writer, and dropped with this node's locals
+        chunks = await asyncio.to_thread(load_chunks, state.ingested)
+        context_list, excerpts, chunk_index = _writer_inputs(state, chunks)
+        writer, model, timeout = _plan_writer(state)
+        start = time.time()
+        if writer == "hierarchical":
+            title, draft_sections = await awriter_agent_hierarchical(
                 state.request.topic_or_prompt,
                 context_list,
-                page_length=state.request.page_length
+                page_length=state.request.page_length,
+                plan=state.plan,
+                chunk_index=chunk_index,
+                model=model,
+                timeout_s=timeout
             )
-        else:
-            title, draft_sections = writer_agent(
+        elif writer == "iterative":
+            title, draft_sections = await awriter_agent_iterative(
                 state.request.topic_or_prompt,
                 context_list,
-                page_length=state.request.page_length
+                page_length=state.request.page_length,
+                plan=state.plan,
+                excerpts=excerpts,
+                model=model,
+                timeout_s=timeout
             )
-
-        state.draft_title = title or f"Research on {state.request.topic_or_prompt}"
-        state.sections = draft_sections
-        state.draft_text = "\n\n".join([s.content for s in draft_sections])
-        # Find the abstract section
-        abstract_section = next((s for s in draft_sections if s.section_title.lower() == "abstract"), None)
-        if abstract_section:
-            state.abstract = abstract_section.content
         else:
-            state.abstract = draft_sections[0].content[:500] if draft_sections else "No abstract generated."
-
-        print(f"✅ Draft written with {len(draft_sections)} sections.\n")
-        return {
-            "draft_title": state.draft_title,
-            "sections": state.sections,
-            "draft_text": state.draft_text,
-            "abstract": state.abstract,
-        }
+            title, draft_sections = await asyncio.wait_for(awriter_agent(
+                state.request.topic_or_prompt,
+                context_list,
+                page_length=state.request.page_length,
+                plan=state.plan,
+                model=model
+            ), timeout=timeout)
+        _observe_writer(writer, state, time.time() - start, draft_sections)
+        if not draft_sections:
+            # Every section was cut off: leave no draft rather than an empty paper
+            raise asyncio.TimeoutError
+        return _apply_draft(state, title, draft_sections)
+
+    except asyncio.TimeoutError:
+        message = NO_DRAFT_MESSAGE
+        print(f"❌ {message}")
+        state.errors.append(message)
+        return {"errors": [message], "shortened": _notes(state, "write")}
 
     except Exception as e:
         print(f"❌ Error during writing stage: {e}")
         state.errors.append(str(e))
-        return {"errors": state.errors}
-
-
-def refine_node(state: PaperoidState) -> dict:
+        return {"errors": [str(e)], "shortened": _notes(state, "write")}
+
+
+NO_DRAFT_MESSAGE = "The draft was not finished before the deadline."
+
+
+def _observe_writer(writer: str, state: PaperoidState, elapsed_s: float, draft_sections: list) -> None:
+    written = {s.section_title for s in draft_sections}
+    missing = [b.section_title for b in state.plan.sections if b.section_title not in written]
+    if writer == "iterative" and missing:
+        # Cut off by the deadline: a partial run would skew the estimate
+        _shorten(state, "write", f"{', '.join(missing)} not finished before the deadline")
+        return
+    unfinished = [item for item in state.plan.outline if item.actual_tokens is None]
+    if writer == "hierarchical" and unfinished:
+        _shorten(state, "write", f"{len(unfinished)} of {len(state.plan.outline)} subsections not finished before the deadline")
+        return
+    tokens = single_shot_tokens(state.plan) if writer == "single" else state.plan.planned_tokens
+    stage_timer.observe(f"write_{writer}", elapsed_s, writer_units(tokens))
+
+
+def _apply_draft(state: PaperoidState, title: str, draft_sections: list) -> dict:
+    state.draft_title = title or f"Research on {state.request.topic_or_prompt}"
+    # Read before the store keeps only (title, content)
+    state.failed_sections = [s.section_title for s in draft_sections if s.error]
+    state.sections = SectionStore(draft_sections)
+    # Find the abstract section (shares the section's string, no copy)
+    abstract_section = state.sections.find("abstract")
+    if abstract_section:
+        state.abstract = abstract_section.content
+    else:
+        state.abstract = state.sections[0].content[:500] if state.sections else "No abstract generated."
+
+    print(f"✅ Draft written with {len(state.sections)} sections "
+          f"({state.plan.actual_tokens}/{state.plan.planned_tokens} planned tokens).\n")
+    return {
+        "plan": state.plan,
+        "draft_title": state.draft_title,
+        "sections": state.sections,
+        "failed_sections": state.failed_sections,
+        "abstract": state.abstract,
+        "shortened": _notes(state, "write"),
+    }
+
+
+async def arefine_node(state: PaperoidState) -> dict:
     """Step 3: Refine and enhance generated draft."""
+    if not state.sections:
+        return {}  # nothing was written
     print("🔧 Refining content for clarity and academic tone...")
 
+    wanted, timeout = _plan_refine(state)
+    if not wanted:
+        return {"shortened": _notes(state, "refine")}
+
     try:
-        refined_text = refiner_agent(state.draft_text or "")
-        state.final_text = refined_text or state.draft_text
-        if not state.abstract or state.abstract == "No abstract generated.":
-            state.abstract = refined_text[:400]
-        print("✅ Refinement complete.\n")
+        start = time.time()
+        refined_text = await asyncio.wait_for(arefiner_agent(state.draft_text), timeout=timeout)
+        stage_timer.observe("refine", time.time() - start)
+        return _apply_refinement(state, refined_text)
 
-        return {"abstract": state.abstract, "final_text": state.final_text}
+    except asyncio.TimeoutError:
+        _shorten(state, "refine", "stopped at the deadline, draft kept")
+        return {"shortened": _notes(state, "refine")}
 
     except Exception as e:
         print(f"❌ Refinement error: {e}")
         state.errors.append(str(e))
-        return {"errors": state.errors}
+        return {"errors": [str(e)]}
+
+
+def _apply_refinement(state: PaperoidState, refined_text: str) -> dict:
+    # Only keep the refined text when it differs; draft_text is always derivable
+    state.final_text = refined_text if refined_text and refined_text != state.draft_text else None
+    if not state.abstract or state.abstract == "No abstract generated.":
+        state.abstract = refined_text[:400]
+    print("✅ Refinement complete.\n")
+
+    return {"abstract": state.abstract, "final_text": state.final_text}
+
+
+# --- Branches run alongside refinement ---
+
+DRAFT_PDF_ARTIFACT = "draft.pdf"
+
+
+def _pdf_inputs(state: PaperoidState) -> tuple:
+    return state.draft_title or state.request.topic_or_prompt, state.abstract or "No abstract available."
+
+
+def _pdf_version(state: PaperoidState) -> str:
+    """Digest of everything the PDF shows, so an unchanged paper reuses the draft's PDF."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (*_pdf_inputs(state), *(s.section_title + "\0" + s.content for s in state.sections),
+                 *(ref.entry for ref in state.references)):
+        digest.update(part.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def originality_node(state: PaperoidState) -> dict:
+    """Step 3b (alongside refinement): match the draft against the sources and earlier papers."""
+    if not state.sections:
+        return {}
+    print("🕵️ Checking the draft's originality...")
+
+    try:
+        passage_matches = check_sections(state.sections, fingerprint_index, exclude_group=state.job_id)
+        # Abstract similarity against the papers already retrieved, so no extra arXiv search
+        similar_papers, overall_score = score_similar_papers(state.abstract or "", [
+            {"title": doc.title, "link": doc.source_url, "pdf": doc.pdf_url, "summary": doc.content_snippet}
+            for doc in state.documents
+        ])
+        state.originality = {
+            "similar_papers": similar_papers,
+            "overall_score": overall_score,
+            "passage_matches": [s.model_dump() for s in passage_matches],
+        }
+        print(f"✅ Originality checked (highest abstract similarity {overall_score}%).\n")
+        return {"originality": state.originality}
+
+    except Exception as e:
+        print(f"❌ Originality check error: {e}")
+        state.errors.append(str(e))
+        return {"errors": [str(e)]}
+
+
+async def aoriginality_node(state: PaperoidState) -> dict:
+    """Async variant of originality_node (CPU-bound, so it runs in a thread)."""
+    return await asyncio.to_thread(originality_node, state)
+
+
+def draft_pdf_node(state: PaperoidState) -> dict:
+    """Step 3c (alongside refinement): publish a provisional PDF of the draft as an early preview."""
+    if not state.sections:
+        return {}
+    print("📝 Rendering draft PDF preview...")
+
+    try:
+        title, abstract = _pdf_inputs(state)
+        pdf_bytes = render_pdf_bytes(title=title, abstract=abstract, sections=state.sections, references=state.references)
+        store = get_job_store()
+        store.put_artifact(state.job_id, DRAFT_PDF_ARTIFACT, pdf_bytes, media_type="application/pdf")
+        state.preview_pdf = store.artifact_path(state.job_id, DRAFT_PDF_ARTIFACT)
+        print(f"✅ Draft preview ready at: {state.preview_pdf}\n")
+        return {"preview_pdf": state.preview_pdf, "preview_version": _pdf_version(state)}
+
+    except Exception as e:
+        print(f"❌ Draft PDF error: {e}")
+        state.errors.append(str(e))
+        return {"errors": [str(e)]}
+
+
+async def adraft_pdf_node(state: PaperoidState) -> dict:
+    """Async variant of draft_pdf_node."""
+    return await asyncio.to_thread(draft_pdf_node, state)
 
 
 def pdf_node(state: PaperoidState) -> dict:
-    """Step 4: Generate formatted PDF output."""
+    """Step 4: Generate formatted PDF output (joins the refinement, originality and preview branches)."""
+    if not state.sections:
+        # No draft: the job fails instead of publishing an empty paper
+        return {"status": "FAILED"}
     print("📄 Generating final PDF...")
 
     try:
-        output_data = render_latex_pdf(
-            title=state.draft_title or state.request.topic_or_prompt,
-            abstract=state.abstract or "No abstract available.",
-            sections=state.sections,
-            references=state.references
+        start = time.time()
+        state.job_id = state.job_id or uuid.uuid4().hex
+        store = get_job_store()
+
+        # Refinement rarely changes what the PDF shows; then the preview already is the final PDF
+        pdf_bytes = None
+        if state.preview_version and state.preview_version == _pdf_version(state):
+            pdf_bytes = store.get_artifact(state.job_id, DRAFT_PDF_ARTIFACT)
+        if pdf_bytes is None:
+            title, abstract = _pdf_inputs(state)
+            pdf_bytes = render_pdf_bytes(title=title, abstract=abstract, sections=state.sections, references=state.references)
+
+        # Publish the PDF to the shared, content-addressed store (no per-job file in output/)
+        store.put_artifact(state.job_id, "paper.pdf", pdf_bytes, media_type="application/pdf")
+        state.output_pdf = store.artifact_path(state.job_id, "paper.pdf")
+        stage_timer.observe("pdf", time.time() - start)
+        state.title = state.draft_title
+        state.status = "COMPLETED"
+        state.generation_time_s = round(time.time() - (state.start_time or time.time()), 2)
+
+        # Keep what a later single-section rewrite needs (sources, other sections, plan)
+        paper = ResearchPaper(
+            job_id=state.job_id,
+            title=state.title or state.request.topic_or_prompt,
+            abstract=state.abstract or "",
+            sections=state.sections.to_sections(),
+            references=state.references,
+            generation_time_s=state.generation_time_s,
+            status=state.status,
+            request=state.request,
+            documents=state.documents,
+            plan=state.plan,
         )
+        store.put_artifact(state.job_id, PAPER_ARTIFACT, paper.model_dump_json().encode("utf-8"), media_type="application/json")
 
-        state.output_pdf = output_data.get("pdf_path")
-        state.job_id = output_data.get("job_id", uuid.uuid4().hex)
-        state.title = output_data.get("title", state.draft_title)
-        state.status = output_data.get("status", "COMPLETED")
-        state.generation_time_s = round(time.time() - (state.start_time or time.time()), 2)
+        # Index the finished paper so later papers are checked against it too
+        for section in state.sections:
+            fingerprint_index.add_document(
+                f"{state.job_id}:{section.section_title}", section.content,
+                title=f"{state.title} — {section.section_title}", group=state.job_id
+            )
 
         print(f"✅ PDF generated successfully at: {state.output_pdf}\n")
 
@@ -142,90 +504,198 @@ def pdf_node(state: PaperoidState) -> dict:
     except Exception as e:
         print(f"❌ PDF generation error: {e}")
         state.errors.append(str(e))
-        return {"errors": state.errors}
+        return {"errors": [str(e)]}
+
+
+async def apdf_node(state: PaperoidState) -> dict:
+    """Async variant of pdf_node (PDF layout is CPU/disk work, so it runs in a thread)."""
+    return await asyncio.to_thread(pdf_node, state)
 
 
 def build_research_graph():
-    """Builds the complete LangGraph workflow for research generation."""
+    """
+    Builds the complete LangGraph workflow for research generation.
+    After writing, refinement, the originality check and a draft PDF preview
+    run as parallel branches and join before the final PDF.
+    The nodes await the LLM and arXiv instead of blocking, so the graph is
+    driven with astream() (see astream_research_graph).
+    """
+    # LangGraph is the slowest import in the backend, so it waits until a graph is needed
+    from langgraph.graph import StateGraph, START, END
+
     graph = StateGraph(PaperoidState)
 
-    graph.add_node("retrieve", retrieve_node)
-    graph.add_node("write", write_node)
-    graph.add_node("refine", refine_node)
-    graph.add_node("pdf", pdf_node)
+    graph.add_node("retrieve", aretrieve_node)
+    graph.add_node("ingest", aingest_node)
+    graph.add_node("write", awrite_node)
+    graph.add_node("refine", arefine_node)
+    graph.add_node("originality", aoriginality_node)
+    graph.add_node("draft_pdf", adraft_pdf_node)
+    graph.add_node("pdf", apdf_node)
 
     graph.add_edge(START, "retrieve")
-    graph.add_edge("retrieve", "write")
-    graph.add_edge("write", "refine")
-    graph.add_edge("refine", "pdf")
+    graph.add_edge("retrieve", "ingest")
+    graph.add_edge("ingest", "write")
+    # Fan out after the draft; the final PDF waits for all three branches
+    for branch in ("refine", "originality", "draft_pdf"):
+        graph.add_edge("write", branch)
+    graph.add_edge(["refine", "originality", "draft_pdf"], "pdf")
     graph.add_edge("pdf", END)
 
     return graph.compile()
 
 
-def stream_research_graph(state: PaperoidState):
-    """Executes the pipeline and yields status updates."""
+@lru_cache(maxsize=1)
+def get_research_graph():
+    """The compiled graph, built on first use and shared by every run (it holds no per-run state)."""
+    return build_research_graph()
+
+
+def warm_up() -> None:
+    """
+    Pay the one-off startup costs before the first request: compile the graph
+    and load the LLM client and PDF libraries that are otherwise imported lazily.
+    """
+    start = time.perf_counter()
+    get_research_graph()
+    get_refiner_llm()
+    import fpdf  # noqa: F401
+    if PYPDF_AVAILABLE:
+        import pypdf  # noqa: F401
+    print(f"🔥 Warm-up done in {time.perf_counter() - start:.2f}s")
+
+
+def _progress_events(node_name: str, node_output: dict):
+    """Translate one node's output into progress log events."""
+    node_output = node_output or {}  # a node that skipped its step reports no update
+    # Each node reports the shortcuts it took itself
+    for note in node_output.get("shortened") or ():
+        yield {"type": "log", "message": f"⏱️ Shortened {note}"}
+
+    if node_name == "retrieve":
+        count = len(node_output.get("references", []))
+        yield {"type": "log", "message": f"📚 Retrieved {count} references."}
+
+    elif node_name == "ingest":
+        count = len(node_output.get("ingested", []))
+        yield {"type": "log", "message": f"📑 Ingested the full text of {count} papers."}
+
+    elif node_name == "write":
+        count = len(node_output.get("sections", []))
+        yield {"type": "log", "message": f"✍️ Draft written with {count} sections."}
+        plan = node_output.get("plan")
+        if plan:
+            yield {"type": "log", "message": f"🧮 Tokens: {plan.actual_tokens} generated / {plan.planned_tokens} planned."}
+
+    elif node_name == "refine":
+        if "final_text" in node_output:
+            yield {"type": "log", "message": "🔧 Refinement complete."}
+
+    elif node_name == "originality":
+        report = node_output.get("originality")
+        if report:
+            flagged = sum(1 for s in report["passage_matches"] if s["matches"])
+            yield {"type": "log", "message": f"🕵️ Originality: highest abstract similarity {report['overall_score']}%, "
+                                             f"{flagged} section(s) with matching passages."}
+
+    elif node_name == "draft_pdf":
+        if node_output.get("preview_pdf"):
+            yield {"type": "log", "message": f"📝 Draft preview ready at {node_output['preview_pdf']}"}
+
+    elif node_name == "pdf":
+        pdf_path = node_output.get("output_pdf")
+        yield {"type": "log", "message": f"📄 PDF generated at {pdf_path}"}
+
+
+def _final_events(final_values: dict, start_time: float):
+    """Completion log and result event built from the graph's final state."""
+    generation_time_s = round(time.time() - start_time, 2)
+    if not final_values.get("sections"):
+        errors = final_values.get("errors") or [NO_DRAFT_MESSAGE]
+        yield {"type": "error", "message": f"💥 No paper was produced: {errors[-1]}"}
+        return
+    yield {"type": "log", "message": f"🏁 Research generation complete in {generation_time_s} sec."}
+
+    plan = final_values.get("plan")
+    request = final_values.get("request")
+
+    # Yield final result
+    result_data = {
+        "job_id": final_values.get("job_id"),
+        "title": final_values.get("title") or "Untitled Research Paper",
+        "abstract": final_values.get("abstract") or "No abstract available.",
+        "status": "COMPLETED" if final_values.get("output_pdf") else (final_values.get("status") or "COMPLETED"),
+        "pdf_path": final_values.get("output_pdf"),
+        "generation_time": generation_time_s,
+        "num_sections": len(final_values.get("sections") or ()),
+        "num_references": len(final_values.get("references") or ()),
+        "preview_pdf_path": final_values.get("preview_pdf"),
+        "originality": final_values.get("originality"),
+        "mode": request.mode if request else None,
+        "shortened": list(final_values.get("shortened") or ()),
+        # A paper with failed stages or placeholder sections is published, but never cached
+        "errors": list(final_values.get("errors") or ()),
+        "failed_sections": list(final_values.get("failed_sections") or ()),
+        "tokens": {
+            "planned": plan.planned_tokens,
+            "actual": plan.actual_tokens,
+            "sections": [b.model_dump() for b in plan.sections],
+        } if plan else None
+    }
+    yield {"type": "result", "data": result_data}
+
+
+def _start_deadline(state: PaperoidState) -> None:
+    # Jobs submitted through the job runner already count their time in the queue
+    if state.deadline_at is None and state.request.deadline_s:
+        state.deadline_at = state.start_time + state.request.deadline_s
+
+
+async def astream_research_graph(state: PaperoidState):
+    """
+    Executes the pipeline and yields status updates.
+    Runs the nodes via astream(), so a job holds no thread while it waits on I/O.
+    """
     state.start_time = time.time()
+    state.job_id = state.job_id or uuid.uuid4().hex
+    _start_deadline(state)
     yield {"type": "log", "message": f"🚀 Starting generation for: {state.request.topic_or_prompt}"}
 
-    compiled_graph = build_research_graph()
+    compiled_graph = get_research_graph()
 
     try:
-        # We use .stream() to get updates from each node
-        # stream_mode="updates" returns the output of the node that just finished
-        for output in compiled_graph.stream(state):
+        final_values = {}
+        async for mode, output in compiled_graph.astream(state, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final_values = output
+                continue
             for node_name, node_output in output.items():
-                if node_name == "retrieve":
-                    count = len(node_output.get("references", []))
-                    yield {"type": "log", "message": f"📚 Retrieved {count} references."}
-                    # Update state
-                    state.references = node_output.get("references", [])
-                    state.documents = node_output.get("documents", [])
-                    
-                elif node_name == "write":
-                    count = len(node_output.get("sections", []))
-                    yield {"type": "log", "message": f"✍️ Draft written with {count} sections."}
-                    # Update state
-                    state.sections = node_output.get("sections", [])
-                    state.abstract = node_output.get("abstract")
-                    state.draft_title = node_output.get("draft_title")
-                    state.draft_text = node_output.get("draft_text")
-
-                elif node_name == "refine":
-                    yield {"type": "log", "message": "🔧 Refinement complete."}
-                    # Update state
-                    if node_output.get("abstract"):
-                        state.abstract = node_output.get("abstract")
-                    state.final_text = node_output.get("final_text")
-
-                elif node_name == "pdf":
-                    pdf_path = node_output.get("output_pdf")
-                    yield {"type": "log", "message": f"📄 PDF generated at {pdf_path}"}
-                    
-                    # Update state with final results
-                    state.output_pdf = pdf_path
-                    state.job_id = node_output.get("job_id")
-                    state.title = node_output.get("title")
-                    state.status = "COMPLETED"
-                    state.generation_time_s = round(time.time() - state.start_time, 2)
-                    # Ensure abstract is passed if not already updated
-                    if node_output.get("abstract"):
-                        state.abstract = node_output.get("abstract")
-
-        yield {"type": "log", "message": f"🏁 Research generation complete in {state.generation_time_s} sec."}
-        
-        # Yield final result
-        result_data = {
-            "job_id": state.job_id,
-            "title": state.title or "Untitled Research Paper",
-            "abstract": state.abstract or "No abstract available.",
-            "status": state.status or "COMPLETED",
-            "pdf_path": state.output_pdf,
-            "generation_time": state.generation_time_s,
-            "num_sections": len(state.sections),
-            "num_references": len(state.references)
-        }
-        yield {"type": "result", "data": result_data}
+                for event in _progress_events(node_name, node_output):
+                    yield event
+
+        for event in _final_events(final_values, state.start_time):
+            yield event
 
     except Exception as e:
         yield {"type": "error", "message": f"💥 Workflow crashed: {str(e)}"}
+
+
+# One event loop per calling thread, kept between runs: the pooled HTTP and LLM
+# clients are bound to the loop that first used them
+_sync_loops = threading.local()
+
+
+def stream_research_graph(state: PaperoidState):
+    """Blocking wrapper over astream_research_graph, for scripts without an event loop."""
+    loop = getattr(_sync_loops, "loop", None)
+    if loop is None:
+        loop = _sync_loops.loop = asyncio.new_event_loop()
+    events = astream_research_graph(state)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(events.aclose())
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+from schemas.paper_schemas import ResearchPaper, ResearchRequest
+from storage.job_store import get_job_store
+from workflow.research_graph import PAPER_ARTIFACT
+
+# How long a finished paper is reused for identical requests (0 disables the cache)
+RESULT_CACHE_TTL_S = float(os.getenv("PAPEROID_RESULT_CACHE_TTL_S", str(24 * 3600)))
+CACHED_ARTIFACTS = {"paper.pdf": "application/pdf", PAPER_ARTIFACT: "application/json"}
+
+
+def _normalize(text: Optional[str]) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def cache_key(request: ResearchRequest) -> str:
+    """Requests that would produce the same paper share a key (deadline and force_refresh aside)."""
+    fields = {
+        "topic": _normalize(request.topic_or_prompt),
+        "title": _normalize(request.title),
+        "word_count": request.word_count,
+        "num_references": request.num_references,
+        "page_length": request.page_length,
+        "mode": request.mode,
+    }
+    return hashlib.blake2b(json.dumps(fields, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _entry_id(key: str) -> str:
+    # Cached results live in the job store as a pseudo-job, so every worker shares them
+    return f"result-cache-{key}"
+
+
+def store_result(job_id: str, request: ResearchRequest, result: dict) -> None:
+    """Keep a finished job's result and artifacts for identical requests."""
+    if RESULT_CACHE_TTL_S <= 0:
+        return
+    # A deadline may have cut the paper short; only full-length papers are reused
+    if request.deadline_s and result.get("shortened"):
+        return
+    # Nor a paper with a failed stage or section: one transient LLM error must not be served for a day
+    if result.get("errors") or result.get("failed_sections"):
+        return
+
+    store = get_job_store()
+    entry_id = _entry_id(cache_key(request))
+    for name, media_type in CACHED_ARTIFACTS.items():
+        data = store.get_artifact(job_id, name)
+        if data is None:
+            return
+        store.put_artifact(entry_id, name, data, media_type=media_type)
+    store.put_job(entry_id, "COMPLETED", {**result, "cached_from": result.get("cached_from") or job_id})
+
+
+def serve_cached(job_id: str, request: ResearchRequest) -> Optional[dict]:
+    """
+    Copy a fresh cached result for `request` into job `job_id` and return the
+    job's result payload, or None on a miss. Artifacts are content-addressed,
+    so the copy adds no PDF bytes on disk. The job's status is left to the caller.
+    """
+    if RESULT_CACHE_TTL_S <= 0:
+        return None
+    store = get_job_store()
+    entry_id = _entry_id(cache_key(request))
+    entry = store.get_job(entry_id)
+    if entry is None or entry["status"] != "COMPLETED" or not entry["result"]:
+        return None
+    age_s = time.time() - entry["updated_at"]
+    if age_s > RESULT_CACHE_TTL_S:
+        return None
+
+    artifacts = {name: store.get_artifact(entry_id, name) for name in CACHED_ARTIFACTS}
+    if any(data is None for data in artifacts.values()):
+        return None  # evicted by the output quota
+    # Section rewrites and exports load paper.json, so it carries the new job's id
+    paper = ResearchPaper.model_validate_json(artifacts[PAPER_ARTIFACT])
+    artifacts[PAPER_ARTIFACT] = paper.model_copy(update={"job_id": job_id}).model_dump_json().encode("utf-8")
+    for name, data in artifacts.items():
+        store.put_artifact(job_id, name, data, media_type=CACHED_ARTIFACTS[name])
+
+    return {
+        **entry["result"],
+        "job_id": job_id,
+        "pdf_path": store.artifact_path(job_id, "paper.pdf"),
+        "cached": True,
+        "cache_age_s": round(age_s, 1),
+    }
+
+
+def originality_group(job_id: Optional[str]) -> Optional[str]:
+    """The job whose sections are in the fingerprint index for `job_id`'s paper."""
+    if not job_id:
+        return job_id
+    job = get_job_store().get_job(job_id)
+    return ((job or {}).get("result") or {}).get("cached_from") or job_id
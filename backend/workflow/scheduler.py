@@ -0,0 +1,174 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from typing import Dict, List, Optional
+from schemas.paper_schemas import ResearchRequest
+
+# Jobs this worker runs at once; the rest wait in the scheduler's queue. Jobs are I/O-bound
+# and the LLM governor already finds the provider's capacity, so this is only a memory bound
+MAX_CONCURRENT_JOBS = int(os.getenv("PAPEROID_MAX_CONCURRENT_JOBS", "256"))
+# Seconds of expected cost forgiven per second spent waiting, so big jobs can't starve
+AGING_RATE = float(os.getenv("PAPEROID_SCHED_AGING_RATE", "1.0"))
+DEFAULT_CLIENT = "anonymous"
+
+
+def _parse_weights(value: str) -> Dict[str, float]:
+    """'alice=2,bob=0.5' -> {'alice': 2.0, 'bob': 0.5}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, weight = item.partition("=")
+        try:
+            weights[name.strip()] = max(float(weight), 0.01)
+        except ValueError:
+            continue
+    return weights
+
+
+CLIENT_WEIGHTS = _parse_weights(os.getenv("PAPEROID_CLIENT_WEIGHTS", ""))
+
+
+class CostModel:
+    """
+    Expected run time of a request in seconds: a linear prior on page_length and
+    num_references, corrected by what jobs of the same size actually took.
+    """
+
+    def __init__(self, base_s: float = 5.0, per_page_s: float = 4.0, per_reference_s: float = 0.5, alpha: float = 0.3):
+        self.base_s = base_s
+        self.per_page_s = per_page_s
+        self.per_reference_s = per_reference_s
+        self.alpha = alpha
+        self.global_ratio = 1.0            # observed / prior, over all jobs
+        self.ratios: Dict[tuple, float] = {}  # the same, per size bucket
+
+    @staticmethod
+    def _bucket(request: ResearchRequest) -> tuple:
+        return (request.page_length, min(request.num_references // 10, 5), request.mode)
+
+    def prior(self, request: ResearchRequest) -> float:
+        return self.base_s + self.per_page_s * request.page_length + self.per_reference_s * request.num_references
+
+    def estimate(self, request: ResearchRequest) -> float:
+        ratio = self.ratios.get(self._bucket(request), self.global_ratio)
+        return self.prior(request) * ratio
+
+    def observe(self, request: ResearchRequest, elapsed_s: float) -> None:
+        ratio = elapsed_s / self.prior(request)
+        self.global_ratio += (ratio - self.global_ratio) * self.alpha
+        bucket = self._bucket(request)
+        previous = self.ratios.get(bucket)
+        self.ratios[bucket] = ratio if previous is None else previous + (ratio - previous) * self.alpha
+
+
+class Ticket:
+    """One job waiting for (or holding) a run slot."""
+    __slots__ = ("job_id", "client_id", "request", "cost", "enqueued_at", "order", "granted", "started_at")
+
+    def __init__(self, job_id: str, client_id: str, request: ResearchRequest, cost: float, order: int):
+        self.job_id = job_id
+        self.client_id = client_id
+        self.request = request
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.order = order
+        self.granted: Optional[asyncio.Future] = None
+        self.started_at: Optional[float] = None
+
+    def priority(self, now: float) -> float:
+        # Shortest expected job first; waiting lowers the score so everyone gets a turn
+        score = self.cost - AGING_RATE * (now - self.enqueued_at)
+        if self.request.deadline_s:
+            # A job with a deadline goes no later than its slack (time left minus expected run time)
+            slack = self.enqueued_at + self.request.deadline_s - now - self.cost
+            score = min(score, slack)
+        return score
+
+
+class JobScheduler:
+    """
+    Admission control in front of graph execution: ordering and per-client quotas
+    under overload. LLM throughput is left to llm_governor. Free slots go to the waiting job with the lowest aged expected cost, among
+    clients still within their weighted share of the slots. When only
+    over-quota clients are waiting, the least-loaded one is served anyway,
+    so capacity is never left idle.
+    """
+
+    def __init__(self, capacity: int = MAX_CONCURRENT_JOBS, cost_model: Optional[CostModel] = None,
+                 weights: Optional[Dict[str, float]] = None):
+        self.capacity = max(1, capacity)
+        self.cost_model = cost_model or CostModel()
+        self.weights = CLIENT_WEIGHTS if weights is None else weights
+        self.waiting: List[Ticket] = []
+        self.running: Dict[str, Ticket] = {}
+        self._order = itertools.count()
+
+    def weight(self, client_id: str) -> float:
+        return self.weights.get(client_id, 1.0)
+
+    def _running_by_client(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for ticket in self.running.values():
+            counts[ticket.client_id] = counts.get(ticket.client_id, 0) + 1
+        return counts
+
+    def _quota(self, client_id: str, active_clients: set) -> int:
+        total = sum(self.weight(c) for c in active_clients)
+        return max(1, math.floor(self.capacity * self.weight(client_id) / total))
+
+    def _pick(self) -> Ticket:
+        now = time.monotonic()
+        running = self._running_by_client()
+        active = {t.client_id for t in self.waiting} | set(running)
+        eligible = [t for t in self.waiting if running.get(t.client_id, 0) < self._quota(t.client_id, active)]
+        if not eligible:
+            # Everyone waiting is over quota: serve the client using the least of its share
+            least = min(self.waiting, key=lambda t: running.get(t.client_id, 0) / self.weight(t.client_id))
+            eligible = [t for t in self.waiting if t.client_id == least.client_id]
+        return min(eligible, key=lambda t: (t.priority(now), t.order))
+
+    def _dispatch(self) -> None:
+        while self.waiting and len(self.running) < self.capacity:
+            ticket = self._pick()
+            self.waiting.remove(ticket)
+            self.running[ticket.job_id] = ticket
+            ticket.started_at = time.monotonic()
+            if not ticket.granted.done():
+                ticket.granted.set_result(None)
+
+    def submit(self, job_id: str, request: ResearchRequest, client_id: str = DEFAULT_CLIENT) -> Ticket:
+        """Queue a job; await `ticket.granted` before running it."""
+        ticket = Ticket(job_id, client_id or DEFAULT_CLIENT, request, self.cost_model.estimate(request), next(self._order))
+        ticket.granted = asyncio.get_running_loop().create_future()
+        self.waiting.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in the current pick order (0 once running)."""
+        if ticket.job_id in self.running:
+            return 0
+        now = time.monotonic()
+        ahead = sum(1 for t in self.waiting if (t.priority(now), t.order) < (ticket.priority(now), ticket.order))
+        return ahead + 1
+
+    def finish(self, ticket: Ticket, succeeded: bool = True) -> None:
+        """Free the ticket's slot (or drop it from the queue) and learn from its run time."""
+        if self.running.pop(ticket.job_id, None) is not None:
+            if succeeded and ticket.started_at is not None:
+                self.cost_model.observe(ticket.request, time.monotonic() - ticket.started_at)
+        elif ticket in self.waiting:
+            self.waiting.remove(ticket)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "running": len(self.running),
+            "waiting": len(self.waiting),
+            "clients": sorted({t.client_id for t in self.waiting} | set(self._running_by_client())),
+        }
+
+
+scheduler = JobScheduler()
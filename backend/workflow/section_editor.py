@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+from schemas.paper_schemas import ResearchPaper, SectionRegenerationRequest
+from agents.writer_agent import awriter_agent_section
+from tools.pdf_ingest import aingest_documents, load_chunks, ChunkIndex
+from tools.write_pdf import render_pdf_bytes
+from tools.fingerprint import fingerprint_index
+from storage.job_store import get_job_store
+from workflow.research_graph import PAPER_ARTIFACT, context_list_for
+
+# One rewrite at a time per job in this worker, so concurrent fix-ups don't lose each other's edits
+# Each entry is [lock, holders + waiters]; it is dropped when the last of them is done
+_job_locks: Dict[str, List] = {}
+
+
+@asynccontextmanager
+async def _job_lock(job_id: str):
+    entry = _job_locks.setdefault(job_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _job_locks[job_id]
+
+
+def _publish(job_id: str, paper: ResearchPaper, pdf_bytes: bytes) -> dict:
+    """Store the re-rendered PDF and paper, and refresh the job's result."""
+    store = get_job_store()
+    store.put_artifact(job_id, "paper.pdf", pdf_bytes, media_type="application/pdf")
+    store.put_artifact(job_id, PAPER_ARTIFACT, paper.model_dump_json().encode("utf-8"), media_type="application/json")
+
+    job = store.get_job(job_id) or {}
+    result = dict(job.get("result") or {})
+    result.update({
+        "job_id": job_id,
+        "title": paper.title,
+        "abstract": paper.abstract,
+        "status": "COMPLETED",
+        "pdf_path": store.artifact_path(job_id, "paper.pdf"),
+        "num_sections": len(paper.sections),
+        "num_references": len(paper.references),
+    })
+    store.put_job(job_id, "COMPLETED", result)
+    return result
+
+
+async def aregenerate_section(job_id: str, request: SectionRegenerationRequest) -> dict:
+    """
+    Rewrite one section of a completed job and re-render its PDF.
+    Reuses the job's stored sources, plan and other sections, so the cost is a
+    single LLM call; unchanged sections hit the PDF layout cache.
+    Raises LookupError for an unknown job or section.
+    """
+    store = get_job_store()
+    async with _job_lock(job_id):
+        raw = await asyncio.to_thread(store.get_artifact, job_id, PAPER_ARTIFACT)
+        if raw is None:
+            raise LookupError(f"No completed paper for job {job_id}")
+        paper = ResearchPaper.model_validate_json(raw)
+
+        wanted = request.section_title.strip().lower()
+        index = next((i for i, s in enumerate(paper.sections) if s.section_title.lower() == wanted), None)
+        if index is None:
+            raise LookupError(f"Section '{request.section_title}' not found in job {job_id}")
+        old = paper.sections[index]
+        topic = paper.request.topic_or_prompt if paper.request else paper.title
+        print(f"♻️ Regenerating section '{old.section_title}' of job {job_id}")
+
+        start = time.time()
+        # Full-text passages come from the ingest cache, so this doesn't download again
+        ingested = await aingest_documents(paper.documents)
+        chunks = await asyncio.to_thread(load_chunks, ingested)
+        excerpts = ChunkIndex(chunks).excerpts(topic, old.section_title) if chunks else None
+        section = await awriter_agent_section(
+            topic,
+            context_list_for(paper.documents),
+            old.section_title,
+            page_length=paper.request.page_length if paper.request else 5,
+            plan=paper.plan,
+            excerpts=excerpts,
+            instructions=request.instructions,
+            previous=old.content,
+        )
+
+        paper.sections[index] = section
+        if wanted == "abstract":
+            paper.abstract = section.content
+        pdf_bytes = await asyncio.to_thread(
+            render_pdf_bytes, paper.title, paper.abstract, paper.sections, paper.references
+        )
+        result = await asyncio.to_thread(_publish, job_id, paper, pdf_bytes)
+
+        # The rewritten text is new material for later originality checks
+        digest = hashlib.blake2b(section.content.encode("utf-8"), digest_size=8).hexdigest()
+        fingerprint_index.add_document(
+            f"{job_id}:{section.section_title}:{digest}", section.content,
+            title=f"{paper.title} — {section.section_title}", group=job_id
+        )
+
+    print(f"✅ Section '{section.section_title}' regenerated in {time.time() - start:.2f} sec.")
+    return {**result, "section": section.model_dump(), "regeneration_time": round(time.time() - start, 2)}
@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark for the backend.
+
+Imports a module (the API app by default) in fresh interpreters and reports the
+median wall time, which heavy libraries were loaded as a side effect, and the
+slowest imports from `python -X importtime`. With --max-seconds it exits
+non-zero when the median is over budget, so a CI step can catch regressions
+(e.g. a new top-level `import langgraph`).
+
+Usage (from the repository root):
+    python benchmarks/bench_import_time.py [--module main] [--runs 7] [--top 15] [--max-seconds 1.5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND = os.path.join(ROOT, "backend")
+# Libraries that should only load when a job first needs them
+HEAVY_MODULES = ["langgraph", "langchain_core", "langchain_huggingface", "huggingface_hub", "langsmith", "fpdf", "pypdf"]
+
+TIMED_IMPORT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def timed_import(module: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", TIMED_IMPORT, module, *HEAVY_MODULES],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list:
+    """(cumulative seconds, module) for the slowest imports, from -X importtime."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import, relative to backend/")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list (0 to skip)")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if the median import is slower")
+    args = parser.parse_args()
+
+    timed_import(args.module)  # warm the bytecode and filesystem caches
+    runs = [timed_import(args.module) for _ in range(args.runs)]
+    seconds = sorted(r["seconds"] for r in runs)
+    median = statistics.median(seconds)
+    print(f"import {args.module}: median {median:.3f}s  min {seconds[0]:.3f}s  max {seconds[-1]:.3f}s  ({args.runs} runs)")
+    heavy = runs[-1]["heavy"]
+    print(f"heavy libraries loaded at import: {', '.join(heavy) if heavy else 'none'}")
+
+    if args.top:
+        print(f"\n{'cumulative':>10}  module")
+        for cumulative, name in slowest_imports(args.module, args.top):
+            print(f"{cumulative:9.3f}s  {name}")
+
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"\n❌ median import time {median:.3f}s is over the {args.max_seconds:.3f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
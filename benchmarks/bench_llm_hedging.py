@@ -0,0 +1,121 @@
+"""
+Tail-latency benchmark for hedged LLM calls.
+
+Drives the LLM governor with fake endpoints whose latency is long-tailed
+(mostly fast, occasionally stuck) and grows with their token cap. The caps are
+the mix real plans produce (sections and subsections of papers of several
+lengths), so hedging has to work with many distinct max_new_tokens. Compares
+p50/p99 call latency and the number of extra calls with hedging off, on, and
+on with one latency window per exact cap (no bucketing).
+
+Usage (from the repository root):
+    python benchmarks/bench_llm_hedging.py [--calls 2000] [--concurrency 8] [--budget 0.05]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from agents import llm_governor as governor_module  # noqa: E402
+from agents.llm_governor import LLMGovernor  # noqa: E402
+from agents.planner_agent import build_outline, plan_generation  # noqa: E402
+from schemas.paper_schemas import ResearchRequest  # noqa: E402
+
+LATENCY_PER_TOKEN_S = 0.00002   # about 20 ms for a 1000-token cap
+STALL_PROBABILITY = 0.02  # a stuck request takes 20x longer
+STALL_FACTOR = 20
+
+
+class FakeResponse:
+    content = "generated text " * 50
+
+    def __init__(self, output_tokens: int):
+        # The whole cap is generated, so per-token latency is the same for every cap
+        self.usage_metadata = {"output_tokens": output_tokens}
+
+
+def plan_token_caps() -> list:
+    """max_new_tokens of every section and subsection call in plans for a range of paper sizes."""
+    caps = []
+    for page_length in (3, 5, 8, 12, 20):
+        for num_references in (10, 25):
+            request = ResearchRequest(topic_or_prompt="benchmark", page_length=page_length, num_references=num_references)
+            caps += [b.max_new_tokens for b in plan_generation(request).sections]
+            caps += [item.max_new_tokens for item in build_outline(plan_generation(request, hierarchical=True), {})]
+    return caps
+
+
+class FakeLLM:
+    """Stands in for ChatHuggingFace with one token cap, shared by every call with that cap."""
+
+    def __init__(self, max_new_tokens: int, counter: list):
+        self.max_new_tokens = max_new_tokens
+        self.counter = counter
+
+    async def ainvoke(self, prompt):
+        self.counter[0] += 1
+        latency = LATENCY_PER_TOKEN_S * self.max_new_tokens * random.uniform(0.8, 1.5)
+        if random.random() < STALL_PROBABILITY:
+            latency *= STALL_FACTOR
+        await asyncio.sleep(latency)
+        return FakeResponse(self.max_new_tokens)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run(calls: int, concurrency: int, hedge: bool, budget: float, caps: list):
+    random.seed(7)
+    governor = LLMGovernor(initial=concurrency, max_limit=concurrency * 2, hedge=hedge, hedge_budget=budget)
+    requests = [0]
+    llms = {cap: FakeLLM(cap, requests) for cap in set(caps)}
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(calls):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.monotonic()
+            await governor.ainvoke(llms[random.choice(caps)], "prompt")
+            latencies.append(time.monotonic() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, requests[0] - calls, governor.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=0.05)
+    args = parser.parse_args()
+
+    caps = plan_token_caps()
+    buckets = {governor_module._latency_key(FakeLLM(cap, [0])) for cap in caps}
+    print(f"Calls: {args.calls}, concurrency: {args.concurrency}, hedge budget: {args.budget:.0%}, "
+          f"{len(set(caps))} distinct token caps in {len(buckets)} latency buckets")
+    bucketed = governor_module._latency_key
+    for label, hedge, key in (("off", False, bucketed), ("on ", True, bucketed), ("on, exact caps", True, None)):
+        # Exact caps: one latency window per max_new_tokens, as before bucketing
+        governor_module._latency_key = key or (lambda llm: llm.max_new_tokens)
+        try:
+            latencies, extra, stats = asyncio.run(run(args.calls, args.concurrency, hedge, args.budget, caps))
+        finally:
+            governor_module._latency_key = bucketed
+        print(f"  hedging {label}: "
+              f"p50 {percentile(latencies, 50) * 1000:6.1f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:6.1f} ms  "
+              f"extra calls {extra} ({extra / args.calls:.1%}), hedge wins {stats['hedge_wins']}")
+
+
+if __name__ == "__main__":
+    main()
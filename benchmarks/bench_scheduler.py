@@ -0,0 +1,85 @@
+"""
+Latency benchmark for the job scheduler under mixed load.
+
+One heavy client floods the service with 15-page, 30-reference papers while
+light clients send 3-page requests. Jobs are simulated (run time proportional
+to their size, scaled down), and the median/p90 latency of the small jobs is
+compared between plain FIFO admission and the scheduler.
+
+Usage (from the repository root):
+    python benchmarks/bench_scheduler.py [--capacity 4] [--heavy 24] [--light 24] [--scale 0.005]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from schemas.paper_schemas import ResearchRequest  # noqa: E402
+from workflow.scheduler import CostModel, JobScheduler  # noqa: E402
+
+HEAVY = ResearchRequest(topic_or_prompt="heavy", page_length=15, num_references=30)
+LIGHT = ResearchRequest(topic_or_prompt="light", page_length=3, num_references=5)
+
+
+def run_time(request: ResearchRequest, scale: float) -> float:
+    # "True" cost differs from the scheduler's prior, so it has to learn it
+    return (10 + 6 * request.page_length + 0.3 * request.num_references) * scale * random.uniform(0.8, 1.2)
+
+
+def arrivals(heavy: int, light: int):
+    """(delay, client, request): the heavy client's burst lands first, light jobs trickle in."""
+    jobs = [(0.0, "heavy-client", HEAVY) for _ in range(heavy)]
+    jobs += [(0.02 * i, f"light-client-{i % 3}", LIGHT) for i in range(light)]
+    return sorted(jobs, key=lambda j: j[0])
+
+
+async def simulate(use_scheduler: bool, capacity: int, heavy: int, light: int, scale: float):
+    random.seed(11)
+    scheduler = JobScheduler(capacity=capacity, cost_model=CostModel(), weights={})
+    fifo = asyncio.Semaphore(capacity)
+    latencies = {"heavy-client": [], "light": []}
+
+    async def job(i, delay, client, request):
+        await asyncio.sleep(delay)
+        submitted = time.monotonic()
+        if use_scheduler:
+            ticket = scheduler.submit(f"job-{i}", request, client)
+            await ticket.granted
+            await asyncio.sleep(run_time(request, scale))
+            scheduler.finish(ticket)
+        else:
+            async with fifo:
+                await asyncio.sleep(run_time(request, scale))
+        latencies["heavy-client" if client == "heavy-client" else "light"].append(time.monotonic() - submitted)
+
+    await asyncio.gather(*(job(i, *spec) for i, spec in enumerate(arrivals(heavy, light))))
+    return latencies
+
+
+def describe(values):
+    ordered = sorted(values)
+    return f"median {statistics.median(ordered):6.2f}s  p90 {ordered[int(len(ordered) * 0.9) - 1]:6.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--heavy", type=int, default=24)
+    parser.add_argument("--light", type=int, default=24)
+    parser.add_argument("--scale", type=float, default=0.005, help="simulated seconds per cost unit")
+    args = parser.parse_args()
+
+    print(f"Capacity {args.capacity}, {args.heavy} heavy jobs + {args.light} light jobs")
+    for name, use_scheduler in (("FIFO     ", False), ("scheduler", True)):
+        latencies = asyncio.run(simulate(use_scheduler, args.capacity, args.heavy, args.light, args.scale))
+        print(f"  {name}  light: {describe(latencies['light'])}   heavy: {describe(latencies['heavy-client'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Memory benchmark for PaperoidState.
+
+Simulates N concurrent 15-page generations (default 100) and reports the bytes
+held per job, comparing the compact state against the previous layout
+(list of PaperSection + joined draft_text + per-job document copies).
+
+Usage (from the repository root):
+    python benchmarks/bench_state_memory.py [--jobs 100] [--pages 15]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from schemas.paper_schemas import (  # noqa: E402
+    PaperoidState, PaperSection, ResearchRequest, SourceDocument, intern_document,
+)
+
+SECTION_NAMES = ["Abstract", "Introduction", "Literature Review", "Methodology", "Results and Discussion", "Conclusion"]
+WORDS_PER_PAGE = 500
+NUM_DOCUMENTS = 30
+NUM_TOPICS = 10  # jobs on the same topic retrieve the same papers
+
+
+def make_text(words: int, seed: int) -> str:
+    return " ".join(f"w{seed}_{i % 997}" for i in range(words))
+
+
+def make_documents(topic: int):
+    return [
+        (f"http://arxiv.org/abs/{topic}.{d:05d}", f"Paper {topic}-{d}", make_text(200, topic * 1000 + d))
+        for d in range(NUM_DOCUMENTS)
+    ]
+
+
+def fresh_copy(text: str) -> str:
+    """Return an equal but distinct string, like a freshly parsed HTTP response."""
+    return (text + " ")[:-1]
+
+
+def build_legacy_job(job: int, pages: int, docs):
+    words = pages * WORDS_PER_PAGE // len(SECTION_NAMES)
+    sections = [PaperSection(section_title=name, content=make_text(words, job * 10 + i)) for i, name in enumerate(SECTION_NAMES)]
+    state = PaperoidState(request=ResearchRequest(topic_or_prompt=f"topic {job}", page_length=pages))
+    # Previous layout: list of models, a joined copy, and private document copies
+    state.__dict__["sections"] = sections
+    state.__dict__["draft_text_copy"] = "\n\n".join(s.content for s in sections)
+    state.documents = [SourceDocument(source_url=u, title=t, content_snippet=c) for u, t, c in docs]
+    state.final_text = make_text(400, job)
+    state.abstract = sections[0].content
+    return state
+
+
+def build_compact_job(job: int, pages: int, docs):
+    words = pages * WORDS_PER_PAGE // len(SECTION_NAMES)
+    sections = [PaperSection(section_title=name, content=make_text(words, job * 10 + i)) for i, name in enumerate(SECTION_NAMES)]
+    state = PaperoidState(request=ResearchRequest(topic_or_prompt=f"topic {job}", page_length=pages), sections=sections)
+    state.documents = [intern_document(source_url=u, title=t, content_snippet=c) for u, t, c in docs]
+    state.final_text = make_text(400, job)
+    state.abstract = state.sections.find("abstract").content
+    return state
+
+
+def measure(builder, jobs: int, pages: int) -> float:
+    # Source documents are generated up-front, as if they were the arXiv responses
+    corpus = {t: make_documents(t) for t in range(NUM_TOPICS)}
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    states = [
+        builder(j, pages, [(u, t, fresh_copy(c)) for u, t, c in corpus[j % NUM_TOPICS]])
+        for j in range(jobs)
+    ]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del states
+    return total / jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=15)
+    args = parser.parse_args()
+
+    legacy = measure(build_legacy_job, args.jobs, args.pages)
+    compact = measure(build_compact_job, args.jobs, args.pages)
+
+    print(f"Concurrent jobs: {args.jobs}, pages per job: {args.pages}")
+    print(f"  legacy state : {legacy / 1024:8.1f} KiB/job")
+    print(f"  compact state: {compact / 1024:8.1f} KiB/job")
+    print(f"  saved        : {(1 - compact / legacy) * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Scaling benchmark for the section-by-section and hierarchical writers.
+
+Runs both async writers against the load test's fake LLM server (latency grows
+with the tokens generated) for increasing page_length, and reports wall time,
+words written and the share of the requested length that was delivered.
+
+Usage (from the repository root):
+    python benchmarks/bench_writer_scaling.py [--pages 5 10 15 20 30] [--latency 0.3] [--per-token-ms 2]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_llm(port: int, latency: float, per_token_ms: float) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "loadtest.py"), "fake-llm", "--port", str(port),
+         "--latency", str(latency), "--per-token-ms", str(per_token_ms), "--sigma", "0.2", "--error-rate", "0"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(url: str):
+    import httpx
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                if (await client.get(url, timeout=1)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+async def run(pages: list):
+    from agents.planner_agent import plan_generation
+    from agents.writer_agent import awriter_agent_iterative, awriter_agent_hierarchical
+    from schemas.paper_schemas import ResearchRequest
+
+    context = [f"Title: Study {i} of neural network training\nSummary: results on optimisation and data." for i in range(10)]
+    print(f"{'pages':>5}  {'writer':<13} {'time':>7}  {'words':>6}  {'of target':>9}")
+    for page_length in pages:
+        request = ResearchRequest(topic_or_prompt="neural network training", page_length=page_length,
+                                  word_count=page_length * 500)
+        for name, hierarchical in (("section", False), ("hierarchical", True)):
+            plan = plan_generation(request, hierarchical=hierarchical)
+            start = time.monotonic()
+            if hierarchical:
+                _, sections = await awriter_agent_hierarchical(request.topic_or_prompt, context, page_length, plan)
+            else:
+                _, sections = await awriter_agent_iterative(request.topic_or_prompt, context, page_length, plan)
+            elapsed = time.monotonic() - start
+            words = sum(len(s.content.split()) for s in sections)
+            print(f"{page_length:>5}  {name:<13} {elapsed:6.2f}s  {words:>6}  {words / request.word_count:>8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 10, 15, 20, 30])
+    parser.add_argument("--latency", type=float, default=0.3, help="median seconds per LLM call, before tokens")
+    parser.add_argument("--per-token-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    port = free_port()
+    # Must be set before the agents build their endpoints
+    os.environ["PAPEROID_LLM_ENDPOINT_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "bench")
+    fake = start_fake_llm(port, args.latency, args.per_token_ms)
+    try:
+        asyncio.run(wait_ready(f"http://127.0.0.1:{port}/health"))
+        asyncio.run(run(args.pages))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+End-to-end load test for the Paperoid API, with local stand-ins for arXiv and the LLM.
+
+Starts three local servers and points the API at the two fakes:
+  - a fake arXiv Atom API (plus PDF downloads for full-text ingestion)
+  - a fake OpenAI/TGI-compatible chat completions server
+  - the real FastAPI app (uvicorn, backend/main.py)
+Each fake has a configurable latency distribution (lognormal around a median)
+and error rate. N virtual clients then loop through /generate-paper/,
+/check-plagiarism/ and /download-pdf/, and the run reports throughput,
+p50/p95/p99 latency per endpoint, time-to-first-event and the API's peak RSS.
+
+Usage (from the repository root):
+    python benchmarks/loadtest.py run [--clients 8] [--sessions 3] [--pages 5]
+        [--llm-latency 0.5] [--llm-per-token-ms 2] [--llm-error-rate 0.02]
+        [--arxiv-latency 0.3] [--arxiv-error-rate 0.0] [--json results.json]
+
+The fakes can also be started on their own (e.g. to test a deployed API):
+    python benchmarks/loadtest.py fake-arxiv --port 9101
+    python benchmarks/loadtest.py fake-llm --port 9102
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND)
+
+WORDS = (
+    "model learning network training data method results accuracy evaluation approach "
+    "framework performance analysis dataset architecture benchmark optimization inference"
+).split()
+
+
+def _latency(median_s: float, sigma: float) -> float:
+    """Lognormal latency around `median_s` (sigma 0 gives a constant)."""
+    return median_s * math.exp(random.gauss(0, sigma)) if sigma else median_s
+
+
+def _filler(words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(words))
+
+
+# --- Fake arXiv ---
+
+def fake_arxiv_app(latency_s: float, sigma: float, error_rate: float, total_results: int):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import Response
+    from tools.write_pdf import render_pdf_bytes
+    from schemas.paper_schemas import PaperSection
+    from xml.sax.saxutils import escape
+
+    app = FastAPI()
+    pdf_bytes = render_pdf_bytes("Stand-in paper", _filler(120), [
+        PaperSection(section_title=name, content=_filler(600)) for name in ("Introduction", "Method", "Results")
+    ], [])
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.get("/api/query")
+    async def query(request: Request):
+        await asyncio.sleep(_latency(latency_s, sigma))
+        if random.random() < error_rate:
+            return Response("Service Unavailable", status_code=503)
+
+        # Read the raw query: arXiv-style "all:deep learning" is not URL-encoded by the client
+        params = parse_qs(request.url.query.replace("+", "%2B"))
+        topic = re.sub(r"^all:", "", params.get("search_query", [""])[0]).strip()
+        start = int(params.get("start", ["0"])[0])
+        count = max(0, min(int(params.get("max_results", ["10"])[0]), total_results - start))
+        base = str(request.base_url).rstrip("/")
+
+        entries = []
+        for i in range(start, start + count):
+            entries.append(
+                "<entry>"
+                f"<id>http://arxiv.org/abs/{i:04d}.{i:05d}</id>"
+                f"<title>{escape(topic)} study {i}: {_filler(5)}</title>"
+                f"<summary>We study {escape(topic)}. {_filler(120)}</summary>"
+                f'<link href="{base}/pdf/{i}" type="application/pdf" rel="related"/>'
+                "</entry>"
+            )
+        feed = f'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">{"".join(entries)}</feed>'
+        return Response(feed, media_type="application/atom+xml")
+
+    @app.get("/pdf/{paper_id}")
+    async def pdf(paper_id: str):
+        await asyncio.sleep(_latency(latency_s, sigma))
+        return Response(pdf_bytes, media_type="application/pdf")
+
+    return app
+
+
+# --- Fake LLM (OpenAI / TGI chat completions) ---
+
+def fake_llm_app(latency_s: float, per_token_s: float, sigma: float, error_rate: float):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    async def completion(request: Request):
+        body = await request.json()
+        max_tokens = body.get("max_tokens") or body.get("max_new_tokens") or 512
+        # Most answers use most of their budget
+        tokens = max(1, int(max_tokens * random.uniform(0.6, 1.0)))
+        await asyncio.sleep(_latency(latency_s + per_token_s * tokens, sigma))
+        if random.random() < error_rate:
+            status = random.choice((429, 503))
+            return JSONResponse({"error": "Too Many Requests" if status == 429 else "Service Unavailable"}, status_code=status)
+
+        words = max(1, int(tokens / 1.35))
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        return {
+            "id": f"fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "fake-llm",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": _filler(words)},
+                "finish_reason": "length" if tokens >= max_tokens else "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens},
+        }
+
+    app.post("/v1/chat/completions")(completion)
+    app.post("/chat/completions")(completion)
+    return app
+
+
+# --- Process management ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(args: list, env: dict, cwd: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout_s: float = 60):
+    import httpx
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {proc.returncode}")
+            try:
+                if (await client.get(url, timeout=1)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def _peak_rss_mib(pid: int):
+    """Peak resident set size of a process (Linux /proc; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+# --- Virtual clients ---
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3)
+
+    return {"count": len(ordered), "p50": pick(50), "p95": pick(95), "p99": pick(99), "max": round(ordered[-1], 3)}
+
+
+async def _session(client, api: str, client_id: str, request: dict, stats: dict):
+    headers = {"X-Client-Id": client_id}
+
+    # 1. Generate, streaming NDJSON progress
+    start = time.monotonic()
+    first_event, result = None, None
+    try:
+        async with client.stream("POST", f"{api}/generate-paper/", json=request, headers=headers) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line:
+                    continue
+                if first_event is None:
+                    first_event = time.monotonic() - start
+                event = json.loads(line)
+                if event["type"] == "result":
+                    result = event["data"]
+                elif event["type"] == "error":
+                    raise RuntimeError(event["message"])
+        if result is None:
+            raise RuntimeError("stream ended without a result")
+    except Exception as e:
+        stats["errors"].append(f"generate: {e}")
+        return
+    stats["ttfe"].append(first_event)
+    stats["generate"].append(time.monotonic() - start)
+
+    # 2. Similarity check against (fake) arXiv, passage-level for this job
+    start = time.monotonic()
+    try:
+        resp = await client.post(f"{api}/check-plagiarism/", json={
+            "title": result["title"], "abstract": result["abstract"], "job_id": result["job_id"]
+        }, headers=headers)
+        resp.raise_for_status()
+        stats["check"].append(time.monotonic() - start)
+    except Exception as e:
+        stats["errors"].append(f"check-plagiarism: {e}")
+
+    # 3. Download the PDF
+    start = time.monotonic()
+    try:
+        resp = await client.get(f"{api}/download-pdf/{result['job_id']}", headers=headers)
+        resp.raise_for_status()
+        stats["download"].append(time.monotonic() - start)
+    except Exception as e:
+        stats["errors"].append(f"download-pdf: {e}")
+
+
+async def drive(api: str, clients: int, sessions: int, request: dict) -> dict:
+    import httpx
+    stats = {"generate": [], "ttfe": [], "check": [], "download": [], "errors": []}
+    limits = httpx.Limits(max_connections=clients * 2, max_keepalive_connections=clients * 2)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(600, connect=10), limits=limits) as client:
+        async def virtual_client(i):
+            for n in range(sessions):
+                # Clients send identical payloads, so force_refresh keeps the result cache and
+                # request dedupe from collapsing them onto one run: each session is real work
+                payload = {**request, "topic_or_prompt": f"{request['topic_or_prompt']} {n}", "force_refresh": True}
+                await _session(client, api, f"vc-{i}", payload, stats)
+
+        start = time.monotonic()
+        await asyncio.gather(*(virtual_client(i) for i in range(clients)))
+        stats["elapsed"] = time.monotonic() - start
+    return stats
+
+
+async def run(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="paperoid-loadtest-")
+    arxiv_port, llm_port, api_port = _free_port(), _free_port(), _free_port()
+    api = f"http://127.0.0.1:{api_port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND,
+        "PAPEROID_ARXIV_API_URL": f"http://127.0.0.1:{arxiv_port}/api/query",
+        "PAPEROID_LLM_ENDPOINT_URL": f"http://127.0.0.1:{llm_port}",
+        "HUGGINGFACEHUB_API_TOKEN": os.environ.get("HUGGINGFACEHUB_API_TOKEN", "loadtest"),
+        "PAPEROID_JOB_STORE": f"sqlite:///{os.path.join(work_dir, 'paperoid.db')}",
+        "PAPEROID_PDF_RATE": "0",
+    }
+    me = os.path.abspath(__file__)
+    procs = [
+        _spawn([sys.executable, me, "fake-arxiv", "--port", str(arxiv_port), "--latency", str(args.arxiv_latency),
+                "--sigma", str(args.sigma), "--error-rate", str(args.arxiv_error_rate)],
+               env, work_dir, os.path.join(work_dir, "fake_arxiv.log")),
+        _spawn([sys.executable, me, "fake-llm", "--port", str(llm_port), "--latency", str(args.llm_latency),
+                "--per-token-ms", str(args.llm_per_token_ms), "--sigma", str(args.sigma),
+                "--error-rate", str(args.llm_error_rate)],
+               env, work_dir, os.path.join(work_dir, "fake_llm.log")),
+        _spawn([sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND, "--host", "127.0.0.1",
+                "--port", str(api_port), "--log-level", "warning"],
+               env, work_dir, os.path.join(work_dir, "api.log")),
+    ]
+    try:
+        await _wait_ready(f"http://127.0.0.1:{arxiv_port}/health", procs[0])
+        await _wait_ready(f"http://127.0.0.1:{llm_port}/health", procs[1])
+        await _wait_ready(f"{api}/health", procs[2])
+        print(f"🚀 {args.clients} clients x {args.sessions} sessions against {api} (logs in {work_dir})")
+
+        request = {"topic_or_prompt": "neural network training", "page_length": args.pages, "num_references": args.references}
+        stats = await drive(api, args.clients, args.sessions, request)
+        peak_rss = _peak_rss_mib(procs[2].pid)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    completed = len(stats["generate"])
+    return {
+        "clients": args.clients,
+        "sessions_per_client": args.sessions,
+        "elapsed_s": round(stats["elapsed"], 2),
+        "papers_completed": completed,
+        "throughput_papers_per_min": round(completed / stats["elapsed"] * 60, 2),
+        "latency_s": {
+            "generate-paper": _percentiles(stats["generate"]),
+            "time_to_first_event": _percentiles(stats["ttfe"]),
+            "check-plagiarism": _percentiles(stats["check"]),
+            "download-pdf": _percentiles(stats["download"]),
+        },
+        "errors": len(stats["errors"]),
+        "error_samples": stats["errors"][:5],
+        "api_peak_rss_mib": round(peak_rss, 1) if peak_rss else None,
+        "work_dir": work_dir,
+    }
+
+
+def _print_report(report: dict) -> None:
+    print(f"\n📊 {report['papers_completed']} papers in {report['elapsed_s']}s "
+          f"({report['throughput_papers_per_min']} papers/min), {report['errors']} errors")
+    for name, p in report["latency_s"].items():
+        if p["count"]:
+            print(f"  {name:<20} n={p['count']:<4} p50 {p['p50']:7.3f}s  p95 {p['p95']:7.3f}s  p99 {p['p99']:7.3f}s")
+        else:
+            print(f"  {name:<20} n=0")
+    if report["api_peak_rss_mib"] is not None:
+        print(f"  API peak RSS: {report['api_peak_rss_mib']} MiB")
+    for sample in report["error_samples"]:
+        print(f"  ⚠️ {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="start the fakes and the API, then drive virtual clients")
+    run_p.add_argument("--clients", type=int, default=8)
+    run_p.add_argument("--sessions", type=int, default=3, help="generate/check/download rounds per client")
+    run_p.add_argument("--pages", type=int, default=5)
+    run_p.add_argument("--references", type=int, default=10)
+    run_p.add_argument("--llm-latency", type=float, default=0.5, help="median seconds per LLM call, before tokens")
+    run_p.add_argument("--llm-per-token-ms", type=float, default=2.0)
+    run_p.add_argument("--llm-error-rate", type=float, default=0.02)
+    run_p.add_argument("--arxiv-latency", type=float, default=0.3)
+    run_p.add_argument("--arxiv-error-rate", type=float, default=0.0)
+    run_p.add_argument("--sigma", type=float, default=0.5, help="lognormal spread of the fakes' latency")
+    run_p.add_argument("--json", help="also write the report to this file")
+
+    arxiv_p = sub.add_parser("fake-arxiv", help="serve only the fake arXiv API")
+    arxiv_p.add_argument("--port", type=int, default=9101)
+    arxiv_p.add_argument("--latency", type=float, default=0.3)
+    arxiv_p.add_argument("--sigma", type=float, default=0.5)
+    arxiv_p.add_argument("--error-rate", type=float, default=0.0)
+    arxiv_p.add_argument("--total-results", type=int, default=200)
+
+    llm_p = sub.add_parser("fake-llm", help="serve only the fake LLM")
+    llm_p.add_argument("--port", type=int, default=9102)
+    llm_p.add_argument("--latency", type=float, default=0.5)
+    llm_p.add_argument("--per-token-ms", type=float, default=2.0)
+    llm_p.add_argument("--sigma", type=float, default=0.5)
+    llm_p.add_argument("--error-rate", type=float, default=0.02)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        report = asyncio.run(run(args))
+        _print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+        return
+
+    import uvicorn
+    if args.command == "fake-arxiv":
+        app = fake_arxiv_app(args.latency, args.sigma, args.error_rate, args.total_results)
+    else:
+        app = fake_llm_app(args.latency, args.per_token_ms / 1000, args.sigma, args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,15 @@ Enhanced with real-time progress updates and plagiarism detection.
 
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import base64
-import os
-import json
 
 # --- Configuration ---
 API_URL = "http://127.0.0.1:8000"
-GENERATE_ENDPOINT = f"{API_URL}/generate-paper/"
+JOBS_ENDPOINT = f"{API_URL}/jobs/"
 CHECK_PLAGIARISM_ENDPOINT = f"{API_URL}/check-plagiarism/"
+POLL_INTERVAL_S = 2
 
 st.set_page_config(
     page_title="Paperoid AI", 
@@ -104,16 +104,71 @@ st.markdown("""
 st.markdown('<h1 class="main-header">Paperoid AI</h1>', unsafe_allow_html=True)
 st.markdown('<p class="subtitle">Generate structured research papers & check for overlaps</p>', unsafe_allow_html=True)
 
+# --- Cached resources ---
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled, keep-alive HTTP session shared by every rerun and user."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def check_health() -> str:
+    """API status, cached so widget interactions never wait on the network."""
+    try:
+        health_response = get_session().get(f"{API_URL}/health", timeout=1)
+        return "connected" if health_response.status_code == 200 else "not_responding"
+    except requests.RequestException:
+        return "offline"
+
+
+@st.cache_data(ttl=600, max_entries=20, show_spinner=False)
+def fetch_pdf(job_id: str) -> bytes:
+    """
+    PDF bytes for a job (served by any backend worker), fetched once per job.
+    A missing PDF raises instead of returning None, so the miss isn't cached.
+    """
+    resp = get_session().get(f"{API_URL}/download-pdf/{job_id}", timeout=30)
+    resp.raise_for_status()
+    return resp.content
+
+
+# Formats served by /jobs/{job_id}/export/{format}: label -> (format, mime type)
+EXPORT_FORMATS = {
+    "Markdown": ("md", "text/markdown"),
+    "HTML": ("html", "text/html"),
+    "LaTeX": ("tex", "application/x-tex"),
+}
+
+
+@st.cache_data(ttl=600, max_entries=60, show_spinner=False)
+def fetch_export(job_id: str, fmt: str) -> bytes:
+    """A job's paper in another format, rendered by the backend on first request (raises on a miss, like fetch_pdf)."""
+    resp = get_session().get(f"{API_URL}/jobs/{job_id}/export/{fmt}", timeout=30)
+    resp.raise_for_status()
+    return resp.content
+
+
+@st.cache_data(ttl=600, max_entries=20, show_spinner=False)
+def pdf_iframe(job_id: str) -> str:
+    """Base64 preview iframe, encoded once per job instead of on every rerun."""
+    pdf_bytes = fetch_pdf(job_id)
+    base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
+    return f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600" style="border-radius:12px; border: 1px solid #ddd;"></iframe>'
+
+
 # --- Sidebar / Status ---
 with st.sidebar:
     st.header("System Status")
-    try:
-        health_response = requests.get(f"{API_URL}/health", timeout=2)
-        if health_response.status_code == 200:
-            st.success("✅ API Connected")
-        else:
-            st.error("⚠️ API Not Responding")
-    except:
+    health = check_health()
+    if health == "connected":
+        st.success("✅ API Connected")
+    elif health == "not_responding":
+        st.error("⚠️ API Not Responding")
+    else:
         st.error("❌ API Offline")
         st.warning("Ensure backend is running: `uvicorn main:app --reload`")
 
@@ -130,6 +185,11 @@ with col2:
     domain = st.selectbox("Domain", ["Computer Science", "AI/ML", "Healthcare", "Finance", "Physics", "Other"])
     length = st.slider("Pages", 3, 15, 5)
     num_refs = st.number_input("Min References", 5, 30, 10)
+    mode = st.selectbox("Mode", ["balanced", "fast", "thorough"],
+                        help="fast: fewer references, one-shot draft, no refinement. thorough: every stage at full length.")
+    deadline = st.number_input("Deadline (seconds, 0 = none)", 0, 3600, 0, step=30,
+                               help="Stages are shortened so the paper is ready in time.")
+    force_refresh = st.checkbox("Regenerate (ignore cached results)", value=False)
 
 generate_btn = st.button("🚀 Generate Research Paper", type="primary")
 
@@ -138,70 +198,103 @@ if "paper_data" not in st.session_state:
     st.session_state.paper_data = None
 if "plag_results" not in st.session_state:
     st.session_state.plag_results = None
+if "jobs" not in st.session_state:
+    # job_id -> {"topic", "started", "status", "after", "logs", "result", "error"}
+    st.session_state.jobs = {}
 
 # --- Generation Logic ---
 if generate_btn:
     if not topic.strip():
         st.warning("⚠️ Please enter a research topic.")
     else:
-        # Reset previous results
-        st.session_state.paper_data = None
-        st.session_state.plag_results = None
-        
-        st.markdown("### 🔄 Generation Progress")
-        
-        # Use st.status for cleaner progress UI
-        with st.status("🚀 Starting research generation...", expanded=True) as status:
-            try:
-                start_time = time.time()
-                payload = {
-                    "topic_or_prompt": topic.strip(),
-                    "page_length": length,
-                    "num_references": num_refs,
-                    "word_count": length * 500
+        payload = {
+            "topic_or_prompt": topic.strip(),
+            "page_length": length,
+            "num_references": num_refs,
+            "word_count": length * 500,
+            "mode": mode,
+            "force_refresh": force_refresh
+        }
+        if deadline:
+            payload["deadline_s"] = deadline
+        if keywords.strip():
+            payload["title"] = f"{topic} - {keywords}"
+
+        try:
+            # Starting a job returns immediately; progress is polled below
+            response = get_session().post(JOBS_ENDPOINT, json=payload, timeout=10)
+            if response.status_code == 200:
+                job_id = response.json()["job_id"]
+                st.session_state.jobs[job_id] = {
+                    "topic": topic.strip(), "started": time.time(), "status": "RUNNING",
+                    "after": 0, "logs": [], "result": None, "error": None
                 }
-                if keywords.strip():
-                    payload["title"] = f"{topic} - {keywords}"
-
-                # Stream the response
-                response = requests.post(
-                    GENERATE_ENDPOINT, 
-                    json=payload, 
-                    timeout=300, 
-                    stream=True
-                )
-                
-                if response.status_code == 200:
-                    for line in response.iter_lines():
-                        if line:
-                            try:
-                                update = json.loads(line.decode('utf-8'))
-                                
-                                if update["type"] == "log":
-                                    status.write(f"🔄 {update['message']}")
-                                    
-                                elif update["type"] == "result":
-                                    st.session_state.paper_data = update["data"]
-                                    elapsed = round(time.time() - start_time, 2)
-                                    status.update(label=f"✅ Generation Complete in {elapsed}s!", state="complete", expanded=False)
-                                    
-                                elif update["type"] == "error":
-                                    status.update(label="❌ Generation Failed", state="error")
-                                    st.error(update["message"])
-                                    
-                            except json.JSONDecodeError:
-                                continue
-                
-                else:
-                    status.update(label="❌ API Error", state="error")
-                    st.error(f"❌ API Error: {response.status_code} - {response.text}")
-                    
-            except requests.exceptions.Timeout:
-                status.update(label="⏱️ Timeout", state="error")
-                st.error("⏱️ Request timed out. The paper generation is taking longer than expected.")
-            except Exception as e:
-                status.update(label="⚠️ Error", state="error")
-                st.error(f"⚠️ Error: {str(e)}")
+            else:
+                st.error(f"❌ API Error: {response.status_code} - {response.text}")
+        except requests.RequestException as e:
+            st.error(f"⚠️ Error: {str(e)}")
+
+
+def poll_job(job_id: str, job: dict) -> bool:
+    """Fetch new events for one job. Returns True when the job just finished."""
+    try:
+        resp = get_session().get(f"{JOBS_ENDPOINT}{job_id}/log", params={"after": job["after"]}, timeout=2)
+    except requests.RequestException:
+        return False  # try again on the next tick
+    if resp.status_code != 200:
+        return False
+
+    for update in resp.json()["events"]:
+        job["after"] = update["seq"]
+        if update["type"] == "log":
+            job["logs"].append(update["message"])
+        elif update["type"] == "result":
+            job["status"] = "COMPLETED"
+            job["result"] = update["data"]
+        elif update["type"] == "error":
+            job["status"] = "FAILED"
+            job["error"] = update["message"]
+    return job["status"] != "RUNNING"
+
+
+@st.fragment(run_every=POLL_INTERVAL_S)
+def generation_progress():
+    """Re-runs on its own every few seconds; the rest of the page stays interactive."""
+    jobs = st.session_state.jobs
+    if not jobs:
+        return
+
+    st.markdown("### 🔄 Generation Progress")
+    finished = False
+    for job_id, job in reversed(list(jobs.items())):
+        if job["status"] == "RUNNING" and poll_job(job_id, job) and job["result"]:
+            # Show the newest finished paper
+            st.session_state.paper_data = job["result"]
+            # The pipeline already checked the draft's originality; no extra request needed
+            originality = job["result"].get("originality") or {}
+            st.session_state.plag_results = originality.get("similar_papers")
+            st.session_state.plag_score = originality.get("overall_score", 0.0)
+            finished = True
+
+        elapsed = round(time.time() - job["started"], 1)
+        if job["status"] == "RUNNING":
+            label, state = f"🚀 {job['topic']} — running ({elapsed}s)", "running"
+        elif job["status"] == "COMPLETED":
+            label, state = f"✅ {job['topic']} — complete", "complete"
+        else:
+            label, state = f"❌ {job['topic']} — failed", "error"
+
+        with st.status(label, state=state, expanded=job["status"] == "RUNNING"):
+            for message in job["logs"]:
+                st.write(f"🔄 {message}")
+            if job["error"]:
+                st.error(job["error"])
+
+    if finished:
+        st.rerun()
+
+
+generation_progress()
 
 # --- Display Generated Paper ---
 if st.session_state.paper_data:
@@ -220,32 +313,56 @@ if st.session_state.paper_data:
         c2.metric("📚 References", data.get('num_references', 0))
         c3.metric("⏱️ Time", f"{data.get('generation_time', 0)}s")
         
+        if data.get("shortened"):
+            st.warning("⏱️ Shortened to meet the mode or deadline:\n\n" + "\n".join(f"- {note}" for note in data["shortened"]))
+
         st.markdown("### Abstract")
         st.info(data.get('abstract', 'No abstract available.'))
         
     with tab2:
-        pdf_path = data.get("pdf_path")
-        if pdf_path and os.path.exists(pdf_path):
-            with open(pdf_path, "rb") as f:
-                pdf_bytes = f.read()
-            
+        job_id = data.get("job_id")
+        try:
+            pdf_bytes = fetch_pdf(job_id) if job_id else None
+        except requests.HTTPError:
+            pdf_bytes = None  # not ready or already evicted; the warning below says so
+        except requests.RequestException as e:
+            pdf_bytes = None
+            st.error(f"⚠️ Error: {str(e)}")
+
+        if pdf_bytes:
             col_d1, col_d2 = st.columns([1, 2])
             with col_d1:
                 st.download_button(
                     label="📥 Download PDF",
                     data=pdf_bytes,
-                    file_name=f"research_paper_{data.get('job_id')}.pdf",
+                    file_name=f"research_paper_{job_id}.pdf",
                     mime="application/pdf",
                     type="primary"
                 )
-                st.caption(f"Job ID: `{data.get('job_id')}`")
+                st.caption(f"Job ID: `{job_id}`")
+
+                # Nothing is selected at first, so no export is rendered until the user picks one
+                export_label = st.selectbox("Other formats", list(EXPORT_FORMATS), index=None,
+                                            placeholder="Choose a format", key=f"export_format_{job_id}")
+                export_bytes = None
+                if export_label:
+                    export_fmt, export_mime = EXPORT_FORMATS[export_label]
+                    try:
+                        export_bytes = fetch_export(job_id, export_fmt)
+                    except requests.RequestException:
+                        st.warning(f"⚠️ {export_label} export not available.")
+                if export_bytes:
+                    st.download_button(
+                        label=f"📥 Download {export_label}",
+                        data=export_bytes,
+                        file_name=f"research_paper_{job_id}.{export_fmt}",
+                        mime=export_mime,
+                    )
             
             with col_d2:
-                base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
-                pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600" style="border-radius:12px; border: 1px solid #ddd;"></iframe>'
-                st.markdown(pdf_display, unsafe_allow_html=True)
+                st.markdown(pdf_iframe(job_id), unsafe_allow_html=True)
         else:
-            st.warning(f"⚠️ PDF file not found. Path: {pdf_path}")
+            st.warning(f"⚠️ PDF not available for job `{job_id}`.")
 
     # --- Plagiarism Check Section (Outside Tabs) ---
     st.markdown("---")
@@ -261,9 +378,10 @@ if st.session_state.paper_data:
                     
                 plag_payload = {
                     "title": data.get('title', topic),
-                    "abstract": search_abstract
+                    "abstract": search_abstract,
+                    "job_id": data.get('job_id')
                 }
-                plag_resp = requests.post(CHECK_PLAGIARISM_ENDPOINT, json=plag_payload, timeout=30)
+                plag_resp = get_session().post(CHECK_PLAGIARISM_ENDPOINT, json=plag_payload, timeout=30)
                 
                 if plag_resp.status_code == 200:
                     resp_data = plag_resp.json()
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Offline: a throwaway job store and no real LLM or arXiv calls
+os.environ["PAPEROID_JOB_STORE"] = f"sqlite:///{tempfile.mkdtemp()}/paperoid.db"
+os.environ.setdefault("PAPEROID_LLM_ENDPOINT_URL", "http://127.0.0.1:9")
+os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from agents.llm_governor import llm_governor
+from schemas.paper_schemas import ResearchRequest
+from workflow import job_runner, research_graph
+
+FAILING_SECTION = "Methodology"
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.usage_metadata = {"output_tokens": len(content.split())}
+
+
+async def fake_retriever(topic, limit=10):
+    return [
+        {"title": f"Paper {i} on {topic}", "summary": f"Findings {i} about {topic} and related training methods.",
+         "key": f"[Ref-{i + 1}]", "source_id": f"paper-{i}", "link": f"http://arxiv.test/{i}", "pdf": None}
+        for i in range(5)
+    ]
+
+
+def fake_llm(fail_section=None):
+    async def ainvoke(llm, prompt):
+        if fail_section and f"Write a {fail_section}" in prompt:
+            raise RuntimeError("503 Service Unavailable")
+        return FakeResponse("Neural network training has been studied extensively in the retrieved papers. " * 20)
+    return ainvoke
+
+
+async def generate(request):
+    job_id = await job_runner.start_job(request)
+    result, logs = None, []
+    async for _, event in job_runner.tail_events(job_id):
+        if event["type"] == "log":
+            logs.append(event["message"])
+        elif event["type"] == "result":
+            result = event["data"]
+        elif event["type"] == "error":
+            raise AssertionError(event["message"])
+    return result, logs
+
+
+def test_failed_section_is_not_cached(monkeypatch=None):
+    patch = monkeypatch.setattr if monkeypatch else lambda obj, name, value: setattr(obj, name, value)
+    patch(research_graph, "aretriever_agent", fake_retriever)
+    request = ResearchRequest(topic_or_prompt="cache poisoning regression", page_length=5, mode="balanced")
+
+    async def run():
+        patch(llm_governor, "ainvoke", fake_llm(fail_section=FAILING_SECTION))
+        failed, _ = await generate(request)
+        assert failed["status"] == "COMPLETED"
+        assert failed["failed_sections"] == [FAILING_SECTION]
+
+        # The LLM has recovered: the identical request must be generated again, not served the broken paper
+        patch(llm_governor, "ainvoke", fake_llm())
+        retried, logs = await generate(request)
+        assert not retried.get("cached"), logs
+        assert retried["failed_sections"] == [] and retried["errors"] == []
+
+        # A clean paper is cached as before
+        cached, _ = await generate(request)
+        assert cached.get("cached") and cached["cached_from"] == retried["job_id"]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_failed_section_is_not_cached()
+    print("✅ A paper with a failed section is not served from the result cache.")